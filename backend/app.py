@@ -3,31 +3,79 @@ import os
 import sys
 import asyncio
 import tempfile
-from typing import Dict, List, Optional
+from typing import Dict, List, NamedTuple, Optional, Tuple
 import numpy as np
+from scipy import sparse
 import uvicorn
-import pandas as pd
 from datetime import datetime
-from fastapi import FastAPI, File, UploadFile, HTTPException, Request
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from fastapi.responses import FileResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 import json
 import uuid
+import time
 from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
 
 # 添加必要的导入
-import faiss
-from sklearn.feature_extraction.text import TfidfVectorizer
-import jieba
 import re
-from config import BASE_CONFIG, VECTOR_CONFIG, FILE_CONFIG, ensure_temp_dir
+import bisect
+from config import (
+    BASE_CONFIG, VECTOR_CONFIG, FILE_CONFIG, EXTRACTION_CONFIG, PDF_CONFIG, TABULAR_CONFIG, RETRIEVAL_CONFIG,
+    EMBEDDING_CONFIG, VECTOR_INDEX_CONFIG, PERSISTENCE_CONFIG, ensure_temp_dir, get_temp_path
+)
+from file_upload import save_upload_file, UploadSizeLimitMiddleware, UploadTooLargeError
+from extractors import (
+    extract_text_from_txt,
+    extract_pdf_with_stats,
+    iter_pdf_pages,
+    extract_text_from_docx,
+    extract_text_from_excel,
+    extract_text_from_csv,
+    iter_csv_blocks,
+)
+from extraction_executor import run_extraction, iterate_in_thread, shutdown_extraction_executor
+from loop_monitor import loop_lag_monitor
+from tabular_store import TableReader, list_tables, remove_store
+from vectorizers import HashingBackend, TfidfBackend, create_vectorizer_backend
+from embedding_cache import EmbeddingCache, text_key
+from persistence import SnapshotScheduler, SnapshotStore
+from sparse_index import SparseChunkIndex
+from vector_index import VectorIndexManager
+from bm25_index import BM25Index
+from tokenizer import tokenization_service
+from chunking import ChunkSpan, chunk_texts, iter_chunk_spans, iter_table_aware_spans, span_text
 
 # 确保临时目录存在
 ensure_temp_dir()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：预热jieba词典、加载快照并启动事件循环监控；退出时保存快照，关闭提取执行器和分词进程池"""
+    await run_in_threadpool(tokenization_service.warmup)
+    if snapshot_scheduler is not None:
+        await run_in_threadpool(_restore_snapshot)
+        snapshot_scheduler.start()
+    loop_lag_monitor.start()
+    yield
+    await loop_lag_monitor.stop()
+    if snapshot_scheduler is not None:
+        await snapshot_scheduler.stop()
+    shutdown_extraction_executor()
+    tokenization_service.shutdown()
+
 # 创建FastAPI应用
-app = FastAPI(title="财务分析API", version="1.0.0")
+app = FastAPI(title="财务分析API", version="1.0.0", lifespan=lifespan)
+
+# 上传大小限制：先注册的中间件在内层，放在CORS之内，413响应也带CORS头
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    path_prefix="/upload",
+    max_body_size=FILE_CONFIG["MAX_FILE_SIZE"] + FILE_CONFIG["MULTIPART_OVERHEAD"],
+    max_file_size=FILE_CONFIG["MAX_FILE_SIZE"]
+)
 
 # 添加CORS中间件
 app.add_middleware(
@@ -43,12 +91,62 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 检索引擎在启动时校验：未知的引擎名（如已移除的keyword）不能在查询时静默退回faiss
+RETRIEVAL_ENGINES = ("bm25", "sparse", "faiss")
+if RETRIEVAL_CONFIG["ENGINE"] not in RETRIEVAL_ENGINES:
+    raise ValueError(f"不支持的检索引擎: {RETRIEVAL_CONFIG['ENGINE']}。可选：{', '.join(RETRIEVAL_ENGINES)}")
+
 # 全局变量
 vector_dimension = VECTOR_CONFIG["VECTOR_DIMENSION"]
-index = faiss.IndexFlatL2(vector_dimension)
+# 稠密向量索引：从Flat开始，向量数越过阈值时后台迁移到IVF/HNSW
+index = VectorIndexManager(
+    vector_dimension,
+    ivf_min_vectors=VECTOR_INDEX_CONFIG["IVF_MIN_VECTORS"],
+    hnsw_min_vectors=VECTOR_INDEX_CONFIG["HNSW_MIN_VECTORS"],
+    train_sample=VECTOR_INDEX_CONFIG["TRAIN_SAMPLE"],
+    nprobe=VECTOR_INDEX_CONFIG["NPROBE"],
+    hnsw_m=VECTOR_INDEX_CONFIG["HNSW_M"],
+    hnsw_ef_search=VECTOR_INDEX_CONFIG["HNSW_EF_SEARCH"],
+    hnsw_ef_construction=VECTOR_INDEX_CONFIG["HNSW_EF_CONSTRUCTION"],
+    compact_min_tombstones=VECTOR_INDEX_CONFIG["COMPACT_MIN_TOMBSTONES"],
+    compact_tombstone_ratio=VECTOR_INDEX_CONFIG["COMPACT_TOMBSTONE_RATIO"]
+)
 document_store = {}
-tfidf_vectorizer = TfidfVectorizer(max_features=vector_dimension, stop_words=None)
-tfidf_fitted = False
+next_doc_id = 0  # 单调递增的文档ID，删除文档后不复用
+vectorizer_backend = create_vectorizer_backend(VECTOR_CONFIG["VECTORIZER_BACKEND"], vector_dimension)
+# 句向量模型的输出按文本块内容哈希缓存到磁盘（tfidf/hashing的向量依赖语料统计，不缓存）
+embedding_cache = None
+if EMBEDDING_CONFIG["CACHE_ENABLED"] and vectorizer_backend.cacheable:
+    embedding_cache = EmbeddingCache(
+        EMBEDDING_CONFIG["CACHE_DIR"], vectorizer_backend.name, vectorizer_backend.version, vector_dimension
+    )
+# 稀疏检索：大哈希空间的TF-IDF向量按行存入CSR矩阵，行号与FAISS向量ID一致
+# 稀疏索引和BM25删除后的压缩阈值与稠密索引相同
+TOMBSTONE_LIMITS = {
+    "compact_min_tombstones": VECTOR_INDEX_CONFIG["COMPACT_MIN_TOMBSTONES"],
+    "compact_tombstone_ratio": VECTOR_INDEX_CONFIG["COMPACT_TOMBSTONE_RATIO"]
+}
+sparse_encoder = HashingBackend(RETRIEVAL_CONFIG["SPARSE_FEATURES"])
+sparse_index = SparseChunkIndex(RETRIEVAL_CONFIG["SPARSE_FEATURES"], **TOMBSTONE_LIMITS)
+# BM25倒排索引：块ID与FAISS向量ID一致
+bm25_index = BM25Index(**TOMBSTONE_LIMITS)
+vector_id_to_chunk: Dict[int, Tuple[int, int]] = {}  # 向量ID -> (文档ID, 块序号)
+# 状态版本：事件循环中修改状态的代码块开始和结束时各加1（见_mutating_state），快照线程据此判断序列化期间是否有修改
+state_version = 0
+_mutation_depth = 0
+# 串行化各索引的写入：稠密索引在线程池中写入，BM25和稀疏索引要求按向量ID递增的顺序追加
+_index_write_lock = asyncio.Lock()
+# 快照持久化：变更后（或定时）在线程中把索引和文档存储写入磁盘，启动时加载
+snapshot_store = SnapshotStore(PERSISTENCE_CONFIG["DIR"])
+snapshot_scheduler = None
+if PERSISTENCE_CONFIG["ENABLED"]:
+    snapshot_scheduler = SnapshotScheduler(
+        lambda: snapshot_store.save(index, _snapshot_state, _snapshot_metadata, lambda: state_version),
+        mode=PERSISTENCE_CONFIG["MODE"],
+        interval=PERSISTENCE_CONFIG["INTERVAL"],
+        debounce=PERSISTENCE_CONFIG["DEBOUNCE"],
+        min_interval=PERSISTENCE_CONFIG["MIN_INTERVAL"]
+    )
 
 # Pydantic模型
 class QuestionRequest(BaseModel):
@@ -71,366 +169,62 @@ class WordOnlyRequest(BaseModel):
     analysis_type: str = "comprehensive"
     company_name: Optional[str] = "分析企业"
 
-def simple_text_vectorize(text: str) -> np.ndarray:
-    """改进的文本向量化方法"""
-    global tfidf_vectorizer, tfidf_fitted
+def _embed_texts(texts: List[str], token_lists: Optional[List[Tuple[str, ...]]], update_stats: bool = True) -> np.ndarray:
+    """稠密向量化的统一入口，入库的文本块和查询问题都走这里
     
-    # 如果TF-IDF未拟合，先用当前文本进行简单初始化
-    if not tfidf_fitted:
-        print("TF-IDF未初始化，使用当前文本进行初始化")
-        tfidf_vectorizer.fit([text])
-        tfidf_fitted = True
-    
-    # 预处理文本
-    def preprocess_text(text):
-        # 移除多余空白
-        text = re.sub(r'\s+', ' ', text)
-        # 保留数字和小数点
-        text = re.sub(r'[^\w\s\u4e00-\u9fff.,\-]', '', text)
-        return text
-    
-    # 处理文本
-    processed_text = preprocess_text(text)
-    
-    # 中文分词
-    words = list(jieba.cut(processed_text))
-    
-    # 对数字进行特殊处理
-    processed_words = []
-    for word in words:
-        if re.match(r'^[\d.,\-]+$', word):
-            # 保持数字的完整性
-            processed_words.append(f"NUM_{word}")
-        else:
-            processed_words.append(word)
-    
-    # 合并处理后的词
-    processed_text = ' '.join(processed_words)
-    
-    # 使用TF-IDF向量化
-    vector = tfidf_vectorizer.transform([processed_text]).toarray().flatten()
+    tfidf/hashing后端输入分词结果（空格连接），句向量模型后端输入原始文本并按批推理。
+    """
+    if vectorizer_backend.tokenized_input:
+        texts = [' '.join(tokens) for tokens in token_lists]
+    return vectorizer_backend.embed(texts, update_stats=update_stats)
+
+def vectorize_texts(texts: List[str], update_stats: bool = True) -> np.ndarray:
+    """批量向量化文本，得到 (文本数, vector_dimension) 的float32矩阵
     
-    # 确保向量维度正确
-    if len(vector) < vector_dimension:
-        padded_vector = np.zeros(vector_dimension)
-        padded_vector[:len(vector)] = vector
-        return padded_vector.astype('float32')
-    else:
-        return vector[:vector_dimension].astype('float32')
+    入库时update_stats为True（hashing后端更新IDF统计，tfidf后端未拟合时先拟合），查询时传False。
+    """
+    if not texts:
+        return np.zeros((0, vector_dimension), dtype='float32')
+    token_lists = tokenization_service.tokenize_batch(texts) if vectorizer_backend.tokenized_input else None
+    return _embed_texts(texts, token_lists, update_stats)
 
-def extract_text_from_pdf(file_path: str) -> str:
-    """改进的PDF文本提取方法，支持表格和图片"""
-    try:
-        import fitz  # PyMuPDF
-        print(f"\n=== PDF处理开始 ===")
-        print(f"处理文件: {file_path}")
-        
-        # 打开PDF文件
-        doc = fitz.open(file_path)
-        print(f"PDF页数: {len(doc)}")
-        
-        all_text = []
-        
-        for page_num, page in enumerate(doc):
-            print(f"\n--- 处理第 {page_num + 1} 页 ---")
-            
-            # 方法1: 直接提取文本
-            text = page.get_text()
-            print(f"直接提取文本长度: {len(text)}")
-            
-            # 方法2: 提取表格
-            tables = []
-            try:
-                # 尝试提取表格
-                table_data = page.find_tables()
-                for table in table_data:
-                    table_text = []
-                    try:
-                        table_content = table.extract()
-                        for row in table_content:
-                            if row and any(cell for cell in row):  # 过滤空行
-                                row_text = " | ".join(str(cell) if cell else "" for cell in row)
-                                table_text.append(row_text)
-                        if table_text:
-                            tables.append("表格内容:\n" + "\n".join(table_text))
-                    except Exception as e:
-                        print(f"表格提取错误: {e}")
-                        continue
-                print(f"提取到 {len(tables)} 个表格")
-            except Exception as e:
-                print(f"表格查找错误: {e}")
-            
-            # 方法3: 基于文本块的提取
-            text_blocks = []
-            try:
-                blocks = page.get_text("dict")
-                for block in blocks["blocks"]:
-                    if "lines" in block:
-                        block_text = ""
-                        for line in block["lines"]:
-                            for span in line["spans"]:
-                                if span.get("text", "").strip():
-                                    block_text += span["text"] + " "
-                        if block_text.strip():
-                            text_blocks.append(block_text.strip())
-                print(f"提取到 {len(text_blocks)} 个文本块")
-            except Exception as e:
-                print(f"文本块提取错误: {e}")
-            
-            # 合并所有提取的内容
-            page_content = []
-            
-            # 添加直接提取的文本
-            if text.strip():
-                page_content.append(f"页面文本:\n{text.strip()}")
-            
-            # 添加表格内容
-            if tables:
-                page_content.extend(tables)
-            
-            # 添加文本块内容（如果直接提取为空）
-            if not text.strip() and text_blocks:
-                page_content.append("文本块内容:\n" + "\n".join(text_blocks))
-            
-            # 如果仍然没有内容，尝试OCR提取（基础方法）
-            if not page_content:
-                try:
-                    # 尝试获取页面图像并转换为文本（简单方法）
-                    pix = page.get_pixmap()
-                    if pix.width > 0 and pix.height > 0:
-                        page_content.append("注意：此页面可能包含图片或扫描内容，需要OCR处理")
-                        print("页面可能包含图片内容")
-                except Exception as e:
-                    print(f"图像处理错误: {e}")
-            
-            if page_content:
-                page_text = f"\n=== 第 {page_num + 1} 页 ===\n" + "\n\n".join(page_content)
-                all_text.append(page_text)
-                print(f"第 {page_num + 1} 页最终文本长度: {len(page_text)}")
-            else:
-                print(f"第 {page_num + 1} 页未提取到内容")
-        
-        doc.close()
-        
-        # 合并所有页面文本
-        final_text = "\n\n".join(all_text)
-        print(f"\n总文本长度: {len(final_text)}")
-        print(f"文本预览: {final_text[:200]}...")
-        print("=== PDF处理完成 ===\n")
-        
-        return final_text
-        
-    except Exception as e:
-        print(f"\n=== PDF处理错误 ===")
-        print(f"错误信息: {str(e)}")
-        print(f"文件路径: {file_path}")
-        try:
-            print(f"文件大小: {os.path.getsize(file_path)} 字节")
-        except:
-            print("无法获取文件大小")
-        print("=== 错误详情结束 ===\n")
-        
-        # 即使出错也尝试返回基础提取结果
-        try:
-            import fitz
-            doc = fitz.open(file_path)
-            basic_text = ""
-            for page in doc:
-                basic_text += page.get_text() + "\n"
-            doc.close()
-            if basic_text.strip():
-                return f"基础提取结果:\n{basic_text.strip()}"
-        except:
-            pass
-            
-        return ""
+def _embed_chunks(texts: List[str], token_lists: Optional[List[Tuple[str, ...]]]) -> np.ndarray:
+    """入库向量化：先批量查磁盘缓存，只对未命中的文本块推理并写回缓存"""
+    if embedding_cache is None:
+        return _embed_texts(texts, token_lists)
+    keys = [text_key(text) for text in texts]
+    found, vectors = embedding_cache.get_many(keys)
+    missing = np.flatnonzero(~found)
+    if len(missing):
+        missing_vectors = _embed_texts([texts[i] for i in missing], None)
+        vectors[missing] = missing_vectors
+        embedding_cache.put_many([keys[i] for i in missing], missing_vectors)
+    return vectors
 
-def extract_text_from_docx(file_path: str) -> str:
-    """从DOCX文件提取文本，包括表格内容"""
-    try:
-        from docx import Document
-        print(f"开始处理Word文档: {os.path.basename(file_path)}")
-        
-        doc = Document(file_path)
-        all_content = []
-        
-        # 处理文档中的段落和表格
-        for element in doc.element.body:
-            if element.tag.endswith('p'):  # 段落
-                # 找到对应的段落对象
-                for para in doc.paragraphs:
-                    if para._element == element:
-                        if para.text.strip():
-                            all_content.append(para.text.strip())
-                        break
-            
-            elif element.tag.endswith('tbl'):  # 表格
-                # 找到对应的表格对象
-                for table in doc.tables:
-                    if table._element == element:
-                        table_content = []
-                        table_content.append("=== 表格内容 ===")
-                        
-                        # 处理表格头部
-                        if table.rows:
-                            header_row = table.rows[0]
-                            headers = []
-                            for cell in header_row.cells:
-                                headers.append(cell.text.strip() if cell.text.strip() else "")
-                            if any(headers):
-                                table_content.append("表头: " + " | ".join(headers))
-                        
-                        # 处理表格数据行
-                        for row_idx, row in enumerate(table.rows[1:], 1):
-                            row_data = []
-                            for cell in row.cells:
-                                cell_text = cell.text.strip()
-                                row_data.append(cell_text if cell_text else "")
-                            if any(row_data):
-                                # 如果有表头，按列名组织数据
-                                if headers and len(row_data) == len(headers):
-                                    formatted_row = []
-                                    for header, data in zip(headers, row_data):
-                                        if data:
-                                            formatted_row.append(f"{header}: {data}")
-                                    if formatted_row:
-                                        table_content.append(" | ".join(formatted_row))
-                                else:
-                                    table_content.append(" | ".join(row_data))
-                        
-                        if len(table_content) > 1:  # 有实际内容
-                            all_content.append("\n".join(table_content))
-                        break
-        
-        final_text = "\n\n".join(all_content)
-        print(f"Word文档处理完成，提取文本长度: {len(final_text)}")
-        print(f"包含段落数: {len([c for c in all_content if not c.startswith('=== 表格内容')])}")
-        print(f"包含表格数: {len([c for c in all_content if c.startswith('=== 表格内容')])}")
-        
-        return final_text
-        
-    except Exception as e:
-        print(f"Word文档处理错误: {str(e)}")
-        # 回退到基础处理
-        try:
-            from docx import Document
-            doc = Document(file_path)
-            basic_text = '\n'.join([paragraph.text for paragraph in doc.paragraphs if paragraph.text.strip()])
-            return f"Word文档基础提取:\n{basic_text}"
-        except:
-            return f"DOCX解析错误: {str(e)}"
-
-def extract_text_from_excel(file_path: str) -> str:
-    """从Excel文件提取文本，保留表格结构"""
-    try:
-        # 读取所有工作表
-        xl_file = pd.ExcelFile(file_path)
-        all_text = []
-        
-        for sheet_name in xl_file.sheet_names:
-            df = pd.read_excel(file_path, sheet_name=sheet_name)
-            
-            # 添加工作表名称
-            sheet_text = [f"工作表: {sheet_name}"]
-            
-            # 添加列名
-            headers = df.columns.tolist()
-            sheet_text.append("列标题: " + ", ".join(str(h) for h in headers))
-            
-            # 处理每一行数据
-            for idx, row in df.iterrows():
-                row_text = []
-                for col in headers:
-                    value = row[col]
-                    if pd.notna(value):  # 只处理非空值
-                        row_text.append(f"{col}: {value}")
-                if row_text:
-                    sheet_text.append(" | ".join(row_text))
-            
-            # 合并工作表文本
-            all_text.append("\n".join(sheet_text))
-        
-        final_text = "\n\n".join(all_text)
-        print(f"Excel文件 {os.path.basename(file_path)} 提取文本长度: {len(final_text)}")
-        return final_text
-        
-    except Exception as e:
-        print(f"Excel处理错误 ({os.path.basename(file_path)}): {str(e)}")
-        raise Exception(f"Excel文件处理失败: {str(e)}")
+class EncodedChunks(NamedTuple):
+    """一批文本块的入库数据：稠密向量必有，稀疏向量和分词结果只在对应检索引擎启用时生成"""
+    vectors: np.ndarray
+    sparse_vectors: Optional[sparse.csr_matrix] = None
+    token_lists: Optional[List[Tuple[str, ...]]] = None
 
-def extract_text_from_csv(file_path: str) -> str:
-    """从CSV文件提取文本，保留表格结构"""
-    try:
-        print(f"开始处理CSV文件: {os.path.basename(file_path)}")
-        
-        # 尝试不同的编码
-        encodings = ['utf-8', 'gbk', 'gb2312', 'latin-1']
-        df = None
-        used_encoding = None
-        
-        for encoding in encodings:
-            try:
-                df = pd.read_csv(file_path, encoding=encoding)
-                used_encoding = encoding
-                print(f"成功使用编码 {encoding} 读取CSV文件")
-                break
-            except UnicodeDecodeError:
-                continue
-            except Exception as e:
-                print(f"使用编码 {encoding} 读取失败: {e}")
-                continue
-        
-        if df is None:
-            raise Exception("无法使用任何编码读取CSV文件")
-        
-        # 构建结构化文本
-        csv_content = []
-        csv_content.append("=== CSV数据 ===")
-        
-        # 添加基本信息
-        csv_content.append(f"数据行数: {len(df)}")
-        csv_content.append(f"数据列数: {len(df.columns)}")
-        csv_content.append(f"使用编码: {used_encoding}")
-        
-        # 添加列名
-        headers = df.columns.tolist()
-        csv_content.append("列名: " + ", ".join(str(h) for h in headers))
-        
-        # 添加数据行（限制显示行数以避免过长）
-        max_rows = min(1000, len(df))  # 最多显示1000行
-        csv_content.append(f"\n数据内容（前{max_rows}行）:")
-        
-        for idx, row in df.head(max_rows).iterrows():
-            row_text = []
-            for col in headers:
-                value = row[col]
-                if pd.notna(value):
-                    row_text.append(f"{col}: {value}")
-            if row_text:
-                csv_content.append(" | ".join(row_text))
-        
-        if len(df) > max_rows:
-            csv_content.append(f"... (还有 {len(df) - max_rows} 行数据)")
-        
-        final_text = "\n".join(csv_content)
-        print(f"CSV文件处理完成，提取文本长度: {len(final_text)}")
-        
-        return final_text
-        
-    except Exception as e:
-        print(f"CSV处理错误: {str(e)}")
-        # 回退到基础文本处理
-        try:
-            for encoding in ['utf-8', 'gbk', 'gb2312', 'latin-1']:
-                try:
-                    with open(file_path, 'r', encoding=encoding) as f:
-                        content = f.read()
-                    return f"CSV基础文本提取（编码: {encoding}）:\n{content}"
-                except:
-                    continue
-            raise Exception("所有编码尝试失败")
-        except:
-            return f"CSV解析错误: {str(e)}"
+def encode_chunk_texts(texts: List[str]) -> EncodedChunks:
+    """入库用：分词一次，同时生成FAISS用的稠密向量，以及当前检索引擎需要的稀疏向量或BM25词列表"""
+    if not texts:
+        return EncodedChunks(np.zeros((0, vector_dimension), dtype='float32'))
+    engine = RETRIEVAL_CONFIG["ENGINE"]
+    token_lists = None
+    if vectorizer_backend.tokenized_input or engine in ("sparse", "bm25"):
+        # 整批一次分词（大批量走进程池），各检索结构共用同一份分词结果
+        token_lists = tokenization_service.tokenize_batch(texts)
+    vectors = _embed_chunks(texts, token_lists)
+    sparse_vectors = None
+    if engine == "sparse":
+        sparse_vectors = sparse_encoder.embed_sparse([' '.join(tokens) for tokens in token_lists])
+    return EncodedChunks(vectors, sparse_vectors, token_lists if engine == "bm25" else None)
+
+def simple_text_vectorize(text: str) -> np.ndarray:
+    """改进的文本向量化方法（单条文本，不更新统计，用于查询）"""
+    return vectorize_texts([text], update_stats=False)[0]
 
 def clean_text(text: str) -> str:
     """清理文本的简化版本"""
@@ -442,96 +236,329 @@ def clean_text(text: str) -> str:
     text = text.strip()  # 移除首尾空白
     return text
 
+def split_document(text: str) -> List[ChunkSpan]:
+    """按配置的分块模式、块大小和重叠切分文档，返回块偏移"""
+    splitter = iter_table_aware_spans if VECTOR_CONFIG["CHUNK_MODE"] == "table" else iter_chunk_spans
+    return list(splitter(
+        text,
+        VECTOR_CONFIG["CHUNK_SIZE"],
+        VECTOR_CONFIG["CHUNK_OVERLAP"],
+        VECTOR_CONFIG["MIN_CHUNK_LENGTH"]
+    ))
+
 def split_into_chunks(text: str, chunk_size: int = 1000) -> List[str]:
-    """改进的文本分块函数"""
+    """文本分块，返回块文本列表（需要偏移时用iter_chunk_spans）"""
     if not text:
         return []
-        
-    # 如果文本较短，直接返回
-    if len(text) <= chunk_size:
-        return [text]
+    return chunk_texts(text, list(iter_chunk_spans(text, chunk_size, min_length=VECTOR_CONFIG["MIN_CHUNK_LENGTH"])))
+
+def get_chunk_text(doc_info: Dict, chunk_index: int) -> str:
+    """按偏移从文档全文中取出文本块；流式处理中的文档尚未拼接全文，从块所在的页面文本中切片
     
-    chunks = []
+    检索在线程池中运行，可能与_finish_text_blocks交错：页面文本和偏移在同一个键下一次取得，取不到时全文已经写好。
+    """
+    span = doc_info['chunk_spans'][chunk_index]
+    text_blocks = doc_info.get('text_blocks')
+    if text_blocks is not None:
+        block_texts, block_offsets = text_blocks
+        block_index = bisect.bisect_right(block_offsets, span.start) - 1
+        return span_text(block_texts[block_index], _shift_span(span, -block_offsets[block_index]))
+    return span_text(doc_info['text'], span)
+
+def _finish_text_blocks(doc_info: Dict):
+    """流式处理完成后把页面文本一次拼接为全文：先写好全文，再去掉页面文本"""
+    block_texts, _ = doc_info['text_blocks']
+    doc_info['text'] = "\n\n".join(block_texts)
+    del doc_info['text_blocks']
+
+def fit_tfidf_vectorizer(all_texts: List[str]):
+    """拟合TF-IDF向量化器（仅tfidf后端需要；hashing后端增量统计，无需拟合）"""
+    if not isinstance(vectorizer_backend, TfidfBackend):
+        print(f"当前向量化后端为 {vectorizer_backend.name}，无需拟合")
+        return
     
-    # 按段落分割
-    paragraphs = text.split('\n\n')
-    current_chunk = ''
+    vectorizer_backend.fit([' '.join(tokens) for tokens in tokenization_service.tokenize_batch(all_texts)])
+    print("TF-IDF向量化器拟合完成")
+
+def _new_table_store_dir(file_ext: str) -> Optional[str]:
+    """为Excel/CSV文档分配列式数据目录，其他格式或未启用时返回None"""
+    if not TABULAR_CONFIG["ENABLED"] or file_ext not in ('.csv', '.xlsx', '.xls'):
+        return None
+    return os.path.join(TABULAR_CONFIG["DIR"], uuid.uuid4().hex)
+
+def _public_table_info(table_index: int, table: Dict) -> Dict:
+    """表格元数据对外展示时去掉磁盘路径"""
+    return {
+        "index": table_index,
+        "name": table["name"],
+        "rows": table["rows"],
+        "columns": table["columns"]
+    }
+
+def _remove_document_tables(doc_info: Dict):
+    """删除文档对应的列式数据目录"""
+    remove_store(doc_info.get('table_dir'))
+
+def _snapshot_state() -> Dict:
+    """快照中保存的状态（稠密索引单独序列化）；在快照线程中取值，版本检查保证期间没有修改"""
+    return {
+        "document_store": document_store,
+        "next_doc_id": next_doc_id,
+        "vector_id_to_chunk": vector_id_to_chunk,
+        "vectorizer_name": vectorizer_backend.name,
+        "vectorizer_version": getattr(vectorizer_backend, "version", ""),
+        # tfidf/hashing的向量依赖拟合的词表或IDF统计，需要一起保存；句向量模型无状态
+        "vectorizer": None if vectorizer_backend.cacheable else vectorizer_backend,
+        "sparse_encoder": sparse_encoder,
+        "sparse_index": sparse_index,
+        "bm25_index": bm25_index
+    }
+
+def _retrieval_signature() -> Dict:
+    """检索索引依赖的配置：检索引擎，稀疏检索还依赖哈希空间大小"""
+    engine = RETRIEVAL_CONFIG["ENGINE"]
+    return {
+        "engine": engine,
+        "sparse_features": RETRIEVAL_CONFIG["SPARSE_FEATURES"] if engine == "sparse" else None
+    }
+
+def _snapshot_metadata() -> Dict:
+    """写入快照头部的检索配置和数量，加载时据此校验快照"""
+    return {
+        "retrieval": _retrieval_signature(),
+        "counts": {
+            "documents": len(document_store),
+            "vectors": index.ntotal,
+            "sparse_rows": sparse_index.ntotal,
+            "bm25_rows": bm25_index.ntotal
+        }
+    }
+
+def _retrieval_mismatch(saved: Dict) -> Optional[str]:
+    """快照中的检索索引不能直接使用的原因；配置一致且当前引擎的索引覆盖整个向量ID空间时返回None
     
-    for paragraph in paragraphs:
-        paragraph = paragraph.strip()
-        if not paragraph:
-            continue
-            
-        # 如果当前段落加上现有块不超过限制
-        if len(current_chunk) + len(paragraph) + 2 <= chunk_size:
-            if current_chunk:
-                current_chunk += '\n\n' + paragraph
-            else:
-                current_chunk = paragraph
+    同一配置下每批向量都同步加入当前引擎的索引，其行数等于FAISS的next_id；不相等说明有向量没有加入。
+    """
+    current = _retrieval_signature()
+    if saved != current:
+        return f"快照的检索配置 {saved} 与当前配置 {current} 不一致"
+    engine_index = {"sparse": sparse_index, "bm25": bm25_index}.get(current["engine"])
+    if engine_index is not None and engine_index.ntotal != index.next_id:
+        return f"{current['engine']}索引的行数 {engine_index.ntotal} 与向量ID空间 {index.next_id} 不一致"
+    return None
+
+def _rebuild_retrieval_indexes():
+    """按文档存储重建稀疏索引和BM25：当前引擎的索引加入全部未删除的向量（行号沿用FAISS向量ID），另一个清空"""
+    global sparse_encoder, sparse_index, bm25_index
+    rebuild_start = time.perf_counter()
+    sparse_encoder = HashingBackend(RETRIEVAL_CONFIG["SPARSE_FEATURES"])
+    sparse_index = SparseChunkIndex(RETRIEVAL_CONFIG["SPARSE_FEATURES"], **TOMBSTONE_LIMITS)
+    bm25_index = BM25Index(**TOMBSTONE_LIMITS)
+    engine = RETRIEVAL_CONFIG["ENGINE"]
+    vector_ids = sorted(vector_id_to_chunk) if engine in ("sparse", "bm25") else []
+    if vector_ids:
+        texts = [
+            get_chunk_text(document_store[doc_id], chunk_index)
+            for doc_id, chunk_index in (vector_id_to_chunk[vector_id] for vector_id in vector_ids)
+        ]
+        token_lists = tokenization_service.tokenize_batch(texts)
+        if engine == "sparse":
+            sparse_index.add(sparse_encoder.embed_sparse([' '.join(tokens) for tokens in token_lists]), vector_ids)
         else:
-            # 保存当前块
-            if current_chunk.strip():
-                chunks.append(current_chunk.strip())
-            
-            # 如果单个段落太长，按句子分割
-            if len(paragraph) > chunk_size:
-                sentences = paragraph.replace('。', '。\n').split('\n')
-                temp_chunk = ''
-                for sentence in sentences:
-                    sentence = sentence.strip()
-                    if not sentence:
-                        continue
-                        
-                    if len(temp_chunk) + len(sentence) + 1 <= chunk_size:
-                        if temp_chunk:
-                            temp_chunk += sentence
-                        else:
-                            temp_chunk = sentence
-                    else:
-                        if temp_chunk.strip():
-                            chunks.append(temp_chunk.strip())
-                        temp_chunk = sentence
-                
-                if temp_chunk.strip():
-                    current_chunk = temp_chunk
-                else:
-                    current_chunk = ''
-            else:
-                current_chunk = paragraph
+            bm25_index.add_documents(token_lists, vector_ids)
+    # 末尾的向量已删除时补齐ID空间，下次加载时行数校验仍然成立
+    sparse_index.pad(index.next_id)
+    bm25_index.pad(index.next_id)
+    print(f"检索索引重建完成: {engine}，{len(vector_ids)} 个文本块，耗时 {time.perf_counter() - rebuild_start:.2f}秒")
+
+def _restore_snapshot():
+    """启动时加载最近一次快照
     
-    # 添加最后一个块
-    if current_chunk.strip():
-        chunks.append(current_chunk.strip())
+    向量化后端与快照不一致时忽略快照（已有向量无法与新的查询向量比较）；文档数、向量数与头部记录不符时视为损坏，
+    同样忽略。检索配置变化或当前引擎的索引没有覆盖全部向量时，按文档存储重建稀疏索引和BM25。
+    """
+    global vectorizer_backend, sparse_encoder, sparse_index, bm25_index, next_doc_id
+    load_start = time.perf_counter()
+    try:
+        loaded = snapshot_store.load()
+        if loaded is None:
+            return
+        index_path, header, state = loaded
+        if (state["vectorizer_name"], state["vectorizer_version"]) != (vectorizer_backend.name, getattr(vectorizer_backend, "version", "")):
+            print(f"快照的向量化后端 {state['vectorizer_name']} 与当前配置不一致，忽略快照")
+            return
+        counts = header["counts"]
+        actual = {
+            "documents": len(state["document_store"]),
+            "sparse_rows": state["sparse_index"].ntotal,
+            "bm25_rows": state["bm25_index"].ntotal
+        }
+        if any(counts[key] != value for key, value in actual.items()):
+            print(f"快照内容 {actual} 与头部记录 {counts} 不一致，忽略快照")
+            return
+        index.load(index_path, header["index_state"])
+        if index.ntotal != counts["vectors"]:
+            print(f"快照索引的向量数 {index.ntotal} 与头部记录 {counts['vectors']} 不一致，忽略快照")
+            index.reset()
+            return
+    except Exception as e:
+        print(f"加载快照失败，以空状态启动: {str(e)}")
+        index.reset()
+        return
     
-    # 过滤过短的块
-    filtered_chunks = [chunk for chunk in chunks if len(chunk.strip()) > 20]
+    document_store.clear()
+    document_store.update(state["document_store"])
+    next_doc_id = state["next_doc_id"]
+    vector_id_to_chunk.clear()
+    vector_id_to_chunk.update(state["vector_id_to_chunk"])
+    if state["vectorizer"] is not None:
+        vectorizer_backend = state["vectorizer"]
+    sparse_encoder = state["sparse_encoder"]
+    sparse_index = state["sparse_index"]
+    bm25_index = state["bm25_index"]
+    for doc_info in document_store.values():
+        # 快照时仍在流式处理的文档不完整，放弃已入库的部分
+        if doc_info.get('status') == 'processing':
+            doc_info['status'] = 'failed'
+            _discard_partial_document(doc_info)
     
-    # 如果没有有效块，返回原文本
-    if not filtered_chunks:
-        return [text]
+    rebuild_reason = _retrieval_mismatch(header["retrieval"])
+    if rebuild_reason is not None:
+        print(f"{rebuild_reason}，按文档存储重建检索索引")
+        _rebuild_retrieval_indexes()
+        # 调度启动后保存重建结果，下次启动不必再重建
+        snapshot_scheduler.mark_dirty()
     
-    return filtered_chunks
+    snapshot_store.last_load = {
+        "seconds": round(time.perf_counter() - load_start, 3),
+        "documents": len(document_store),
+        "vectors": index.ntotal,
+        "index_type": index.kind,
+        "mmapped": index.mmap_path is not None,
+        "retrieval_rebuilt": rebuild_reason is not None
+    }
+    print(f"已加载快照: {snapshot_store.last_load}")
 
-def fit_tfidf_vectorizer(all_texts: List[str]):
-    """拟合TF-IDF向量化器"""
-    global tfidf_vectorizer, tfidf_fitted
+def _allocate_doc_id() -> int:
+    """分配新的文档ID（在事件循环中同步调用）"""
+    global next_doc_id
+    doc_id = next_doc_id
+    next_doc_id += 1
+    return doc_id
+
+def _delete_document(doc_id: int) -> Dict:
+    """从文档存储和各索引中删除一个文档，返回被删除的文档信息
     
-    # 对所有文本进行中文分词
-    processed_texts = []
-    for text in all_texts:
-        words = list(jieba.cut(text))
-        processed_texts.append(' '.join(words))
+    向量只记为删除（稠密索引的墓碑达到阈值后在后台压缩），不重建整个索引。
+    """
+    with _mutating_state():
+        doc_info = document_store.pop(doc_id)
+        _remove_document_vectors(doc_info)
+        _remove_document_tables(doc_info)
+    print(f"文档已删除，ID: {doc_id}，文件名: {doc_info['filename']}，向量数: {len(doc_info['vector_ids'])}")
+    return doc_info
+
+def _remove_document_vectors(doc_info: Dict):
+    """从各索引中删除文档的向量（记为删除，墓碑达到阈值后各自压缩），并从hashing向量化的文档频率中扣除"""
+    vector_ids = doc_info['vector_ids']
+    for vector_id in vector_ids:
+        vector_id_to_chunk.pop(vector_id, None)
+    if isinstance(vectorizer_backend, HashingBackend):
+        # hashing向量的非零位置就是文本块出现的特征
+        vectors = index.reconstruct(vector_ids)
+        vectorizer_backend.forget(np.count_nonzero(vectors, axis=0), len(vectors))
+    index.remove(vector_ids)
+    feature_counts, rows = sparse_index.remove(vector_ids)
+    if rows:
+        sparse_encoder.forget(feature_counts, rows)
+    bm25_index.remove(vector_ids)
+
+def _discard_partial_document(doc_info: Dict):
+    """处理失败或中断的文档：删除已入库的部分向量和列式数据，只保留文档记录和状态"""
+    _remove_document_vectors(doc_info)
+    _remove_document_tables(doc_info)
+    if 'text_blocks' in doc_info:
+        _finish_text_blocks(doc_info)
+    doc_info['chunk_spans'] = []
+    doc_info['vector_ids'] = []
+    doc_info['tables'] = []
+
+def _check_replace_target(replace_doc_id: Optional[int]) -> Optional[str]:
+    """上传前校验replace_doc_id，返回错误信息；正在处理中的文档不能被替换（与删除接口一致）"""
+    if replace_doc_id is None:
+        return None
+    if replace_doc_id not in document_store:
+        return f"要替换的文档不存在: {replace_doc_id}"
+    if document_store[replace_doc_id].get('status') == 'processing':
+        return f"要替换的文档正在处理中，请处理完成后再替换: {replace_doc_id}"
+    return None
+
+def _documents_to_replace(doc_id: int, filename: str, replace_doc_id: Optional[int],
+                          replace_same_filename: Optional[bool]) -> Tuple[List[int], List[int]]:
+    """新文档入库后要删除的旧文档，返回 (要删除的文档ID, 因仍在处理中而跳过的同名文档ID)
     
-    # 拟合TF-IDF向量化器
-    tfidf_vectorizer.fit(processed_texts)
-    tfidf_fitted = True
-    print("TF-IDF向量化器拟合完成")
+    指定了replace_doc_id时只替换该文档；否则只有replace_same_filename为True（未传时取REPLACE_SAME_FILENAME配置，默认关闭）
+    才替换同名文档，失败或中断的同名文档一并删除。
+    """
+    if replace_doc_id is not None:
+        return ([replace_doc_id] if replace_doc_id in document_store and replace_doc_id != doc_id else []), []
+    if replace_same_filename is None:
+        replace_same_filename = FILE_CONFIG["REPLACE_SAME_FILENAME"]
+    if not replace_same_filename:
+        return [], []
+    same_name = [
+        other_id for other_id, info in document_store.items()
+        if other_id != doc_id and info['filename'] == filename
+    ]
+    processing = [other_id for other_id in same_name if document_store[other_id].get('status') == 'processing']
+    return [other_id for other_id in same_name if other_id not in processing], processing
+
+def _replace_documents(doc_id: int, filename: str, replace_doc_id: Optional[int],
+                       replace_same_filename: Optional[bool]) -> Dict[str, List[int]]:
+    """删除被新文档替换的旧文档，返回被删除和被跳过（同名文档仍在处理中，需要处理完成后再删除）的文档ID"""
+    replaced_doc_ids, skipped_doc_ids = _documents_to_replace(doc_id, filename, replace_doc_id, replace_same_filename)
+    for old_doc_id in replaced_doc_ids:
+        _delete_document(old_doc_id)
+    if skipped_doc_ids:
+        print(f"同名文档仍在处理中，未替换: {skipped_doc_ids}")
+    return {"replaced_doc_ids": replaced_doc_ids, "replace_skipped_doc_ids": skipped_doc_ids}
+
+@contextmanager
+def _mutating_state():
+    """包住事件循环中修改文档存储和各索引的代码块：开始和结束时状态版本各加1，结束时通知快照调度
+    
+    快照在线程中序列化，版本为奇数或序列化前后版本不同时作废重试；嵌套使用（包括并发的请求）时只在最外层计数。
+    块内可以await（如在线程池中写入索引），期间版本保持奇数，快照等块结束后再保存。
+    """
+    global state_version, _mutation_depth
+    if _mutation_depth == 0:
+        state_version += 1
+    _mutation_depth += 1
+    try:
+        yield
+    finally:
+        _mutation_depth -= 1
+        if _mutation_depth == 0:
+            state_version += 1
+            if snapshot_scheduler is not None:
+                snapshot_scheduler.mark_dirty()
 
 @app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
-    """文件上传处理 - 简化版"""
+async def upload_file(file: UploadFile = File(...), profile: Optional[str] = Form(None),
+                      replace_doc_id: Optional[int] = Form(None),
+                      replace_same_filename: Optional[bool] = Form(None)):
+    """文件上传处理 - 简化版，profile为PDF提取档位（fast/balanced/thorough）
+    
+    新文档入库成功后删除replace_doc_id指定的旧文档；未指定时，replace_same_filename为True（未传时取配置，默认关闭）
+    才删除同名的旧文档（更新文档）。默认同名文件各自保留。
+    """
     print(f"\n=== 开始处理上传文件 ===")
     print(f"文件名: {file.filename}")
+    profile = profile or PDF_CONFIG["DEFAULT_PROFILE"]
+    # 已写入列式数据但文档未能入库时，在finally中删除列式数据目录
+    table_dir = None
+    document_stored = False
+    vector_ids: List[int] = []
     
     try:
         # 基本检查
@@ -557,17 +584,44 @@ async def upload_file(file: UploadFile = File(...)):
             print(f"返回结果: {result}")
             return result
         
+        if profile not in PDF_CONFIG["PROFILES"]:
+            result = {
+                "success": False,
+                "message": f"不支持的提取档位: {profile}。可选档位：{', '.join(PDF_CONFIG['PROFILES'])}"
+            }
+            print(f"返回结果: {result}")
+            return result
+        
+        replace_error = _check_replace_target(replace_doc_id)
+        if replace_error:
+            result = {
+                "success": False,
+                "message": replace_error
+            }
+            print(f"返回结果: {result}")
+            return result
+        
         # 创建临时目录
-        temp_dir = "temp"
-        if not os.path.exists(temp_dir):
-            os.makedirs(temp_dir)
-            print(f"创建临时目录: {temp_dir}")
+        ensure_temp_dir()
         
-        # 保存文件
-        temp_path = os.path.join(temp_dir, f"temp_{file.filename}")
-        content = await file.read()
+        # 分块流式保存文件，边写边检查大小
+        temp_path = get_temp_path(file.filename)
+        try:
+            file_size = await save_upload_file(
+                file,
+                temp_path,
+                max_size=FILE_CONFIG["MAX_FILE_SIZE"],
+                chunk_size=FILE_CONFIG["UPLOAD_CHUNK_SIZE"]
+            )
+        except UploadTooLargeError as size_error:
+            result = {
+                "success": False,
+                "message": str(size_error)
+            }
+            print(f"返回结果: {result}")
+            return result
         
-        if len(content) == 0:
+        if file_size == 0:
             result = {
                 "success": False,
                 "message": "上传的文件为空"
@@ -575,25 +629,19 @@ async def upload_file(file: UploadFile = File(...)):
             print(f"返回结果: {result}")
             return result
         
-        with open(temp_path, "wb") as f:
-            f.write(content)
-        
         print(f"文件已保存到: {temp_path}")
-        print(f"文件大小: {len(content)} 字节")
+        print(f"文件大小: {file_size} 字节")
         
-        # 提取文本
+        # 提取文本（在执行器中运行，不阻塞事件循环）
         text = ""
+        pdf_stats = None
+        table_dir = _new_table_store_dir(file_ext)
+        extraction_started_at = time.time()
+        extraction_start = time.perf_counter()
         try:
             if file_ext == '.txt':
                 # 纯文本文件处理
-                for encoding in ['utf-8', 'gbk', 'gb2312', 'latin-1']:
-                    try:
-                        with open(temp_path, 'r', encoding=encoding) as f:
-                            text = f.read()
-                        print(f"成功使用编码 {encoding} 读取TXT文件")
-                        break
-                    except UnicodeDecodeError:
-                        continue
+                text = await run_extraction(extract_text_from_txt, temp_path)
                 if not text:
                     result = {
                         "success": False,
@@ -604,22 +652,22 @@ async def upload_file(file: UploadFile = File(...)):
             elif file_ext == '.csv':
                 # CSV文件专门处理
                 print(f"开始处理CSV文件: {file.filename}")
-                text = extract_text_from_csv(temp_path)
+                text = await run_extraction(extract_text_from_csv, temp_path, table_dir=table_dir)
                 print(f"CSV文件处理完成，提取文本长度: {len(text)}")
             elif file_ext in ['.xlsx', '.xls']:
                 # Excel文件支持
                 print(f"开始处理Excel文件: {file.filename}")
-                text = extract_text_from_excel(temp_path)
+                text = await run_extraction(extract_text_from_excel, temp_path, table_dir=table_dir)
                 print(f"Excel文件处理完成，提取文本长度: {len(text)}")
             elif file_ext == '.docx':
                 # Word文档支持（包含表格）
                 print(f"开始处理Word文档: {file.filename}")
-                text = extract_text_from_docx(temp_path)
+                text = await run_extraction(extract_text_from_docx, temp_path)
                 print(f"Word文档处理完成，提取文本长度: {len(text)}")
             elif file_ext == '.pdf':
                 # PDF文件支持
                 print(f"开始处理PDF文件: {file.filename}")
-                text = extract_text_from_pdf(temp_path)
+                text, pdf_stats = await run_extraction(extract_pdf_with_stats, temp_path, profile=profile)
                 print(f"PDF文件处理完成，提取文本长度: {len(text)}")
             else:
                 # 其他文件类型暂不支持
@@ -666,27 +714,54 @@ async def upload_file(file: UploadFile = File(...)):
             print(f"返回结果: {result}")
             return result
         
-        print(f"成功提取文本，长度: {len(text)}")
+        extraction_time = time.perf_counter() - extraction_start
+        print(f"成功提取文本，长度: {len(text)}，耗时: {extraction_time:.2f}秒")
         
-        # 简化处理：直接存储文本，不进行向量化
-        doc_id = len(document_store)
-        document_store[doc_id] = {
-            'filename': file.filename,
-            'text': text,
-            'chunks': [text],  # 简化：不分块
-            'vector_ids': []
-        }
+        # 分块并批量向量化，再一次性加入索引
+        chunk_spans, encoded, stage_times = await run_in_threadpool(_chunk_and_vectorize, text)
         
-        print(f"文档已存储，ID: {doc_id}")
+        tables = list_tables(table_dir)
+        with _mutating_state():
+            index_start = time.perf_counter()
+            doc_id = _allocate_doc_id()
+            await _add_vectors(doc_id, encoded, vector_ids)
+            stage_times["indexing"] = time.perf_counter() - index_start
+            
+            document_store[doc_id] = {
+                'filename': file.filename,
+                'text': text,
+                'chunk_spans': chunk_spans,  # 只保存偏移，块文本从text中按需切片
+                'vector_ids': vector_ids,
+                'table_dir': table_dir,
+                'tables': tables
+            }
+            document_stored = True
+            
+            print(f"文档已存储，ID: {doc_id}，块数: {len(chunk_spans)}，向量数: {len(vector_ids)}")
+            replacement = _replace_documents(doc_id, file.filename, replace_doc_id, replace_same_filename)
         
         result = {
             "success": True,
             "message": f"成功处理文件：{file.filename}",
+            "doc_id": doc_id,
+            **replacement,
             "stats": {
                 "text_length": len(text),
-                "chunks_count": 1,
-                "vector_dimension": 0,
-                "vectors_created": 0
+                "chunks_count": len(chunk_spans),
+                "vector_dimension": vector_dimension,
+                "vectors_created": len(vector_ids),
+                "extraction_time": round(extraction_time, 3),
+                "stage_times": {
+                    "extraction": round(extraction_time, 3),
+                    "chunking": round(stage_times["chunking"], 3),
+                    "vectorization": round(stage_times["vectorization"], 3),
+                    "indexing": round(stage_times["indexing"], 3)
+                },
+                "extraction_executor": EXTRACTION_CONFIG["EXECUTOR"],
+                "extraction_profile": profile if file_ext == '.pdf' else None,
+                "pdf_stats": pdf_stats,
+                "tables_stored": len(tables),
+                "max_event_loop_lag_ms": loop_lag_monitor.max_lag_since(extraction_started_at)
             }
         }
         
@@ -707,6 +782,12 @@ async def upload_file(file: UploadFile = File(...)):
         return result
         
     finally:
+        if not document_stored:
+            remove_store(table_dir)
+            if vector_ids:
+                # 向量已入库但文档未能存储（出错或请求被取消）
+                with _mutating_state():
+                    _remove_document_vectors({'vector_ids': vector_ids})
         # 清理临时文件
         if 'temp_path' in locals() and os.path.exists(temp_path):
             try:
@@ -716,6 +797,250 @@ async def upload_file(file: UploadFile = File(...)):
                 print(f"删除临时文件失败: {str(e)}")
         print("=== 文件处理结束 ===\n")
 
+def _chunk_and_vectorize(text: str):
+    """分块并批量向量化（CPU密集，在线程池中运行），返回 (块偏移, 入库数据, 各阶段耗时)"""
+    chunk_start = time.perf_counter()
+    spans = split_document(text)
+    chunking_time = time.perf_counter() - chunk_start
+    
+    vectorize_start = time.perf_counter()
+    encoded = encode_chunk_texts(chunk_texts(text, spans))
+    vectorization_time = time.perf_counter() - vectorize_start
+    
+    return spans, encoded, {"chunking": chunking_time, "vectorization": vectorization_time}
+
+def _shift_span(span: ChunkSpan, offset: int) -> ChunkSpan:
+    """把块内偏移换算为文档全文中的偏移（表头偏移一并换算）"""
+    if span.header_start < 0:
+        return ChunkSpan(span.start + offset, span.end + offset)
+    return ChunkSpan(span.start + offset, span.end + offset, span.header_start + offset, span.header_end + offset)
+
+def _index_batch(encoded: EncodedChunks) -> List[int]:
+    """index.add加入整批向量（稀疏向量、BM25词列表同步加入对应索引），返回分配的向量ID（在线程池中运行）
+    
+    稀疏索引和BM25按FAISS分配的向量ID记录行，三者共用vector_id_to_chunk，不依赖各自的追加顺序一致。
+    """
+    vector_ids = index.add(encoded.vectors)
+    if encoded.sparse_vectors is not None:
+        sparse_index.add(encoded.sparse_vectors, vector_ids)
+    if encoded.token_lists is not None:
+        bm25_index.add_documents(encoded.token_lists, vector_ids)
+    return vector_ids
+
+async def _add_vectors(doc_id: int, encoded: EncodedChunks, vector_ids: List[int], first_chunk_index: int = 0):
+    """在线程池中把整批向量写入各索引（HNSW插入是同步计算，不能阻塞事件循环），再记录向量ID与文档块的对应关系
+    
+    分配的向量ID追加到vector_ids；请求在写入期间被取消时，等写入完成后照样追加再抛出，调用方据此删除已入库的向量。
+    写入完成前检索结果中的这些向量找不到对应的文档块，会被跳过。调用方在_mutating_state内调用。
+    """
+    if len(encoded.vectors) == 0:
+        return
+    async with _index_write_lock:
+        write = asyncio.ensure_future(run_in_threadpool(_index_batch, encoded))
+        try:
+            added = await asyncio.shield(write)
+        except asyncio.CancelledError:
+            vector_ids.extend(await write)
+            raise
+    vector_ids.extend(added)
+    for offset, vector_id in enumerate(added):
+        vector_id_to_chunk[vector_id] = (doc_id, first_chunk_index + offset)
+
+async def _iter_document_blocks(file_path: str, file_ext: str, profile: str, table_dir: Optional[str] = None):
+    """按块产出文档内容 (块序号, 总块数, 块文本)：PDF逐页、CSV逐个读取块产出，其他格式整体作为一块
+    
+    table_dir不为空时，Excel/CSV的数据同时写入列式存储。调用方提前关闭时，逐页读取的生成器随之关闭。
+    """
+    if file_ext == '.pdf':
+        pages = iterate_in_thread(iter_pdf_pages(file_path, profile))
+        try:
+            async for page_num, page_count, page_text, _ in pages:
+                yield page_num, page_count, page_text
+        finally:
+            await pages.aclose()
+        return
+    
+    if file_ext == '.csv':
+        # CSV按读取块产出，总块数事先未知
+        block_num = 0
+        csv_blocks = iterate_in_thread(iter_csv_blocks(file_path, table_dir=table_dir))
+        try:
+            async for block_text in csv_blocks:
+                block_num += 1
+                yield block_num, None, block_text
+        finally:
+            await csv_blocks.aclose()
+        return
+    
+    extractors_by_ext = {
+        '.txt': extract_text_from_txt,
+        '.docx': extract_text_from_docx,
+    }
+    if file_ext in ('.xlsx', '.xls'):
+        text = await run_extraction(extract_text_from_excel, file_path, table_dir=table_dir)
+    else:
+        text = await run_extraction(extractors_by_ext[file_ext], file_path)
+    yield 1, 1, text
+
+@app.post("/upload/stream")
+async def upload_file_stream(file: UploadFile = File(...), profile: Optional[str] = Form(None),
+                             replace_doc_id: Optional[int] = Form(None),
+                             replace_same_filename: Optional[bool] = Form(None)):
+    """流式文件上传：逐页提取、分块并建立索引，以SSE事件推送处理进度；处理完成后按replace_doc_id替换旧文档，
+    或在replace_same_filename（未传时取配置，默认关闭）为True时替换同名文档"""
+    print(f"\n=== 开始流式处理上传文件 ===")
+    print(f"文件名: {file.filename}")
+    profile = profile or PDF_CONFIG["DEFAULT_PROFILE"]
+    
+    def error_response(message: str):
+        async def error_stream():
+            yield f"data: {json.dumps({'type': 'error', 'message': message}, ensure_ascii=False)}\n\n"
+        return StreamingResponse(error_stream(), media_type="text/event-stream")
+    
+    if not file.filename:
+        return error_response("文件名不能为空")
+    
+    file_ext = os.path.splitext(file.filename)[1].lower()
+    if file_ext not in FILE_CONFIG["ALLOWED_EXTENSIONS"]:
+        return error_response(f"不支持的文件类型: {file_ext}。支持的格式：{', '.join(FILE_CONFIG['ALLOWED_EXTENSIONS'])}")
+    
+    if profile not in PDF_CONFIG["PROFILES"]:
+        return error_response(f"不支持的提取档位: {profile}。可选档位：{', '.join(PDF_CONFIG['PROFILES'])}")
+    
+    replace_error = _check_replace_target(replace_doc_id)
+    if replace_error:
+        return error_response(replace_error)
+    
+    # 先把上传内容流式落盘，再开始推送进度
+    ensure_temp_dir()
+    temp_path = get_temp_path(file.filename)
+    try:
+        file_size = await save_upload_file(
+            file,
+            temp_path,
+            max_size=FILE_CONFIG["MAX_FILE_SIZE"],
+            chunk_size=FILE_CONFIG["UPLOAD_CHUNK_SIZE"]
+        )
+    except UploadTooLargeError as size_error:
+        return error_response(str(size_error))
+    
+    if file_size == 0:
+        os.remove(temp_path)
+        return error_response("上传的文件为空")
+    
+    filename = file.filename
+    
+    async def progress_stream():
+        start_time = time.perf_counter()
+        chunks_indexed = 0
+        
+        # 先登记文档，后续逐页追加内容，已处理的页面可以立即被问答检索到；
+        # 页面文本和各页在全文中的偏移先收集在text_blocks中，处理完成后一次拼接为全文
+        with _mutating_state():
+            doc_id = _allocate_doc_id()
+            document_store[doc_id] = {
+                'filename': filename,
+                'text': '',
+                'text_blocks': ([], []),
+                'chunk_spans': [],
+                'vector_ids': [],
+                'table_dir': _new_table_store_dir(file_ext),
+                'tables': [],
+                'status': 'processing'
+            }
+            doc_info = document_store[doc_id]
+        text_length = 0
+        blocks = _iter_document_blocks(temp_path, file_ext, profile, doc_info['table_dir'])
+        
+        try:
+            yield f"data: {json.dumps({'type': 'start', 'doc_id': doc_id, 'filename': filename, 'file_size': file_size}, ensure_ascii=False)}\n\n"
+            
+            async for block_num, block_count, block_text in blocks:
+                if block_text.strip():
+                    block_texts, block_offsets = doc_info['text_blocks']
+                    block_offset = text_length + 2 if block_texts else 0
+                    spans, encoded, _ = await run_in_threadpool(_chunk_and_vectorize, block_text)
+                    with _mutating_state():
+                        # 先追加文本再追加偏移：检索按偏移定位到的页面总是已经存在
+                        block_texts.append(block_text)
+                        block_offsets.append(block_offset)
+                        text_length = block_offset + len(block_text)
+                        first_chunk_index = len(doc_info['chunk_spans'])
+                        # 块偏移换算到文档全文中的位置；先登记块偏移，写入索引后这些块才能被检索到
+                        doc_info['chunk_spans'].extend(_shift_span(span, block_offset) for span in spans)
+                        await _add_vectors(doc_id, encoded, doc_info['vector_ids'], first_chunk_index)
+                    chunks_indexed += len(spans)
+                
+                progress = {
+                    'type': 'progress',
+                    'doc_id': doc_id,
+                    'page': block_num,
+                    'total_pages': block_count,
+                    'chunks_indexed': chunks_indexed,
+                    'elapsed': round(time.perf_counter() - start_time, 3)
+                }
+                yield f"data: {json.dumps(progress, ensure_ascii=False)}\n\n"
+            
+            tables = list_tables(doc_info['table_dir'])
+            with _mutating_state():
+                _finish_text_blocks(doc_info)
+                doc_info['tables'] = tables
+                doc_info['status'] = 'ready'
+                replacement = _replace_documents(doc_id, filename, replace_doc_id, replace_same_filename)
+            complete = {
+                'type': 'complete',
+                'doc_id': doc_id,
+                **replacement,
+                'message': f"成功处理文件：{filename}",
+                'stats': {
+                    'text_length': len(doc_info['text']),
+                    'chunks_count': len(doc_info['chunk_spans']),
+                    'vector_dimension': vector_dimension,
+                    'vectors_created': len(doc_info['vector_ids']),
+                    'tables_stored': len(doc_info['tables']),
+                    'elapsed': round(time.perf_counter() - start_time, 3)
+                }
+            }
+            print(f"流式处理完成，文档ID: {doc_id}，块数: {chunks_indexed}")
+            yield f"data: {json.dumps(complete, ensure_ascii=False)}\n\n"
+            
+        except Exception as e:
+            print(f"流式处理错误: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            with _mutating_state():
+                doc_info['status'] = 'failed'
+            yield f"data: {json.dumps({'type': 'error', 'doc_id': doc_id, 'message': f'处理文件失败: {str(e)}'}, ensure_ascii=False)}\n\n"
+            
+        finally:
+            # 客户端断开时抛出的是CancelledError/GeneratorExit，不会进入上面的except；
+            # 未完成的文档在这里统一收尾，已入库的部分向量一并删除
+            await blocks.aclose()
+            if doc_info['status'] != 'ready':
+                with _mutating_state():
+                    if doc_info['status'] == 'processing':
+                        doc_info['status'] = 'cancelled'
+                        print(f"流式处理被中断，文档ID: {doc_id}")
+                    _discard_partial_document(doc_info)
+            # 清理临时文件
+            if os.path.exists(temp_path):
+                try:
+                    os.remove(temp_path)
+                    print(f"已删除临时文件: {temp_path}")
+                except Exception as e:
+                    print(f"删除临时文件失败: {str(e)}")
+            print("=== 流式文件处理结束 ===\n")
+    
+    return StreamingResponse(
+        progress_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
 @app.post("/ask")
 async def ask_question(question: QuestionRequest):
     """处理问答请求"""
@@ -741,8 +1066,11 @@ async def ask_question(question: QuestionRequest):
     try:
         print("开始处理问答...")
         
-        # 使用更高效的文本搜索算法
-        relevant_docs = improved_text_search(question.text, list(document_store.values()))
+        # 按配置的检索引擎查找相关文本块
+        search_start = time.perf_counter()
+        relevant_docs = await run_in_threadpool(search_chunks, question.text, RETRIEVAL_CONFIG["TOP_K"])
+        search_time = time.perf_counter() - search_start
+        print(f"检索引擎: {RETRIEVAL_CONFIG['ENGINE']}，命中 {len(relevant_docs)} 个结果，耗时: {search_time * 1000:.1f}毫秒")
         
         # 如果没有找到相关文档，返回所有文档的片段
         if not relevant_docs:
@@ -762,7 +1090,9 @@ async def ask_question(question: QuestionRequest):
             relevant_chunks.append({
                 'text': doc['text'][:2000],  # 大幅增加到2000字符
                 'filename': doc['filename'],
-                'similarity': doc['similarity']
+                'similarity': doc['similarity'],
+                'doc_id': doc.get('doc_id'),
+                'chunk_index': doc.get('chunk_index')
             })
         
         context = "\n\n".join(context_parts)
@@ -798,11 +1128,19 @@ async def get_status():
         "stats": {
             "total_documents": len(document_store),
             "total_vectors": index.ntotal,
-            "tfidf_fitted": tfidf_fitted,
+            "vector_index": index.stats(),
+            "persistence": snapshot_store.stats() if snapshot_scheduler is not None else None,
+            "retrieval_engine": RETRIEVAL_CONFIG["ENGINE"],
+            "sparse_vectors": sparse_index.ntotal,
+            "bm25": bm25_index.stats(),
+            "tfidf_fitted": vectorizer_backend.fitted,
+            "vectorizer": vectorizer_backend.stats(),
+            "embedding_cache": embedding_cache.stats() if embedding_cache is not None else None,
             "files": [
                 {
                     "filename": info["filename"],
-                    "chunks": len(info["chunks"])
+                    "chunks": len(info["chunk_spans"]),
+                    "vectors": len(info["vector_ids"])
                 }
                 for info in document_store.values()
             ]
@@ -812,32 +1150,75 @@ async def get_status():
 @app.delete("/documents")
 async def clear_documents():
     """清空所有文档"""
-    global document_store, index, tfidf_fitted
+    global document_store
     
-    # 清空文档存储
-    document_store.clear()
+    # 等正在进行的索引写入完成后再清空
+    async with _index_write_lock:
+        with _mutating_state():
+            # 清空文档存储（连同列式数据）
+            for doc_info in document_store.values():
+                _remove_document_tables(doc_info)
+            document_store.clear()
+            
+            # 清空索引（回到Flat）
+            index.reset()
+            vector_id_to_chunk.clear()
+            
+            # 重置向量化统计和稀疏索引
+            vectorizer_backend.reset()
+            sparse_encoder.reset()
+            sparse_index.reset()
+            bm25_index.reset()
     
-    # 重新创建索引
-    index = faiss.IndexFlatL2(vector_dimension)
+    return {
+        "success": True,
+        "message": "所有文档已清空"
+    }
+
+@app.delete("/documents/{doc_id}")
+async def delete_document(doc_id: int):
+    """删除单个文档：向量在各索引中记为删除，不重建整个索引"""
+    if doc_id not in document_store:
+        return {
+            "success": False,
+            "message": f"文档不存在: {doc_id}"
+        }
     
-    # 重置TF-IDF
-    tfidf_fitted = False
+    if document_store[doc_id].get('status') == 'processing':
+        return {
+            "success": False,
+            "message": f"文档正在处理中，请处理完成后再删除: {doc_id}"
+        }
     
+    doc_info = _delete_document(doc_id)
     return {
         "success": True,
-        "message": "所有文档已清空"
+        "message": f"已删除文档：{doc_info['filename']}",
+        "data": {
+            "doc_id": doc_id,
+            "vectors_removed": len(doc_info['vector_ids']),
+            "total_documents": len(document_store),
+            "total_vectors": index.ntotal
+        }
     }
 
 @app.post("/debug/reset")
 async def debug_reset():
     """调试：重置所有状态"""
-    global document_store, index, tfidf_fitted, tfidf_vectorizer
+    global document_store
     
     # 清空所有状态
-    document_store.clear()
-    index = faiss.IndexFlatL2(vector_dimension)
-    tfidf_fitted = False
-    tfidf_vectorizer = TfidfVectorizer(max_features=vector_dimension, stop_words=None)
+    async with _index_write_lock:
+        with _mutating_state():
+            for doc_info in document_store.values():
+                _remove_document_tables(doc_info)
+            document_store.clear()
+            index.reset()
+            vector_id_to_chunk.clear()
+            vectorizer_backend.reset()
+            sparse_encoder.reset()
+            sparse_index.reset()
+            bm25_index.reset()
     
     print("=== 调试重置完成 ===")
     
@@ -847,7 +1228,8 @@ async def debug_reset():
         "stats": {
             "total_documents": len(document_store),
             "total_vectors": index.ntotal,
-            "tfidf_fitted": tfidf_fitted
+            "tfidf_fitted": vectorizer_backend.fitted,
+            "vectorizer": vectorizer_backend.stats()
         }
     }
 
@@ -873,9 +1255,13 @@ async def health_check():
             "components": {
                 "document_store": len(document_store),
                 "vector_index": index.ntotal,
-                "tfidf_fitted": tfidf_fitted,
+                "tfidf_fitted": vectorizer_backend.fitted,
+                "vectorizer_backend": vectorizer_backend.name,
                 "temp_dir": os.path.exists("temp")
-            }
+            },
+            "event_loop_lag": loop_lag_monitor.snapshot(),
+            "tokenizer": tokenization_service.stats(),
+            "tokenizer_warmup": tokenization_service.warmup_stats
         }
         
         # 检查必要的环境变量
@@ -1322,28 +1708,46 @@ async def generate_word_only(request: WordOnlyRequest):
             "message": f"Word文档生成失败: {str(e)}"
         }
 
-def improved_text_search(question: str, docs: list, max_results: int = 3):
-    """改进的文本搜索算法"""
-    question_words = set(re.findall(r'\b\w{2,}\b', question.lower()))
+def _chunk_results(vector_ids: np.ndarray, similarities: np.ndarray) -> List[Dict]:
+    """把检索到的向量ID换成文本块结果，跳过已删除文档的向量"""
+    results = []
+    for vector_id, similarity in zip(vector_ids.tolist(), similarities.tolist()):
+        location = vector_id_to_chunk.get(vector_id)
+        if location is None or location[0] not in document_store:
+            continue
+        doc_id, chunk_index = location
+        doc_info = document_store[doc_id]
+        results.append({
+            'text': get_chunk_text(doc_info, chunk_index),
+            'filename': doc_info['filename'],
+            'similarity': float(similarity),
+            'doc_id': doc_id,
+            'chunk_index': chunk_index
+        })
+    return results
+
+def search_chunks(question: str, top_k: int = 5) -> List[Dict]:
+    """文本块级检索：bm25查倒排列表，sparse用稀疏点积（余弦），faiss用稠密向量L2距离"""
+    question_tokens = tokenization_service.tokenize(question)
+    processed_question = ' '.join(question_tokens)
     
-    scored_docs = []
-    for doc in docs:
-        doc_words = set(re.findall(r'\b\w{2,}\b', doc['text'].lower()))
-        
-        # 计算词汇重叠度
-        overlap = len(question_words & doc_words)
-        total_words = len(question_words | doc_words)
-        
-        if total_words > 0:
-            similarity = overlap / total_words
-            scored_docs.append({
-                'text': doc['text'][:2000],  # 减少到2000字符
-                'filename': doc['filename'],
-                'similarity': similarity
-            })
+    if RETRIEVAL_CONFIG["ENGINE"] == "bm25":
+        scores, vector_ids = bm25_index.search(question_tokens, top_k)
+        return _chunk_results(vector_ids, scores)
+    
+    if RETRIEVAL_CONFIG["ENGINE"] == "sparse":
+        query = sparse_encoder.embed_sparse([processed_question], update_stats=False)
+        similarities, vector_ids = sparse_index.search(query, top_k)
+        return _chunk_results(vector_ids, similarities)
     
-    # 返回top N结果
-    return sorted(scored_docs, key=lambda x: x['similarity'], reverse=True)[:max_results]
+    if index.ntotal == 0:
+        return []
+    query = _embed_texts([question], [question_tokens], update_stats=False)
+    distances, vector_ids = index.search(query, min(top_k, index.ntotal))
+    # 向量已L2归一化，平方L2距离d与余弦相似度的关系为 cos = 1 - d / 2
+    similarities = 1 - distances[0] / 2
+    keep = (vector_ids[0] >= 0) & (similarities > 0)
+    return _chunk_results(vector_ids[0][keep], similarities[keep])
 
 @app.get("/financial-analysis/stream")
 async def financial_analysis_stream(
@@ -1443,6 +1847,58 @@ async def get_documents():
             "message": f"获取文档失败: {str(e)}"
         }
 
+@app.get("/documents/{doc_id}/tables")
+async def get_document_tables(doc_id: int):
+    """列出文档保存的列式表格（Excel每个工作表一张，CSV一张）"""
+    if doc_id not in document_store:
+        return {
+            "success": False,
+            "message": f"文档不存在: {doc_id}"
+        }
+    
+    tables = document_store[doc_id].get('tables', [])
+    return {
+        "success": True,
+        "data": {
+            "doc_id": doc_id,
+            "tables": [_public_table_info(table_index, table) for table_index, table in enumerate(tables)],
+            "total_count": len(tables)
+        }
+    }
+
+@app.get("/documents/{doc_id}/tables/{table_index}/summary")
+async def get_document_table_summary(doc_id: int, table_index: int):
+    """对文档中的某张表做数值列汇总，直接读取内存映射的列数据"""
+    if doc_id not in document_store:
+        return {
+            "success": False,
+            "message": f"文档不存在: {doc_id}"
+        }
+    
+    tables = document_store[doc_id].get('tables', [])
+    if not 0 <= table_index < len(tables):
+        return {
+            "success": False,
+            "message": f"表格不存在: {table_index}，该文档共有 {len(tables)} 张表"
+        }
+    
+    try:
+        reader = TableReader(tables[table_index]['path'])
+        summary = await run_in_threadpool(reader.numeric_summary)
+        return {
+            "success": True,
+            "data": {
+                **_public_table_info(table_index, tables[table_index]),
+                "numeric_summary": summary
+            }
+        }
+    except Exception as e:
+        print(f"表格汇总错误: {str(e)}")
+        return {
+            "success": False,
+            "message": f"表格汇总失败: {str(e)}"
+        }
+
 if __name__ == "__main__":
     import uvicorn
     print("启动财务分析后端服务...")
@@ -0,0 +1,73 @@
+"""问答检索延迟基准：BM25倒排索引 vs 原improved_text_search（每次查询对全部文本跑正则）
+
+文本块为模拟的分词结果（Zipf分布词频），查询取自某个文本块中较少见的词。
+
+运行方式（在backend目录下）:
+    python benchmarks/bench_bm25_latency.py
+    python benchmarks/bench_bm25_latency.py --chunks 10 1000 100000 --queries 200 --baseline-max-chunks 10000
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bm25_index import BM25Index
+from bench_sparse_vs_faiss import make_corpus, make_queries, percentile_ms
+
+
+def improved_text_search_baseline(question: str, docs: list, max_results: int = 3):
+    """原有的词汇重叠搜索：每次查询都对所有文本执行正则"""
+    question_words = set(re.findall(r'\b\w{2,}\b', question.lower()))
+    scored_docs = []
+    for doc in docs:
+        doc_words = set(re.findall(r'\b\w{2,}\b', doc['text'].lower()))
+        overlap = len(question_words & doc_words)
+        total_words = len(question_words | doc_words)
+        if total_words > 0:
+            scored_docs.append({'text': doc['text'][:2000], 'similarity': overlap / total_words})
+    return sorted(scored_docs, key=lambda x: x['similarity'], reverse=True)[:max_results]
+
+
+def measure(search, queries):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        latencies.append(time.perf_counter() - start)
+    return percentile_ms(latencies, 50), percentile_ms(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, nargs="+", default=[10, 1_000, 100_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--baseline-max-chunks", type=int, default=10_000,
+                        help="超过该块数时跳过正则全文扫描基准")
+    args = parser.parse_args()
+
+    print(f"{'块数':>8} {'建索引(s)':>10} {'BM25 p50(ms)':>13} {'BM25 p99(ms)':>13} {'全文扫描 p50(ms)':>17}")
+    for chunks in args.chunks:
+        corpus, rng = make_corpus(chunks)
+        queries, _ = make_queries(corpus, rng, min(args.queries, chunks))
+
+        index = BM25Index()
+        start = time.perf_counter()
+        index.add_documents([text.split() for text in corpus])
+        build_time = time.perf_counter() - start
+        p50, p99 = measure(lambda query: index.search(query.split(), args.k), queries)
+
+        if chunks <= args.baseline_max_chunks:
+            docs = [{"text": text} for text in corpus]
+            baseline_p50, _ = measure(lambda query: improved_text_search_baseline(query, docs), queries[:20])
+            baseline = f"{baseline_p50:.2f}"
+        else:
+            baseline = "跳过"
+        print(f"{chunks:>8} {build_time:>10.2f} {p50:>13.3f} {p99:>13.3f} {baseline:>17}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""检索基准：CSR稀疏余弦检索 vs FAISS IndexFlatL2（384维截断稠密向量）
+
+用模拟的财务文本块（Zipf分布词频）建库，查询取自某个文本块的若干词，
+统计建库耗时、索引内存、查询延迟（p50/p99）以及目标块进入top-k的比例。
+
+运行方式（在backend目录下）:
+    python benchmarks/bench_sparse_vs_faiss.py
+    python benchmarks/bench_sparse_vs_faiss.py --chunks 10000 100000 --queries 500
+"""
+import argparse
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import RETRIEVAL_CONFIG, VECTOR_CONFIG
+from sparse_index import SparseChunkIndex
+from vectorizers import HashingBackend
+
+
+def make_corpus(chunks: int, vocabulary: int = 50_000, words_per_chunk: int = 150, seed: int = 0):
+    """生成模拟文本块（已分词、空格分隔），词频服从Zipf分布"""
+    rng = np.random.default_rng(seed)
+    words = np.array([f"词{i}" for i in range(vocabulary)])
+    ranks = np.minimum(rng.zipf(1.2, size=(chunks, words_per_chunk)), vocabulary) - 1
+    return [" ".join(words[row]) for row in ranks], rng
+
+
+def make_queries(corpus, rng, count: int, words_per_query: int = 5):
+    """每个查询取自一个文本块中最少见的几个词，返回 (查询文本, 目标块序号)"""
+    targets = rng.choice(len(corpus), size=count, replace=False)
+    queries = []
+    for target in targets:
+        tokens = sorted(set(corpus[target].split()), key=lambda word: -int(word[1:]))
+        queries.append(" ".join(tokens[:words_per_query]))
+    return queries, targets
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q) * 1000)
+
+
+def bench_sparse(corpus, queries, targets, k):
+    encoder = HashingBackend(RETRIEVAL_CONFIG["SPARSE_FEATURES"])
+    sparse_index = SparseChunkIndex(RETRIEVAL_CONFIG["SPARSE_FEATURES"])
+    start = time.perf_counter()
+    sparse_index.add(encoder.embed_sparse(corpus))
+    sparse_index.search(encoder.embed_sparse([queries[0]], update_stats=False), k)  # 触发合并
+    build_time = time.perf_counter() - start
+
+    latencies, hits = [], 0
+    for query, target in zip(queries, targets):
+        query_start = time.perf_counter()
+        _, ids = sparse_index.search(encoder.embed_sparse([query], update_stats=False), k)
+        latencies.append(time.perf_counter() - query_start)
+        hits += int(target in ids)
+    return build_time, sparse_index.nbytes, latencies, hits / len(queries)
+
+
+def bench_faiss(corpus, queries, targets, k):
+    dimension = VECTOR_CONFIG["VECTOR_DIMENSION"]
+    encoder = HashingBackend(dimension)
+    index = faiss.IndexFlatL2(dimension)
+    start = time.perf_counter()
+    index.add(encoder.embed(corpus))
+    build_time = time.perf_counter() - start
+
+    latencies, hits = [], 0
+    for query, target in zip(queries, targets):
+        query_start = time.perf_counter()
+        _, ids = index.search(encoder.embed([query], update_stats=False), k)
+        latencies.append(time.perf_counter() - query_start)
+        hits += int(target in ids[0])
+    return build_time, index.ntotal * dimension * 4, latencies, hits / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, nargs="+", default=[100_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'块数':>8} {'引擎':>7} {'建库(s)':>8} {'内存(MB)':>9} {'p50(ms)':>8} {'p99(ms)':>8} {'命中率@k':>9}")
+    for chunks in args.chunks:
+        corpus, rng = make_corpus(chunks)
+        queries, targets = make_queries(corpus, rng, args.queries)
+        for name, bench in (("sparse", bench_sparse), ("faiss", bench_faiss)):
+            build_time, nbytes, latencies, hit_rate = bench(corpus, queries, targets, args.k)
+            print(f"{chunks:>8} {name:>7} {build_time:>8.2f} {nbytes / 1e6:>9.1f} "
+                  f"{percentile_ms(latencies, 50):>8.2f} {percentile_ms(latencies, 99):>8.2f} {hit_rate:>9.2%}")
+
+
+if __name__ == "__main__":
+    main()
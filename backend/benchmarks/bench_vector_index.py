@@ -0,0 +1,121 @@
+"""稠密索引基准：Flat / IVF / HNSW 的建库耗时、recall@10 与单条查询延迟（p50/p99）
+
+向量取自低维潜空间的高斯混合并投影到384维（模拟句向量的聚簇结构和较低的内在维度），查询为同分布的新样本，
+以IndexFlatL2的精确结果为基准计算召回率。--migration 另外演示VectorIndexManager按阈值自动迁移。
+
+运行方式（在backend目录下）:
+    python benchmarks/bench_vector_index.py
+    python benchmarks/bench_vector_index.py --vectors 10000 100000 --queries 500
+    python benchmarks/bench_vector_index.py --vectors 20000 --migration
+"""
+import argparse
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_sparse_vs_faiss import percentile_ms
+from config import VECTOR_CONFIG, VECTOR_INDEX_CONFIG
+from vector_index import INDEX_KINDS, VectorIndexManager, build_index
+
+
+def make_vectors(count: int, dimension: int, latent: int = 64, clusters: int = 256, noise: float = 0.3,
+                 seed: int = 0, space_seed: int = 42):
+    """生成模拟句向量：低维潜空间中的高斯混合投影到dimension维，加少量各向同性噪声后L2归一化
+
+    space_seed决定聚类中心和投影矩阵，库向量和查询向量用同一个space_seed、不同的seed。
+    """
+    space = np.random.default_rng(space_seed)
+    projection = space.standard_normal((latent, dimension)).astype(np.float32)
+    centers = space.standard_normal((clusters, latent)).astype(np.float32)
+    rng = np.random.default_rng(seed)
+    points = centers[rng.integers(0, clusters, size=count)] + 0.5 * rng.standard_normal((count, latent)).astype(np.float32)
+    vectors = points @ projection + noise * np.sqrt(latent) * rng.standard_normal((count, dimension)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def build_params():
+    return {
+        "train_sample": VECTOR_INDEX_CONFIG["TRAIN_SAMPLE"],
+        "nprobe": VECTOR_INDEX_CONFIG["NPROBE"],
+        "hnsw_m": VECTOR_INDEX_CONFIG["HNSW_M"],
+        "hnsw_ef_search": VECTOR_INDEX_CONFIG["HNSW_EF_SEARCH"],
+        "hnsw_ef_construction": VECTOR_INDEX_CONFIG["HNSW_EF_CONSTRUCTION"],
+    }
+
+
+def recall_at_k(ids: np.ndarray, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    return float(np.mean([len(set(row) & set(expected)) / k for row, expected in zip(ids, truth)]))
+
+
+def bench_kind(kind, vectors, queries, truth, k):
+    start = time.perf_counter()
+    index = build_index(kind, vectors.shape[1], vectors, **build_params())
+    build_time = time.perf_counter() - start
+
+    latencies = []
+    results = np.empty((len(queries), k), dtype=np.int64)
+    for row, query in enumerate(queries):
+        query_start = time.perf_counter()
+        _, ids = index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - query_start)
+        results[row] = ids[0]
+    return build_time, latencies, recall_at_k(results, truth)
+
+
+def bench_migration(vectors, batch_size: int):
+    """按批入库，阈值取总数的1/4和3/4，观察后台迁移过程中入库是否被阻塞"""
+    count, dimension = vectors.shape
+    manager = VectorIndexManager(dimension, ivf_min_vectors=count // 4, hnsw_min_vectors=count * 3 // 4,
+                                 **build_params())
+    add_latencies = []
+    start = time.perf_counter()
+    for batch_start in range(0, count, batch_size):
+        add_start = time.perf_counter()
+        manager.add(vectors[batch_start:batch_start + batch_size])
+        add_latencies.append(time.perf_counter() - add_start)
+    ingest_time = time.perf_counter() - start
+    manager.wait_for_rebuild()
+    print(f"\n迁移演示: {count} 个向量，每批 {batch_size}，入库 {ingest_time:.2f}s，"
+          f"单批入库 p50 {percentile_ms(add_latencies, 50):.2f}ms / p99 {percentile_ms(add_latencies, 99):.2f}ms")
+    for migration in manager.migrations:
+        print(f"  {migration['from']} -> {migration['to']}：{migration['vectors']} 个向量，{migration['seconds']}s")
+    print(f"  最终索引: {manager.kind}，向量数 {manager.ntotal}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, nargs="+", default=[10_000, 50_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--noise", type=float, default=0.3, help="各向同性噪声强度，越大近似检索越难")
+    parser.add_argument("--kinds", nargs="+", default=list(INDEX_KINDS), choices=INDEX_KINDS)
+    parser.add_argument("--migration", action="store_true", help="演示按阈值自动迁移")
+    parser.add_argument("--batch-size", type=int, default=500, help="迁移演示的每批向量数")
+    args = parser.parse_args()
+
+    dimension = VECTOR_CONFIG["VECTOR_DIMENSION"]
+    print(f"{'向量数':>8} {'索引':>5} {'建库(s)':>8} {'p50(ms)':>8} {'p99(ms)':>8} {'recall@' + str(args.k):>10}")
+    for count in args.vectors:
+        vectors = make_vectors(count, dimension, noise=args.noise)
+        queries = make_vectors(args.queries, dimension, noise=args.noise, seed=1)
+        exact = faiss.IndexFlatL2(dimension)
+        exact.add(vectors)
+        _, truth = exact.search(queries, args.k)
+        for kind in args.kinds:
+            build_time, latencies, recall = bench_kind(kind, vectors, queries, truth, args.k)
+            print(f"{count:>8} {kind:>5} {build_time:>8.2f} {percentile_ms(latencies, 50):>8.2f} "
+                  f"{percentile_ms(latencies, 99):>8.2f} {recall:>10.2%}")
+
+    if args.migration:
+        bench_migration(make_vectors(args.vectors[-1], dimension, noise=args.noise), args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""BM25倒排索引 - 入库时按分词结果建立倒排列表，查询只访问问题中出现的词的倒排列表
+
+倒排列表用array模块的紧凑数组保存（块ID为int32、词频为float32），查询时通过np.frombuffer零拷贝转成NumPy数组计算。
+块ID就是入库时传入的FAISS向量ID，共用同一份向量ID到文本块的映射；没有加入BM25的向量ID（如切换检索引擎前入库的块）
+只占一个长度为0的位置，不会命中。
+删除文档时把块标记为已删除（倒排列表暂不改动），并从块数和总词数中扣除；查询时跳过已删除块的倒排记录，
+文档频率按未删除的记录计算。已删除的块数越过阈值（至少compact_min_tombstones个，或占已入库块的compact_tombstone_ratio）
+时在后台线程压缩：按块ID过滤掉各倒排列表中已删除块的记录，块ID不变。
+"""
+import math
+import re
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from persistence import LockedStateMixin
+
+# 只保留包含字母、数字或汉字的词，过滤标点和空白
+WORD_PATTERN = re.compile(r"\w")
+
+# 每个块ID的状态
+ABSENT, LIVE, DELETED = 0, 1, 2
+
+# 查询词命中的记录数乘以该值不小于块总数时，得分改为按块ID直接累加
+DENSE_SCORE_RATIO = 4
+
+
+def normalize_terms(tokens: List[str]) -> List[str]:
+    """统一小写并去掉标点、空白等无意义的词"""
+    return [token.lower() for token in tokens if WORD_PATTERN.search(token)]
+
+
+def check_new_ids(ids: Optional[List[int]], count: int, next_id: int) -> np.ndarray:
+    """校验入库ID：数量一致、严格递增、不小于当前ID空间大小；不传时从next_id起依次分配"""
+    if ids is None:
+        return np.arange(next_id, next_id + count, dtype=np.int64)
+    ids = np.asarray(ids, dtype=np.int64)
+    if len(ids) != count:
+        raise ValueError(f"ID数量 {len(ids)} 与入库数量 {count} 不一致")
+    if count and (ids[0] < next_id or np.any(np.diff(ids) <= 0)):
+        raise ValueError(f"入库ID必须严格递增且不小于 {next_id}")
+    return ids
+
+
+class BM25Index(LockedStateMixin):
+    """BM25倒排索引：add_documents按批追加文本块的词列表，search返回得分最高的k个块"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, compact_min_tombstones: int = 1000,
+                 compact_tombstone_ratio: float = 0.2, background: bool = True):
+        self.k1 = k1
+        self.b = b
+        self.compact_min_tombstones = compact_min_tombstones
+        self.compact_tombstone_ratio = compact_tombstone_ratio
+        self.background = background
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._compact_thread: Optional[threading.Thread] = None
+        self.reset()
+
+    def reset(self):
+        """清空索引；正在进行的后台压缩完成后会被丢弃"""
+        with self._lock:
+            self._generation += 1
+            self._term_ids: Dict[str, int] = {}
+            self._token_term_ids: Dict[str, int] = {}  # 原始词 -> 词ID（无意义的词为-1），避免重复做小写和过滤
+            self._posting_ids: List[array] = []  # 每个词的块ID列表
+            self._posting_tfs: List[array] = []  # 对应的词频
+            self._lengths = array("f")  # 每个块ID的词数（未加入的ID为0）
+            self._status = array("B")  # 每个块ID的状态（ABSENT/LIVE/DELETED）
+            self._total_length = 0.0  # 未删除块的总词数
+            self.documents = 0  # 未删除的块数（计算IDF和平均长度用）
+            self.deleted = 0  # 已删除、尚未压缩的块数
+            self.compactions = 0
+
+    def _copy_locked_state(self, state: dict) -> dict:
+        # 后台压缩线程不保存
+        state["_compact_thread"] = None
+        return state
+
+    @property
+    def ntotal(self) -> int:
+        """块ID空间的大小（最大块ID + 1）"""
+        return len(self._lengths)
+
+    @property
+    def nbytes(self) -> int:
+        postings = sum(ids.itemsize * len(ids) + tfs.itemsize * len(tfs)
+                       for ids, tfs in zip(self._posting_ids, self._posting_tfs))
+        return postings + self._lengths.itemsize * len(self._lengths)
+
+    def add_documents(self, token_lists: List[List[str]], ids: Optional[List[int]] = None) -> List[int]:
+        """追加一批文本块（每块为分词后的词列表），返回对应的块ID
+
+        ids为这些块的FAISS向量ID（递增且不小于ntotal），倒排列表按这些ID记录；不传时依次分配。
+        整批词先映射为词ID（只对没见过的词做小写和过滤），再用np.unique按 (词ID, 块) 统计词频，
+        按词分组后一次性追加到各自的倒排列表。
+        """
+        with self._lock:
+            start_id = self.ntotal
+            batch_size = len(token_lists)
+            if batch_size == 0:
+                return []
+            chunk_ids = check_new_ids(ids, batch_size, start_id)
+
+            flat_tokens = [token for tokens in token_lists for token in tokens]
+            token_term_ids = self._token_term_ids
+            for token in set(flat_tokens).difference(token_term_ids):
+                term = token.lower()
+                if WORD_PATTERN.search(term):
+                    # 新词的ID为当前词表大小
+                    token_term_ids[token] = self._term_ids.setdefault(term, len(self._term_ids))
+                else:
+                    token_term_ids[token] = -1
+            while len(self._posting_ids) < len(self._term_ids):
+                self._posting_ids.append(array("i"))
+                self._posting_tfs.append(array("f"))
+
+            term_ids = np.fromiter((token_term_ids[token] for token in flat_tokens), dtype=np.int64, count=len(flat_tokens))
+            local_ids = np.repeat(np.arange(batch_size, dtype=np.int64), [len(tokens) for tokens in token_lists])
+            valid = term_ids >= 0
+            term_ids = term_ids[valid]
+            local_ids = local_ids[valid]
+            lengths = np.bincount(local_ids, minlength=batch_size)
+            keys, counts = np.unique(term_ids * batch_size + local_ids, return_counts=True)
+            key_terms = keys // batch_size
+            key_chunks = chunk_ids[keys % batch_size].astype(np.int32)
+            key_counts = counts.astype(np.float32)
+            group_starts = np.flatnonzero(np.r_[True, key_terms[1:] != key_terms[:-1]]) if len(keys) else keys
+            group_ends = np.r_[group_starts[1:], len(keys)]
+            for group_start, group_end in zip(group_starts.tolist(), group_ends.tolist()):
+                term_id = int(key_terms[group_start])
+                self._posting_ids[term_id].frombytes(key_chunks[group_start:group_end].tobytes())
+                self._posting_tfs[term_id].frombytes(key_counts[group_start:group_end].tobytes())
+
+            id_lengths = np.zeros(int(chunk_ids[-1]) + 1 - start_id, dtype=np.float32)
+            id_lengths[chunk_ids - start_id] = lengths
+            self._lengths.frombytes(id_lengths.tobytes())
+            id_status = np.full(len(id_lengths), ABSENT, dtype=np.uint8)
+            id_status[chunk_ids - start_id] = LIVE
+            self._status.frombytes(id_status.tobytes())
+            self._total_length += float(lengths.sum())
+            self.documents += batch_size
+            return chunk_ids.tolist()
+
+    def pad(self, ntotal: int) -> None:
+        """把块ID空间补齐到ntotal（补的ID长度为0，不会命中）"""
+        with self._lock:
+            if ntotal > self.ntotal:
+                rows = ntotal - self.ntotal
+                self._lengths.frombytes(np.zeros(rows, dtype=np.float32).tobytes())
+                self._status.frombytes(np.full(rows, ABSENT, dtype=np.uint8).tobytes())
+
+    def remove(self, ids: List[int]) -> int:
+        """删除文本块（查询时不再返回），从块数和总词数中扣除，返回新删除的块数；块ID不复用
+        
+        已删除的块数越过阈值时在后台线程压缩倒排列表。
+        """
+        with self._lock:
+            ids = np.unique(np.asarray(ids, dtype=np.int64))
+            ids = ids[(ids >= 0) & (ids < self.ntotal)]
+            status = np.frombuffer(self._status, dtype=np.uint8)
+            ids = ids[status[ids] == LIVE]
+            if len(ids):
+                status[ids] = DELETED
+                lengths = np.frombuffer(self._lengths, dtype=np.float32)
+                self._total_length = max(self._total_length - float(lengths[ids].sum()), 0.0)
+                del status, lengths
+                self.documents -= len(ids)
+                self.deleted += len(ids)
+        if len(ids):
+            self._maybe_compact()
+        return len(ids)
+
+    def _compaction_due(self) -> bool:
+        return self.deleted > 0 and (
+            self.deleted >= self.compact_min_tombstones
+            or self.deleted >= self.compact_tombstone_ratio * (self.documents + self.deleted)
+        )
+
+    def _maybe_compact(self):
+        """没有正在进行的压缩时，按需开始压缩（background为False时在当前线程完成）"""
+        with self._lock:
+            if self._compact_thread is not None and self._compact_thread.is_alive():
+                return
+            if not self._compaction_due():
+                return
+            generation = self._generation
+            if self.background:
+                self._compact_thread = threading.Thread(
+                    target=self._compact, args=(generation,), name="bm25-compact", daemon=True
+                )
+                self._compact_thread.start()
+                return
+        self._compact(generation)
+
+    def _compact(self, generation: int):
+        """从倒排列表中去掉已删除块的记录，被压缩的块ID标记为未加入
+        
+        锁内只复制全部倒排列表（一次拼接）和块状态；过滤、重建各词的列表在锁外进行。替换时在锁内补上期间追加的记录，
+        并整体替换列表和数组对象（不原地修改），快照序列化拿到的要么是压缩前、要么是压缩后的完整状态。
+        期间新删除的块仍保留在新的倒排列表中，查询时照常跳过，留给下一次压缩。
+        """
+        started = time.perf_counter()
+        try:
+            with self._lock:
+                if generation != self._generation:
+                    return
+                term_count = len(self._posting_ids)
+                sizes = np.fromiter(map(len, self._posting_ids), dtype=np.int64, count=term_count)
+                all_ids = np.frombuffer(b"".join(self._posting_ids), dtype=np.int32)
+                all_tfs = np.frombuffer(b"".join(self._posting_tfs), dtype=np.float32)
+                dropped = np.frombuffer(self._status, dtype=np.uint8) == DELETED
+
+            keep = ~dropped[all_ids]
+            starts = np.r_[0, np.cumsum(sizes)]
+            kept_before = np.r_[0, np.cumsum(keep)]
+            kept_sizes = kept_before[starts[1:]] - kept_before[starts[:-1]]
+            kept_ids = all_ids[keep].tobytes()
+            kept_tfs = all_tfs[keep].tobytes()
+            del all_ids, all_tfs, keep
+            changed = np.flatnonzero(kept_sizes != sizes).tolist()
+            new_lists = {}
+            for term_id in changed:
+                start, end = int(kept_before[starts[term_id]]) * 4, int(kept_before[starts[term_id + 1]]) * 4
+                new_lists[term_id] = (array("i", kept_ids[start:end]), array("f", kept_tfs[start:end]))
+            dropped_ids = np.flatnonzero(dropped)
+
+            with self._lock:
+                if generation != self._generation:
+                    return
+                posting_ids = list(self._posting_ids)
+                posting_tfs = list(self._posting_tfs)
+                for term_id, (ids, tfs) in new_lists.items():
+                    # 补上压缩期间追加到该词的记录
+                    current_ids = self._posting_ids[term_id]
+                    if len(current_ids) > sizes[term_id]:
+                        ids.extend(current_ids[int(sizes[term_id]):])
+                        tfs.extend(self._posting_tfs[term_id][int(sizes[term_id]):])
+                    posting_ids[term_id] = ids
+                    posting_tfs[term_id] = tfs
+                lengths = np.frombuffer(self._lengths, dtype=np.float32).copy()
+                status = np.frombuffer(self._status, dtype=np.uint8).copy()
+                lengths[dropped_ids] = 0
+                status[dropped_ids] = ABSENT
+                self._posting_ids = posting_ids
+                self._posting_tfs = posting_tfs
+                self._lengths = array("f", lengths.tobytes())
+                self._status = array("B", status.tobytes())
+                self.deleted -= len(dropped_ids)
+                self.compactions += 1
+            print(f"BM25索引已压缩，移除 {len(dropped_ids)} 个已删除块，耗时 {time.perf_counter() - started:.3f}秒")
+        except Exception as e:
+            print(f"压缩BM25索引失败，继续跳过已删除块: {str(e)}")
+        finally:
+            with self._lock:
+                if self._compact_thread is threading.current_thread():
+                    self._compact_thread = None
+            # 期间新删除的块可能又越过了阈值
+            self._maybe_compact()
+
+    def wait_for_compaction(self):
+        """等待后台压缩（包括接着触发的下一次）完成"""
+        while True:
+            with self._lock:
+                thread = self._compact_thread
+            if thread is None or thread is threading.current_thread():
+                return
+            thread.join()
+
+    def _score(self, term_ids: List[int]) -> Tuple[Optional[np.ndarray], np.ndarray]:
+        """累加各查询词的BM25得分，返回 (命中的块ID, 得分)；np.frombuffer视图只在本函数内存活，返回后数组才能继续追加
+
+        只在查询词倒排列表的并集上累加，不按全部块分配得分数组：各词的 (块ID, 得分) 拼接后用np.unique合并同一块。
+        命中的记录数与块总数相当时（查询含常见词），排序合并反而更慢，改为按块ID直接累加到全部块的得分数组，
+        此时块ID返回None，得分的下标就是块ID。
+        """
+        lengths = np.frombuffer(self._lengths, dtype=np.float32)
+        document_count = max(self.documents, 1)
+        average_length = self._total_length / document_count or 1.0
+        status = np.frombuffer(self._status, dtype=np.uint8)
+        id_parts = []
+        score_parts = []
+        for term_id in term_ids:
+            ids = np.frombuffer(self._posting_ids[term_id], dtype=np.int32)
+            tfs = np.frombuffer(self._posting_tfs[term_id], dtype=np.float32)
+            if self.deleted:
+                # 跳过已删除块的记录，文档频率只计未删除的块
+                live = status[ids] == LIVE
+                ids, tfs = ids[live], tfs[live]
+            if not len(ids):
+                continue
+            document_frequency = len(ids)
+            idf = math.log(1 + (document_count - document_frequency + 0.5) / (document_frequency + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * lengths[ids] / average_length)
+            id_parts.append(ids)
+            score_parts.append(idf * tfs * (self.k1 + 1) / (tfs + norm))
+
+        if not id_parts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        if sum(len(ids) for ids in id_parts) * DENSE_SCORE_RATIO >= len(lengths):
+            scores = np.zeros(len(lengths), dtype=np.float32)
+            for ids, part in zip(id_parts, score_parts):
+                # 同一个词的倒排列表中块ID不重复，可以直接按下标累加
+                scores[ids] += part
+            return None, scores
+        if len(id_parts) == 1:
+            # astype复制一份，不把缓冲区视图带出函数
+            return id_parts[0].astype(np.int64), score_parts[0]
+        hit, inverse = np.unique(np.concatenate(id_parts), return_inverse=True)
+        return hit.astype(np.int64), np.bincount(inverse, weights=np.concatenate(score_parts)).astype(np.float32)
+
+    def search(self, query_tokens: List[str], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """返回 (BM25得分, 块ID)，按得分降序；只包含至少命中一个词的块，只在命中的块中选出前k个"""
+        with self._lock:
+            term_ids = sorted({self._term_ids[term] for term in normalize_terms(query_tokens) if term in self._term_ids})
+            if self.ntotal == 0 or not term_ids or k <= 0:
+                return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+            ids, scores = self._score(term_ids)
+
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        top = top[scores[top] > 0]
+        return scores[top], (top if ids is None else ids[top])
+
+    def stats(self) -> dict:
+        return {
+            "chunks": self.documents,
+            "deleted": self.deleted,
+            "compactions": self.compactions,
+            "terms": len(self._term_ids),
+            "postings_bytes": self.nbytes
+        }
@@ -0,0 +1,179 @@
+"""文本分块 - 以 (start, end) 偏移描述文本块，避免复制文本
+
+分块窗口内优先在段落边界切分，其次是中英文句末标点，再次是空白，都找不到时按长度硬切。
+边界查找都用str.rfind/str.find在窗口内完成，整体耗时与文本长度成线性关系。
+
+表格感知模式下，提取器输出的表格块（PDF的"表格内容:"、DOCX的"=== 表格内容 ===/表头:"、
+Excel的"工作表:/列标题:"）按行切分，每块通过header_start/header_end引用表头，取文本时拼在行前面。
+"""
+import re
+from typing import Iterator, List, NamedTuple, Optional
+
+# 段落边界
+PARAGRAPH_BREAKS = ("\n\n",)
+# 句末标点：中文标点直接切分；英文句号/问号/叹号要求后面跟空白，避免切开小数和缩写
+SENTENCE_BREAKS = ("。", "！", "？", "；", ". ", ".\n", "! ", "!\n", "? ", "?\n")
+# 空白
+WHITESPACE_BREAKS = ("\n", " ")
+
+# 表格块的起始行
+TABLE_START_PATTERN = re.compile(r"^(?:表格内容:|=== 表格内容 ===|工作表: .*)$", re.MULTILINE)
+# 紧跟在起始行后面的表头行
+TABLE_HEADER_PREFIXES = ("表头: ", "列标题: ")
+
+
+class ChunkSpan(NamedTuple):
+    """文本块在原文中的位置，text[start:end] 即块内容；表格块的表头位于 text[header_start:header_end]"""
+    start: int
+    end: int
+    header_start: int = -1
+    header_end: int = -1
+
+
+def _last_break(text: str, lo: int, hi: int) -> int:
+    """返回 [lo, hi) 内最靠后的切分位置（切在分隔符之后），找不到返回-1"""
+    for needles in (PARAGRAPH_BREAKS, SENTENCE_BREAKS, WHITESPACE_BREAKS):
+        best = -1
+        for needle in needles:
+            position = text.rfind(needle, lo, hi)
+            if position != -1:
+                # 英文标点后的空白不计入块内
+                best = max(best, position + len(needle.rstrip()) if needle.strip() else position + len(needle))
+        if best != -1:
+            return best
+    return -1
+
+
+def _first_sentence_start(text: str, lo: int, hi: int) -> int:
+    """返回 [lo, hi) 内第一个句子的起点，找不到返回-1"""
+    best = -1
+    for needle in PARAGRAPH_BREAKS + SENTENCE_BREAKS:
+        position = text.find(needle, lo, hi)
+        if position != -1 and (best == -1 or position + len(needle) < best):
+            best = position + len(needle)
+    return best if best < hi else -1
+
+
+def iter_chunk_spans(text: str, chunk_size: int = 1000, overlap: int = 0, min_length: int = 1,
+                     start: int = 0, end: Optional[int] = None) -> Iterator[ChunkSpan]:
+    """按chunk_size切分text[start:end]，逐个产出块的偏移（已去除首尾空白）
+
+    overlap为相邻块的重叠字符数，下一块会从重叠区内的第一个句子开头开始；
+    必须小于chunk_size的一半，保证每次至少前进半个窗口。
+    """
+    if chunk_size <= 0:
+        raise ValueError(f"chunk_size必须大于0: {chunk_size}")
+    if overlap < 0 or overlap >= max(chunk_size // 2, 1):
+        raise ValueError(f"overlap必须在0到chunk_size的一半之间: {overlap}")
+
+    text_length = len(text) if end is None else end
+    while start < text_length:
+        # 跳过块首空白
+        while start < text_length and text[start].isspace():
+            start += 1
+        if start >= text_length:
+            break
+
+        hi = start + chunk_size
+        if hi >= text_length:
+            cut = text_length
+        else:
+            cut = _last_break(text, start + chunk_size // 2, hi)
+            if cut == -1:
+                cut = hi
+
+        chunk_end = cut
+        while chunk_end > start and text[chunk_end - 1].isspace():
+            chunk_end -= 1
+        if chunk_end - start >= min_length:
+            yield ChunkSpan(start, chunk_end)
+
+        if cut >= text_length:
+            break
+
+        next_start = cut
+        if overlap:
+            sentence_start = _first_sentence_start(text, cut - overlap, cut)
+            next_start = sentence_start if sentence_start != -1 else cut - overlap
+        start = next_start
+
+
+def _find_table_header_end(text: str, marker_end: int, text_length: int) -> int:
+    """返回表头结束位置：DOCX/Excel包含紧随的表头行，PDF表格把第一行当作表头"""
+    line_start = marker_end + 1
+    if line_start >= text_length or text[marker_end] != "\n":
+        return marker_end
+    line_end = text.find("\n", line_start, text_length)
+    line_end = text_length if line_end == -1 else line_end
+    line = text[line_start:line_end]
+    if not line.strip():
+        return marker_end
+    if line.startswith(TABLE_HEADER_PREFIXES) or text[marker_end - len("表格内容:"):marker_end] == "表格内容:":
+        return line_end
+    return marker_end
+
+
+def _iter_table_row_spans(text: str, header_start: int, header_end: int, body_start: int, body_end: int,
+                          chunk_size: int, min_length: int) -> Iterator[ChunkSpan]:
+    """把表格数据行按行边界分组，每组长度加上表头不超过chunk_size"""
+    row_budget = chunk_size - (header_end - header_start) - 1
+    group_start = -1
+    group_end = -1
+    position = body_start
+    while position < body_end:
+        line_end = text.find("\n", position, body_end)
+        line_end = body_end if line_end == -1 else line_end
+        if line_end > position and not text[position:line_end].isspace():
+            if group_start != -1 and line_end - group_start > row_budget:
+                yield ChunkSpan(group_start, group_end, header_start, header_end)
+                group_start = -1
+            if line_end - position > row_budget:
+                # 单行超长，行内按普通规则切开，每段都带表头
+                for piece in iter_chunk_spans(text, row_budget, 0, min_length, position, line_end):
+                    yield ChunkSpan(piece.start, piece.end, header_start, header_end)
+            else:
+                if group_start == -1:
+                    group_start = position
+                group_end = line_end
+        position = line_end + 1
+    if group_start != -1 and group_end - group_start >= min_length:
+        yield ChunkSpan(group_start, group_end, header_start, header_end)
+
+
+def iter_table_aware_spans(text: str, chunk_size: int = 1000, overlap: int = 0, min_length: int = 1) -> Iterator[ChunkSpan]:
+    """表格感知分块：表格之外按iter_chunk_spans切分，表格按行切分并在每块重复表头
+
+    整张表（含表头）不超过chunk_size、或表头超过块大小一半时，表格按普通文本切分。
+    """
+    text_length = len(text)
+    position = 0
+    for match in TABLE_START_PATTERN.finditer(text):
+        table_start = match.start()
+        if table_start < position:
+            continue
+
+        # 表格到下一个空行（提取器用空行分隔内容块）为止
+        table_end = text.find("\n\n", table_start)
+        table_end = text_length if table_end == -1 else table_end
+        header_end = _find_table_header_end(text, match.end(), table_end)
+        if table_end - table_start <= chunk_size or header_end - table_start > chunk_size // 2:
+            # 小表格留在普通文本中一起切分，避免产生大量碎块
+            continue
+
+        yield from iter_chunk_spans(text, chunk_size, overlap, min_length, position, table_start)
+        yield from _iter_table_row_spans(text, table_start, header_end, header_end + 1, table_end,
+                                         chunk_size, min_length)
+        position = table_end
+    yield from iter_chunk_spans(text, chunk_size, overlap, min_length, position, text_length)
+
+
+def span_text(text: str, span: ChunkSpan) -> str:
+    """按偏移取出块文本，表格块在前面拼上表头"""
+    if span.header_start < 0:
+        return text[span.start:span.end]
+    return text[span.header_start:span.header_end] + "\n" + text[span.start:span.end]
+
+
+def chunk_texts(text: str, spans: List[ChunkSpan]) -> List[str]:
+    """按偏移取出块文本"""
+    return [span_text(text, span) for span in spans]
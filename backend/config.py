@@ -1,5 +1,6 @@
 """后端服务配置文件"""
 import os
+import uuid
 from typing import Dict, Any
 
 # 基础配置
@@ -15,6 +16,9 @@ VECTOR_CONFIG: Dict[str, Any] = {
     "VECTOR_DIMENSION": 384,
     "CHUNK_SIZE": 1000,  # 增加块大小
     "MIN_CHUNK_LENGTH": 1,  # 降低最小块长度要求
+    "CHUNK_OVERLAP": 100,  # 相邻块的重叠字符数（须小于块大小的一半）
+    "CHUNK_MODE": os.getenv("CHUNK_MODE", "table"),  # table: 表格按行切分并重复表头；plain: 纯文本切分
+    "VECTORIZER_BACKEND": os.getenv("VECTORIZER_BACKEND", "hashing"),  # hashing: 特征哈希+增量IDF；tfidf: 首批文本拟合词表；onnx: 本地ONNX句向量模型；tiny: 确定性测试模型
 }
 
 # 文件处理配置
@@ -22,6 +26,124 @@ FILE_CONFIG: Dict[str, Any] = {
     "ALLOWED_EXTENSIONS": ('.txt', '.pdf', '.docx', '.xlsx', '.xls', '.csv'),
     "TEMP_DIR": "temp",
     "MAX_FILE_SIZE": 20 * 1024 * 1024,  # 增加到20MB
+    "UPLOAD_CHUNK_SIZE": 1024 * 1024,  # 上传流式写盘的块大小
+    "MULTIPART_OVERHEAD": 64 * 1024,  # multipart表单头部的额外字节
+    # 上传与已有文档同名的文件时，新文档入库成功后删除旧文档（视为更新）。默认关闭：同名文件各自保留为独立文档，
+    # 只有指定replace_doc_id、上传时传replace_same_filename=true或在此开启时才删除旧文档
+    "REPLACE_SAME_FILENAME": os.getenv("REPLACE_SAME_FILENAME", "false").lower() == "true",
+}
+
+# 文档提取执行器配置
+EXTRACTION_CONFIG: Dict[str, Any] = {
+    "EXECUTOR": os.getenv("EXTRACTION_EXECUTOR", "thread"),  # thread / process / inline（inline仅用于对比测试）
+    "MAX_WORKERS": int(os.getenv("EXTRACTION_WORKERS", "2")),
+}
+
+# PDF提取配置
+PDF_CONFIG: Dict[str, Any] = {
+    "PARALLEL_WORKERS": int(os.getenv("PDF_PARALLEL_WORKERS", str(min(4, os.cpu_count() or 1)))),  # 并行提取的进程数，1表示不并行
+    "PARALLEL_MIN_PAGES": int(os.getenv("PDF_PARALLEL_MIN_PAGES", "50")),  # 页数达到该值才启用并行提取
+    "PROFILES": ("fast", "balanced", "thorough"),  # 提取档位：仅文本层 / 疑似表格页才检测表格 / 完整提取
+    "DEFAULT_PROFILE": os.getenv("PDF_EXTRACTION_PROFILE", "thorough"),
+    "TABLE_MIN_RULING_ITEMS": 6,  # balanced档位：矢量直线/矩形达到该数量视为表格页
+    "TABLE_MIN_TOKENS": 8,  # balanced档位：文本词元少于该值时不按数字密度判断
+    "TABLE_NUMERIC_RATIO": 0.3,  # balanced档位：数字词元占比达到该值视为表格页
+    "TABLE_SKIP_SAMPLE_EVERY": 20,  # balanced档位：每该数量的跳过页抽样一页计时运行find_tables，用于估算节省的时间；0表示不抽样
+}
+
+# Excel提取配置
+EXCEL_CONFIG: Dict[str, Any] = {
+    "STREAM_MIN_ROWS": 20000,  # 行数达到该值的工作表使用openpyxl只读模式逐批读取
+    "STREAM_BATCH_ROWS": 5000,  # 流式读取时每批的行数
+    "PARALLEL_WORKERS": int(os.getenv("EXCEL_PARALLEL_WORKERS", str(min(4, os.cpu_count() or 1)))),
+    "PARALLEL_MIN_SHEETS": 8,  # 工作表数量达到该值才考虑并行
+    "PARALLEL_MIN_BYTES": 5 * 1024 * 1024,  # 文件大小达到该值才考虑并行
+}
+
+# CSV流式读取配置
+CSV_CONFIG: Dict[str, Any] = {
+    "MAX_ROWS": int(os.getenv("CSV_MAX_ROWS", "1000")),  # 转为文本的最大行数
+    "CHUNK_ROWS": 50000,  # 每次读取的行数
+    "SNIFF_BYTES": 64 * 1024,  # 检测编码和分隔符的样本大小
+    "COUNT_ALL_ROWS": True,  # 超过行数上限后是否继续读取以统计总行数
+}
+
+# 扫描页OCR配置（需要本地安装 tesseract 及 chi_sim 语言包）
+OCR_CONFIG: Dict[str, Any] = {
+    "ENABLED": os.getenv("OCR_ENABLED", "true").lower() == "true",
+    "LANG": os.getenv("OCR_LANG", "chi_sim+eng"),
+    "DPI": int(os.getenv("OCR_DPI", "200")),  # 页面渲染分辨率
+    "MAX_PAGES_PER_DOC": int(os.getenv("OCR_MAX_PAGES", "50")),  # 每个文档最多OCR的页数
+    "BATCH_SIZE": 4,  # 每个进程任务处理的页数
+    "WORKERS": int(os.getenv("OCR_WORKERS", str(min(4, os.cpu_count() or 1)))),
+}
+
+# 分词服务配置
+TOKENIZER_CONFIG: Dict[str, Any] = {
+    "CACHE_SIZE": int(os.getenv("TOKENIZER_CACHE_SIZE", "10000")),  # 缓存的文本块数量上限（LRU）
+    "PARALLEL_MIN_TEXTS": 2000,  # 一批未缓存文本达到该数量时使用进程池分词
+    "WORKERS": int(os.getenv("TOKENIZER_WORKERS", str(min(4, os.cpu_count() or 1)))),
+    # jieba前缀词典的序列化缓存，部署构建阶段预先生成，启动时直接读取
+    "JIEBA_CACHE_FILE": os.getenv("JIEBA_CACHE_FILE", os.path.join("data", "jieba.cache")),
+    # 金融领域用户词典，保证"营业收入"、"应收账款周转率"等术语不被切开
+    "USER_DICT": os.getenv(
+        "JIEBA_USER_DICT",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources", "financial_userdict.txt")
+    ),
+}
+
+# 本地句向量模型配置（VECTORIZER_BACKEND为onnx/tiny时使用）
+EMBEDDING_CONFIG: Dict[str, Any] = {
+    # 模型目录：包含model.onnx和tokenizer.json（例如导出的MiniLM类模型，输出维度需等于VECTOR_DIMENSION）
+    "MODEL_DIR": os.getenv("EMBEDDING_MODEL_DIR", os.path.join("models", "minilm")),
+    "BATCH_SIZE": int(os.getenv("EMBEDDING_BATCH_SIZE", "32")),  # 每次推理的文本数
+    "MAX_LENGTH": int(os.getenv("EMBEDDING_MAX_LENGTH", "256")),  # 每条文本的最大token数，超出截断
+    "THREADS": int(os.getenv("EMBEDDING_THREADS", str(os.cpu_count() or 1))),  # ONNX Runtime算子内线程数
+    "CACHE_ENABLED": os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true",  # 按文本块内容哈希缓存模型输出
+    "CACHE_DIR": os.getenv("EMBEDDING_CACHE_DIR", os.path.join("data", "embedding_cache")),
+}
+
+# 问答检索配置
+RETRIEVAL_CONFIG: Dict[str, Any] = {
+    "ENGINE": os.getenv("RETRIEVAL_ENGINE", "bm25"),  # bm25: 倒排索引BM25；sparse: 稀疏向量余弦；faiss: 稠密向量L2
+    "TOP_K": 5,  # 返回的文本块数量
+    "SPARSE_FEATURES": 2 ** 20,  # 稀疏检索的哈希空间大小
+}
+
+# 稠密向量索引配置：向量数越过阈值时在后台迁移到更适合的FAISS索引类型
+VECTOR_INDEX_CONFIG: Dict[str, Any] = {
+    "IVF_MIN_VECTORS": int(os.getenv("VECTOR_INDEX_IVF_MIN", "50000")),  # 达到该数量从Flat迁移到IVF
+    "HNSW_MIN_VECTORS": int(os.getenv("VECTOR_INDEX_HNSW_MIN", "500000")),  # 达到该数量迁移到HNSW
+    "TRAIN_SAMPLE": 100000,  # IVF训练的最大抽样向量数
+    "NPROBE": int(os.getenv("VECTOR_INDEX_NPROBE", "16")),  # IVF查询扫描的聚类数
+    "HNSW_M": 32,  # HNSW每个节点的邻居数
+    "HNSW_EF_SEARCH": int(os.getenv("VECTOR_INDEX_EF_SEARCH", "64")),
+    "HNSW_EF_CONSTRUCTION": 80,
+    # 删除的向量先记为墓碑，墓碑数达到任一阈值时在后台压缩索引
+    "COMPACT_MIN_TOMBSTONES": int(os.getenv("VECTOR_INDEX_COMPACT_MIN", "1000")),
+    "COMPACT_TOMBSTONE_RATIO": float(os.getenv("VECTOR_INDEX_COMPACT_RATIO", "0.2")),  # 墓碑占索引向量数的比例
+}
+
+# 快照持久化配置：稠密索引和文档存储写入磁盘，重启后加载
+PERSISTENCE_CONFIG: Dict[str, Any] = {
+    "ENABLED": os.getenv("PERSISTENCE_ENABLED", "true").lower() == "true",
+    "DIR": os.getenv("SNAPSHOT_DIR", os.path.join("data", "snapshot")),
+    "MODE": os.getenv("SNAPSHOT_MODE", "change"),  # change: 每次变更后保存；interval: 定时保存有变更的状态
+    "INTERVAL": float(os.getenv("SNAPSHOT_INTERVAL", "30")),  # interval模式的保存间隔（秒）
+    "DEBOUNCE": 1.0,  # change模式下合并连续变更的等待时间（秒）
+    "MIN_INTERVAL": float(os.getenv("SNAPSHOT_MIN_INTERVAL", "5")),  # change模式下两次保存的最小间隔（秒）
+}
+
+# 表格列式存储配置（Excel/CSV的原始数据按列落盘，供汇总查询直接内存映射读取）
+TABULAR_CONFIG: Dict[str, Any] = {
+    "ENABLED": os.getenv("TABULAR_STORE_ENABLED", "true").lower() == "true",
+    "DIR": os.getenv("TABULAR_STORE_DIR", os.path.join("data", "tables")),
+}
+
+# 运行监控配置
+MONITOR_CONFIG: Dict[str, Any] = {
+    "LOOP_LAG_INTERVAL": 0.1,  # 事件循环延迟采样间隔（秒）
+    "LOOP_LAG_WINDOW": 600,  # 保留的采样点数量
 }
 
 def ensure_temp_dir():
@@ -30,5 +152,6 @@ def ensure_temp_dir():
         os.makedirs(FILE_CONFIG["TEMP_DIR"])
 
 def get_temp_path(filename: str) -> str:
-    """获取临时文件路径"""
-    return os.path.join(FILE_CONFIG["TEMP_DIR"], f"temp_{filename}") 
\ No newline at end of file
+    """获取临时文件路径（每个请求唯一，避免同名上传互相覆盖）"""
+    safe_name = os.path.basename(filename)
+    return os.path.join(FILE_CONFIG["TEMP_DIR"], f"temp_{uuid.uuid4().hex}_{safe_name}")
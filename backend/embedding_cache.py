@@ -0,0 +1,117 @@
+"""磁盘向量缓存 - 按文本块内容哈希缓存句向量模型的输出，重复上传或重启服务后不必重新推理
+
+每个 (模型后端, 模型版本, 维度) 一个目录：
+  vectors.f32  只追加写入的float32向量，第i行偏移为 i * 维度 * 4 字节，加载时内存映射
+  keys.bin     只追加写入的16字节文本哈希，第i个哈希对应第i行向量
+启动时读取keys.bin建立 哈希 -> 行号 的偏移索引。先写向量再写哈希，进程中断时以两者较短的为准。
+只有输出与语料无关的后端（句向量模型）才能缓存；tfidf/hashing的向量依赖语料统计，不使用缓存。
+"""
+import hashlib
+import os
+import threading
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+KEY_BYTES = 16
+
+
+def text_key(text: str) -> bytes:
+    """文本块内容哈希"""
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=KEY_BYTES).digest()
+
+
+class EmbeddingCache:
+    """只追加的磁盘向量缓存：get_many批量查找，put_many追加未缓存的向量"""
+
+    def __init__(self, cache_dir: str, backend_name: str, version: str, dimension: int):
+        self.dimension = dimension
+        self.directory = os.path.join(cache_dir, f"{backend_name}-{version}-{dimension}")
+        os.makedirs(self.directory, exist_ok=True)
+        self._vectors_path = os.path.join(self.directory, "vectors.f32")
+        self._keys_path = os.path.join(self.directory, "keys.bin")
+        self._lock = threading.Lock()
+        self._offsets: Dict[bytes, int] = {}
+        self._mapped = None
+        self._mapped_rows = 0
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def _load(self):
+        row_bytes = self.dimension * 4
+        vector_rows = os.path.getsize(self._vectors_path) // row_bytes if os.path.exists(self._vectors_path) else 0
+        key_rows = os.path.getsize(self._keys_path) // KEY_BYTES if os.path.exists(self._keys_path) else 0
+        rows = min(vector_rows, key_rows)
+        # 截掉中断写入留下的不完整部分，保证两个文件行数一致
+        for path, size in ((self._vectors_path, rows * row_bytes), (self._keys_path, rows * KEY_BYTES)):
+            with open(path, "ab") as f:
+                f.truncate(size)
+
+        if rows:
+            with open(self._keys_path, "rb") as f:
+                keys = f.read()
+            for row in range(rows):
+                self._offsets.setdefault(keys[row * KEY_BYTES:(row + 1) * KEY_BYTES], row)
+        self._rows = rows
+        self._vectors_file = open(self._vectors_path, "ab")
+        self._keys_file = open(self._keys_path, "ab")
+        self._remap()
+        print(f"向量缓存已加载: {self.directory}，{len(self._offsets)} 条")
+
+    def _remap(self):
+        """重新映射向量文件，使新追加的行可读"""
+        self._mapped = None
+        if self._rows:
+            self._mapped = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(self._rows, self.dimension))
+        self._mapped_rows = self._rows
+
+    def get_many(self, keys: List[bytes]) -> Tuple[np.ndarray, np.ndarray]:
+        """批量查找，返回 (是否命中的布尔数组, 向量矩阵)；未命中的行为0"""
+        found = np.zeros(len(keys), dtype=bool)
+        vectors = np.zeros((len(keys), self.dimension), dtype=np.float32)
+        with self._lock:
+            rows = np.array([self._offsets.get(key, -1) for key in keys], dtype=np.int64)
+            found = rows >= 0
+            if found.any():
+                if rows.max() >= self._mapped_rows:
+                    self._remap()
+                vectors[found] = self._mapped[rows[found]]
+            hit_count = int(found.sum())
+            self.hits += hit_count
+            self.misses += len(keys) - hit_count
+        return found, vectors
+
+    def put_many(self, keys: List[bytes], vectors: np.ndarray):
+        """追加未缓存的向量（同一批内重复的哈希只写一次）"""
+        with self._lock:
+            new_rows = []
+            new_keys = []
+            for position, key in enumerate(keys):
+                if key not in self._offsets:
+                    self._offsets[key] = self._rows + len(new_keys)
+                    new_keys.append(key)
+                    new_rows.append(position)
+            if not new_keys:
+                return
+            self._vectors_file.write(np.ascontiguousarray(vectors[new_rows], dtype=np.float32).tobytes())
+            self._vectors_file.flush()
+            self._keys_file.write(b"".join(new_keys))
+            self._keys_file.flush()
+            self._rows += len(new_keys)
+
+    def close(self):
+        with self._lock:
+            self._mapped = None
+            self._vectors_file.close()
+            self._keys_file.close()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._offsets),
+            "bytes": self._rows * self.dimension * 4,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
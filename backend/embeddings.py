@@ -0,0 +1,200 @@
+"""本地句向量模型后端 - 从磁盘加载模型，在CPU上按批推理
+
+所有模型后端共用EmbeddingBackend.embed的批处理流程：按长度排序分批 -> 分词并补齐 -> 前向推理
+-> 按attention mask做均值池化 -> L2归一化。入库的文本块和查询问题都走这一流程。
+
+onnx: 导出为ONNX的MiniLM类句向量模型（模型目录含model.onnx和tokenizer.json），需要onnxruntime和tokenizers
+tiny: 确定性的小型测试模型（字符级词表 + 固定随机种子的词向量和一层投影），无需模型文件，
+      用于在没有真实模型的环境中走通同一条推理流程
+"""
+import hashlib
+import os
+import threading
+import zlib
+from abc import ABC, abstractmethod
+from typing import List, Tuple
+
+import numpy as np
+
+from config import EMBEDDING_CONFIG
+
+try:
+    import onnxruntime
+    from tokenizers import Tokenizer
+    ONNX_AVAILABLE = True
+except ImportError:
+    print("警告：onnxruntime或tokenizers未安装，ONNX句向量模型将不可用")
+    ONNX_AVAILABLE = False
+
+
+class EmbeddingBackend(ABC):
+    """句向量模型后端基类：子类实现_tokenize和_forward，批处理、池化和归一化在这里完成"""
+
+    name = "embedding"
+    # 模型自带分词器，输入原始文本（tfidf/hashing后端输入的是jieba分词后的文本）
+    tokenized_input = False
+    # 模型固定，不需要拟合；同一文本的输出只取决于模型版本，可以按内容缓存
+    fitted = True
+    cacheable = True
+
+    def __init__(self, dimension: int, batch_size: int, max_length: int):
+        if batch_size <= 0:
+            raise ValueError(f"batch_size必须大于0: {batch_size}")
+        self.dimension = dimension
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.version = ""  # 模型版本标识，模型文件变化时随之变化
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.texts_embedded = 0
+
+    def reset(self):
+        """模型没有随语料变化的状态，无需重置"""
+
+    @abstractmethod
+    def _tokenize(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """返回补齐到同一长度的 (input_ids, attention_mask)，形状均为 (批大小, 序列长度)"""
+
+    @abstractmethod
+    def _forward(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        """返回 (批大小, 序列长度, 维度) 的token向量，或已池化的 (批大小, 维度) 句向量"""
+
+    def embed(self, texts: List[str], update_stats: bool = True) -> np.ndarray:
+        """批量编码为L2归一化的float32矩阵；update_stats仅为与其他后端接口一致，模型后端忽略"""
+        vectors = np.zeros((len(texts), self.dimension), dtype="float32")
+        if not texts:
+            return vectors
+
+        # 按长度排序后分批，同一批内补齐的长度接近，减少无效计算
+        order = np.argsort([len(text) for text in texts], kind="stable")
+        for batch_start in range(0, len(texts), self.batch_size):
+            positions = order[batch_start:batch_start + self.batch_size]
+            input_ids, attention_mask = self._tokenize([texts[position] for position in positions])
+            with self._lock:
+                output = self._forward(input_ids, attention_mask)
+            if output.ndim == 3:
+                mask = attention_mask[:, :, None].astype(np.float32)
+                output = (output * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            vectors[positions] = output
+            self.batches += 1
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.maximum(norms, 1e-12)
+        self.texts_embedded += len(texts)
+        return vectors
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "fitted": self.fitted,
+            "version": self.version,
+            "batch_size": self.batch_size,
+            "batches": self.batches,
+            "texts_embedded": self.texts_embedded
+        }
+
+
+class OnnxEmbeddingBackend(EmbeddingBackend):
+    """ONNX Runtime CPU推理的句向量模型（MiniLM等BERT类模型，输出token向量后均值池化）"""
+
+    name = "onnx"
+
+    def __init__(self, dimension: int, model_dir: str, batch_size: int, max_length: int, threads: int = 1):
+        super().__init__(dimension, batch_size, max_length)
+        if not ONNX_AVAILABLE:
+            raise RuntimeError("ONNX句向量模型需要安装onnxruntime和tokenizers")
+
+        model_path = os.path.join(model_dir, "model.onnx")
+        tokenizer_path = os.path.join(model_dir, "tokenizer.json")
+        for path in (model_path, tokenizer_path):
+            if not os.path.isfile(path):
+                raise FileNotFoundError(f"模型文件不存在: {path}")
+
+        self._tokenizer = Tokenizer.from_file(tokenizer_path)
+        self._tokenizer.enable_truncation(max_length=max_length)
+        self._tokenizer.enable_padding()
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        self._session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self._input_names = {model_input.name for model_input in self._session.get_inputs()}
+
+        output_dimension = self._session.get_outputs()[0].shape[-1]
+        if isinstance(output_dimension, int) and output_dimension != dimension:
+            raise ValueError(f"模型输出维度 {output_dimension} 与向量维度配置 {dimension} 不一致")
+
+        digest = hashlib.blake2b(digest_size=8)
+        for path in (model_path, tokenizer_path):
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(block)
+        self.version = digest.hexdigest()
+        print(f"ONNX句向量模型已加载: {model_dir}（版本 {self.version}，批大小 {batch_size}）")
+
+    def _tokenize(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        encodings = self._tokenizer.encode_batch(texts)
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        return input_ids, attention_mask
+
+    def _forward(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        feeds = {name: value for name, value in feeds.items() if name in self._input_names}
+        return self._session.run(None, feeds)[0]
+
+
+class TinyEmbeddingBackend(EmbeddingBackend):
+    """确定性测试模型：字符按CRC32映射到固定词表，词向量经一层tanh投影后输出token向量"""
+
+    name = "tiny"
+    VOCAB_SIZE = 4096
+    SEED = 20240101
+
+    def __init__(self, dimension: int, batch_size: int, max_length: int):
+        super().__init__(dimension, batch_size, max_length)
+        rng = np.random.RandomState(self.SEED)
+        self._token_embeddings = rng.standard_normal((self.VOCAB_SIZE, dimension)).astype(np.float32)
+        self._token_embeddings[0] = 0.0  # 0号为补齐符
+        self._projection = (rng.standard_normal((dimension, dimension)) / np.sqrt(dimension)).astype(np.float32)
+        self.version = f"tiny-{self.SEED}-{self.VOCAB_SIZE}-{dimension}"
+
+    def _tokenize(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        token_lists = [
+            [zlib.crc32(char.encode("utf-8")) % (self.VOCAB_SIZE - 1) + 1 for char in text if not char.isspace()]
+            [:self.max_length]
+            for text in texts
+        ]
+        length = max(1, max(len(tokens) for tokens in token_lists))
+        input_ids = np.zeros((len(texts), length), dtype=np.int64)
+        attention_mask = np.zeros((len(texts), length), dtype=np.int64)
+        for row, tokens in enumerate(token_lists):
+            input_ids[row, :len(tokens)] = tokens
+            attention_mask[row, :len(tokens)] = 1
+        return input_ids, attention_mask
+
+    def _forward(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        return np.tanh(self._token_embeddings[input_ids] @ self._projection)
+
+
+EMBEDDING_BACKENDS = {
+    OnnxEmbeddingBackend.name: OnnxEmbeddingBackend,
+    TinyEmbeddingBackend.name: TinyEmbeddingBackend,
+}
+
+
+def create_embedding_backend(name: str, dimension: int) -> EmbeddingBackend:
+    """按名称和EMBEDDING_CONFIG创建句向量模型后端"""
+    if name == OnnxEmbeddingBackend.name:
+        return OnnxEmbeddingBackend(
+            dimension,
+            EMBEDDING_CONFIG["MODEL_DIR"],
+            EMBEDDING_CONFIG["BATCH_SIZE"],
+            EMBEDDING_CONFIG["MAX_LENGTH"],
+            EMBEDDING_CONFIG["THREADS"]
+        )
+    if name == TinyEmbeddingBackend.name:
+        return TinyEmbeddingBackend(dimension, EMBEDDING_CONFIG["BATCH_SIZE"], EMBEDDING_CONFIG["MAX_LENGTH"])
+    raise ValueError(f"不支持的句向量模型后端: {name}。可选：{', '.join(EMBEDDING_BACKENDS)}")
@@ -0,0 +1,93 @@
+"""文档提取执行器 - 把阻塞的文本提取从asyncio事件循环中移走"""
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Iterator, Optional
+from config import EXTRACTION_CONFIG
+
+_executor: Optional[Executor] = None
+_iteration_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_extraction_executor() -> Optional[Executor]:
+    """按配置懒加载提取执行器，inline模式返回None"""
+    global _executor
+
+    executor_type = EXTRACTION_CONFIG["EXECUTOR"]
+    if executor_type == "inline":
+        return None
+
+    if _executor is None:
+        max_workers = EXTRACTION_CONFIG["MAX_WORKERS"]
+        if executor_type == "process":
+            _executor = ProcessPoolExecutor(max_workers=max_workers)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="extract")
+        print(f"文档提取执行器已创建: {executor_type}, 工作线程/进程数: {max_workers}")
+    return _executor
+
+
+async def run_extraction(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """在提取执行器中运行阻塞的提取函数"""
+    executor = get_extraction_executor()
+    if executor is None:
+        # inline模式：直接在事件循环中运行，仅用于对比事件循环延迟
+        return func(*args, **kwargs)
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
+
+
+def _get_iteration_executor() -> Optional[Executor]:
+    """驱动生成器的执行器：生成器对象无法pickle，thread模式复用提取线程池，
+    process模式使用工作数上限相同的专用线程池，inline模式返回None"""
+    global _iteration_executor
+
+    executor = get_extraction_executor()
+    if executor is None or isinstance(executor, ThreadPoolExecutor):
+        return executor
+    if _iteration_executor is None:
+        _iteration_executor = ThreadPoolExecutor(
+            max_workers=EXTRACTION_CONFIG["MAX_WORKERS"], thread_name_prefix="extract-iter"
+        )
+    return _iteration_executor
+
+
+async def iterate_in_thread(iterator: Iterator[Any]) -> AsyncIterator[Any]:
+    """在提取线程池中逐项驱动同步生成器，每产出一项就交还给事件循环
+
+    提前结束（调用方停止迭代、客户端断开导致任务取消）时关闭生成器，释放其中打开的文件。
+    """
+    executor = _get_iteration_executor()
+    sentinel = object()
+    pending = None
+    try:
+        while True:
+            if executor is None:
+                item = next(iterator, sentinel)
+            else:
+                pending = executor.submit(next, iterator, sentinel)
+                item = await asyncio.wrap_future(pending)
+                pending = None
+            if item is sentinel:
+                break
+            yield item
+    finally:
+        # 任务取消不会中断线程中正在运行的next，关闭生成器前先等它结束
+        if pending is not None and not pending.done():
+            await asyncio.wait([asyncio.wrap_future(pending)])
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+
+
+def shutdown_extraction_executor():
+    """关闭提取执行器"""
+    global _executor, _iteration_executor
+
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+    if _iteration_executor is not None:
+        _iteration_executor.shutdown(wait=False, cancel_futures=True)
+        _iteration_executor = None
@@ -0,0 +1,898 @@
+"""文档文本提取模块
+
+这里的提取函数都是同步阻塞的，由 extraction_executor 调度到线程池/进程池中运行。
+函数定义在模块顶层，保证进程池可以pickle调用。
+"""
+import os
+import re
+import csv
+import codecs
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_datetime64_any_dtype
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from config import PDF_CONFIG, OCR_CONFIG, CSV_CONFIG, EXCEL_CONFIG
+from ocr import StreamingOcr, is_ocr_enabled, ocr_pdf_pages
+from tabular_store import TableWriter, table_dir_for
+
+# WordprocessingML 命名空间下用到的标签
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+W_BODY, W_P, W_R, W_T, W_TBL, W_TR, W_TC = (W_NS + tag for tag in ("body", "p", "r", "t", "tbl", "tr", "tc"))
+W_TAB, W_PTAB, W_BR, W_CR, W_NO_BREAK_HYPHEN = (W_NS + tag for tag in ("tab", "ptab", "br", "cr", "noBreakHyphen"))
+W_HYPERLINK, W_TC_PR, W_GRID_SPAN, W_V_MERGE, W_VAL = (W_NS + tag for tag in ("hyperlink", "tcPr", "gridSpan", "vMerge", "val"))
+
+# CSV编码候选（按优先级）
+CSV_ENCODINGS = ['utf-8', 'gbk', 'gb2312', 'latin-1']
+
+OCR_PLACEHOLDER = "注意：此页面可能包含图片或扫描内容，需要OCR处理"
+
+# 数字词元：金额、百分比、带千分位或括号的负数等
+NUMERIC_TOKEN_PATTERN = re.compile(r'^[(（]?[-+]?[\d,，]*\d(\.\d+)?[%％]?[)）]?$')
+
+
+def extract_text_from_txt(file_path: str) -> str:
+    """读取纯文本文件，依次尝试常见编码"""
+    for encoding in ['utf-8', 'gbk', 'gb2312', 'latin-1']:
+        try:
+            with open(file_path, 'r', encoding=encoding) as f:
+                text = f.read()
+            print(f"成功使用编码 {encoding} 读取TXT文件")
+            return text
+        except UnicodeDecodeError:
+            continue
+    return ""
+
+def _count_ruling_items(page) -> int:
+    """统计页面矢量绘图中的直线和矩形数量（表格框线的主要来源）"""
+    try:
+        # get_cdrawings 只返回原始路径数据，比 get_drawings 快得多
+        get_drawings = getattr(page, "get_cdrawings", None) or page.get_drawings
+        count = 0
+        for path in get_drawings():
+            for item in path.get("items", ()):
+                if item[0] in ("l", "re"):
+                    count += 1
+        return count
+    except Exception as e:
+        print(f"矢量图形统计错误: {e}")
+        return 0
+
+def classify_table_page(page, text: str) -> Dict[str, Any]:
+    """廉价的表格页分类器：根据矢量框线数量和文本层数字密度判断是否值得运行find_tables"""
+    tokens = text.split()
+    numeric_tokens = sum(1 for token in tokens if NUMERIC_TOKEN_PATTERN.match(token))
+    numeric_ratio = numeric_tokens / len(tokens) if tokens else 0.0
+    ruling_items = _count_ruling_items(page)
+    
+    if ruling_items >= PDF_CONFIG["TABLE_MIN_RULING_ITEMS"]:
+        reason = "ruling"
+    elif len(tokens) >= PDF_CONFIG["TABLE_MIN_TOKENS"] and numeric_ratio >= PDF_CONFIG["TABLE_NUMERIC_RATIO"]:
+        reason = "numeric"
+    else:
+        reason = "prose"
+    
+    return {
+        "tabular": reason != "prose",
+        "reason": reason,
+        "ruling_items": ruling_items,
+        "numeric_ratio": round(numeric_ratio, 3),
+    }
+
+def _extract_page_tables(page) -> List[str]:
+    """使用find_tables提取页面表格"""
+    tables = []
+    try:
+        table_data = page.find_tables()
+        for table in table_data:
+            table_text = []
+            try:
+                table_content = table.extract()
+                for row in table_content:
+                    if row and any(cell for cell in row):  # 过滤空行
+                        row_text = " | ".join(str(cell) if cell else "" for cell in row)
+                        table_text.append(row_text)
+                if table_text:
+                    tables.append("表格内容:\n" + "\n".join(table_text))
+            except Exception as e:
+                print(f"表格提取错误: {e}")
+                continue
+        print(f"提取到 {len(tables)} 个表格")
+    except Exception as e:
+        print(f"表格查找错误: {e}")
+    return tables
+
+def _extract_page_text_blocks(page) -> List[str]:
+    """基于文本块的提取（dict布局分析），仅在文本层为空时使用"""
+    text_blocks = []
+    try:
+        blocks = page.get_text("dict")
+        for block in blocks["blocks"]:
+            if "lines" in block:
+                block_text = ""
+                for line in block["lines"]:
+                    for span in line["spans"]:
+                        if span.get("text", "").strip():
+                            block_text += span["text"] + " "
+                if block_text.strip():
+                    text_blocks.append(block_text.strip())
+        print(f"提取到 {len(text_blocks)} 个文本块")
+    except Exception as e:
+        print(f"文本块提取错误: {e}")
+    return text_blocks
+
+class _SkippedPageSampler:
+    """balanced档位：从第一页起，每every个跳过表格检测的页面抽样一页；every为0时不抽样"""
+    
+    def __init__(self, every: int):
+        self.every = every
+        self.skipped = 0
+    
+    def take(self) -> bool:
+        self.skipped += 1
+        return bool(self.every) and (self.skipped - 1) % self.every == 0
+
+def _extract_pdf_page(page, page_num: int, profile: str = "thorough",
+                      sampler: Optional[_SkippedPageSampler] = None) -> Tuple[str, Dict[str, Any]]:
+    """按提取档位提取单个PDF页面，返回 (页面文本, 页面统计)，无内容时页面文本为空字符串
+    
+    fast: 只读取文本层
+    balanced: 文本层 + 仅对分类器判定为表格页的页面运行表格检测
+    thorough: 文本层 + 每页表格检测 + 文本层为空时的文本块分析
+    """
+    print(f"\n--- 处理第 {page_num + 1} 页 ---")
+    page_stats: Dict[str, Any] = {"page": page_num + 1}
+    
+    # 方法1: 直接提取文本（所有档位都只做这一次文本层读取）
+    text = page.get_text()
+    print(f"直接提取文本长度: {len(text)}")
+    
+    # 方法2: 提取表格
+    tables = []
+    if profile == "balanced":
+        classify_start = time.perf_counter()
+        classification = classify_table_page(page, text)
+        page_stats["classify_ms"] = round((time.perf_counter() - classify_start) * 1000, 2)
+        page_stats.update(classification)
+        run_table_detection = classification["tabular"]
+        if not run_table_detection and sampler is not None and sampler.take():
+            # 抽样的跳过页：计时运行find_tables但丢弃结果，只用于估算跳过这些页节省的时间
+            sample_start = time.perf_counter()
+            _extract_page_tables(page)
+            page_stats["sampled_find_tables_ms"] = round((time.perf_counter() - sample_start) * 1000, 2)
+    else:
+        run_table_detection = profile == "thorough"
+    
+    page_stats["table_check"] = run_table_detection
+    if run_table_detection:
+        table_start = time.perf_counter()
+        tables = _extract_page_tables(page)
+        page_stats["find_tables_ms"] = round((time.perf_counter() - table_start) * 1000, 2)
+        page_stats["tables"] = len(tables)
+    
+    # 合并所有提取的内容
+    page_content = []
+    
+    # 添加直接提取的文本
+    if text.strip():
+        page_content.append(f"页面文本:\n{text.strip()}")
+    
+    # 添加表格内容
+    if tables:
+        page_content.extend(tables)
+    
+    # 方法3: 文本层为空时才进行文本块分析
+    if not text.strip() and profile == "thorough":
+        text_blocks = _extract_page_text_blocks(page)
+        if text_blocks:
+            page_content.append("文本块内容:\n" + "\n".join(text_blocks))
+    
+    # 如果仍然没有内容，标记为需要OCR的页面（无需栅格化即可判断）
+    if not page_content and not page.rect.is_empty:
+        page_content.append(OCR_PLACEHOLDER)
+        page_stats["text_layer_empty"] = True
+        print("页面可能包含图片内容")
+    
+    if not page_content:
+        print(f"第 {page_num + 1} 页未提取到内容")
+        return "", page_stats
+    
+    page_text = _format_page_text(page_num, page_content)
+    print(f"第 {page_num + 1} 页最终文本长度: {len(page_text)}")
+    return page_text, page_stats
+
+def _format_page_text(page_num: int, page_content: List[str]) -> str:
+    """拼接单页内容并加上页码标题"""
+    return f"\n=== 第 {page_num + 1} 页 ===\n" + "\n\n".join(page_content)
+
+def _apply_ocr(file_path: str, page_results: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, Any]:
+    """对文本层为空的页面运行OCR，用识别结果替换占位提示，返回OCR统计"""
+    empty_pages = [
+        page_stats["page"] - 1
+        for _, page_stats in page_results
+        if page_stats.get("text_layer_empty")
+    ]
+    if not empty_pages or not is_ocr_enabled():
+        return {"ocr_candidates": len(empty_pages), "ocr_pages": 0}
+    
+    ocr_texts, ocr_stats = ocr_pdf_pages(file_path, empty_pages)
+    for page_num, ocr_text in ocr_texts.items():
+        if ocr_text:
+            page_results[page_num] = (
+                _format_page_text(page_num, [f"OCR识别文本:\n{ocr_text}"]),
+                {**page_results[page_num][1], "ocr": True},
+            )
+    return ocr_stats
+
+def _summarize_pdf_stats(page_stats: List[Dict[str, Any]], profile: str) -> Dict[str, Any]:
+    """汇总逐页统计：表格检测的运行/跳过页数、实测的分类与find_tables耗时，以及估算节省的时间
+    
+    表格页上的find_tables比正文页慢得多，不能用来推算跳过的正文页；估算只基于抽样跳过页的实测耗时，
+    并扣除分类器本身的耗时。没有抽样页时不给出估算（为None）。
+    """
+    checked = [stats for stats in page_stats if stats.get("table_check")]
+    skipped_count = len(page_stats) - len(checked)
+    find_tables_ms = sum(stats.get("find_tables_ms", 0.0) for stats in checked)
+    classify_ms = sum(stats.get("classify_ms", 0.0) for stats in page_stats)
+    samples = [stats["sampled_find_tables_ms"] for stats in page_stats if "sampled_find_tables_ms" in stats]
+    
+    estimated_time_saved_ms = None
+    if samples:
+        estimated_time_saved_ms = round(sum(samples) / len(samples) * skipped_count - classify_ms, 2)
+    
+    return {
+        "profile": profile,
+        "pages": len(page_stats),
+        "table_pages_checked": len(checked),
+        "table_pages_skipped": skipped_count,
+        "tables_found": sum(stats.get("tables", 0) for stats in checked),
+        "find_tables_ms": round(find_tables_ms, 2),
+        "classify_ms": round(classify_ms, 2),
+        "skipped_pages_sampled": len(samples),
+        "sampled_find_tables_ms": round(sum(samples), 2),
+        "estimated_time_saved_ms": estimated_time_saved_ms,
+        "page_decisions": page_stats,
+    }
+
+def _extract_pdf_page_range(file_path: str, start: int, end: int, profile: str = "thorough") -> List[Tuple[str, Dict[str, Any]]]:
+    """进程池工作函数：独立打开PDF并提取 [start, end) 范围内的页面"""
+    import fitz  # PyMuPDF
+    
+    doc = fitz.open(file_path)
+    try:
+        sampler = _SkippedPageSampler(PDF_CONFIG["TABLE_SKIP_SAMPLE_EVERY"])
+        return [_extract_pdf_page(doc[page_num], page_num, profile, sampler) for page_num in range(start, end)]
+    finally:
+        doc.close()
+
+def _split_ranges(item_count: int, shard_count: int) -> List[Tuple[int, int]]:
+    """把 [0, item_count) 切分为连续的分片"""
+    shard_count = max(1, min(shard_count, item_count))
+    shard_size, remainder = divmod(item_count, shard_count)
+    ranges = []
+    start = 0
+    for shard in range(shard_count):
+        end = start + shard_size + (1 if shard < remainder else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+def _extract_pdf_pages_parallel(file_path: str, page_count: int, workers: int, profile: str = "thorough") -> List[Tuple[str, Dict[str, Any]]]:
+    """按页码范围把PDF分片到进程池中提取，按原页序合并结果"""
+    # 分片数多于进程数，避免个别重页面拖慢整个分片
+    page_ranges = _split_ranges(page_count, workers * 2)
+    print(f"并行提取PDF: {workers} 个进程, {len(page_ranges)} 个分片")
+    
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(_extract_pdf_page_range, file_path, start, end, profile)
+            for start, end in page_ranges
+        ]
+        page_results = []
+        for future in futures:
+            page_results.extend(future.result())
+    return page_results
+
+def iter_pdf_pages(file_path: str, profile: str = "thorough") -> Iterator[Tuple[int, int, str, Dict[str, Any]]]:
+    """逐页提取PDF的生成器，按页码顺序产出 (页码, 总页数, 页面文本, 页面统计)
+    
+    文本层为空的扫描页交给StreamingOcr按批在进程池中识别（与整体提取相同的批大小、进程数和页数预算），
+    识别期间继续提取后面的页面；最多提前提取一轮进程池容量的页面，之后等最早的扫描页识别完成。
+    """
+    import fitz  # PyMuPDF
+    
+    ocr = StreamingOcr(file_path) if is_ocr_enabled() else None
+    lookahead = OCR_CONFIG["BATCH_SIZE"] * max(OCR_CONFIG["WORKERS"], 1)
+    pending = deque()  # (页码索引, 页面文本, 页面统计, 是否等待OCR)
+    
+    def finish(page_num: int, page_text: str, page_stats: Dict[str, Any], ocr_queued: bool):
+        if ocr_queued:
+            ocr_text = ocr.result(page_num)
+            if ocr_text:
+                page_text = _format_page_text(page_num, [f"OCR识别文本:\n{ocr_text}"])
+                page_stats["ocr"] = True
+        return page_num + 1, page_count, page_text, page_stats
+    
+    doc = fitz.open(file_path)
+    try:
+        page_count = len(doc)
+        sampler = _SkippedPageSampler(PDF_CONFIG["TABLE_SKIP_SAMPLE_EVERY"])
+        for page_num in range(page_count):
+            page_text, page_stats = _extract_pdf_page(doc[page_num], page_num, profile, sampler)
+            ocr_queued = bool(page_stats.get("text_layer_empty")) and ocr is not None and ocr.add(page_num)
+            pending.append((page_num, page_text, page_stats, ocr_queued))
+            
+            while pending and (not pending[0][3] or ocr.done(pending[0][0]) or len(pending) > lookahead):
+                yield finish(*pending.popleft())
+        
+        while pending:
+            yield finish(*pending.popleft())
+        if ocr is not None and ocr.skipped_by_budget:
+            print(f"超出OCR页数预算，跳过 {ocr.skipped_by_budget} 个扫描页")
+    finally:
+        if ocr is not None:
+            ocr.close()
+        doc.close()
+
+def extract_text_from_pdf(file_path: str, profile: str = "thorough") -> str:
+    """改进的PDF文本提取方法，支持表格和图片，profile为提取档位（fast/balanced/thorough）"""
+    text, _ = extract_pdf_with_stats(file_path, profile)
+    return text
+
+def extract_pdf_with_stats(file_path: str, profile: str = "thorough") -> Tuple[str, Dict[str, Any]]:
+    """提取PDF文本并返回逐页统计，返回 (文本, 统计)"""
+    try:
+        import fitz  # PyMuPDF
+        print(f"\n=== PDF处理开始 ===")
+        print(f"处理文件: {file_path}，提取档位: {profile}")
+        
+        # 读取页数，决定是否并行提取
+        with fitz.open(file_path) as doc:
+            page_count = len(doc)
+        print(f"PDF页数: {page_count}")
+        
+        workers = PDF_CONFIG["PARALLEL_WORKERS"]
+        page_results = None
+        if workers > 1 and page_count >= PDF_CONFIG["PARALLEL_MIN_PAGES"]:
+            try:
+                page_results = _extract_pdf_pages_parallel(file_path, page_count, workers, profile)
+            except Exception as e:
+                print(f"并行提取失败，回退到逐页提取: {e}")
+        
+        if page_results is None:
+            page_results = _extract_pdf_page_range(file_path, 0, page_count, profile)
+        
+        # 扫描页OCR（只处理文本层为空的页面）
+        ocr_stats = _apply_ocr(file_path, page_results)
+        
+        # 合并所有页面文本
+        all_text = [page_text for page_text, _ in page_results if page_text]
+        final_text = "\n\n".join(all_text)
+        pdf_stats = _summarize_pdf_stats([page_stats for _, page_stats in page_results], profile)
+        pdf_stats.update(ocr_stats)
+        print(f"\n总文本长度: {len(final_text)}")
+        print(f"表格检测: 运行 {pdf_stats['table_pages_checked']} 页（{pdf_stats['find_tables_ms']}ms）, "
+              f"跳过 {pdf_stats['table_pages_skipped']} 页, 分类耗时 {pdf_stats['classify_ms']}ms, "
+              f"估算节省 {pdf_stats['estimated_time_saved_ms']}ms（抽样 {pdf_stats['skipped_pages_sampled']} 页）")
+        print(f"文本预览: {final_text[:200]}...")
+        print("=== PDF处理完成 ===\n")
+        
+        return final_text, pdf_stats
+        
+    except Exception as e:
+        print(f"\n=== PDF处理错误 ===")
+        print(f"错误信息: {str(e)}")
+        print(f"文件路径: {file_path}")
+        try:
+            print(f"文件大小: {os.path.getsize(file_path)} 字节")
+        except:
+            print("无法获取文件大小")
+        print("=== 错误详情结束 ===\n")
+        
+        # 即使出错也尝试返回基础提取结果
+        try:
+            import fitz
+            doc = fitz.open(file_path)
+            basic_text = ""
+            for page in doc:
+                basic_text += page.get_text() + "\n"
+            doc.close()
+            if basic_text.strip():
+                return f"基础提取结果:\n{basic_text.strip()}", {"profile": profile, "fallback": True}
+        except:
+            pass
+            
+        return "", {"profile": profile, "fallback": True}
+
+def _docx_run_text(run) -> str:
+    """提取w:r的文本，与python-docx的Run.text规则一致（制表符、换行转为对应字符）"""
+    parts = []
+    for child in run:
+        if child.tag == W_T:
+            parts.append(child.text or "")
+        elif child.tag in (W_TAB, W_PTAB):
+            parts.append("\t")
+        elif child.tag in (W_BR, W_CR):
+            parts.append("\n")
+        elif child.tag == W_NO_BREAK_HYPHEN:
+            parts.append("-")
+    return "".join(parts)
+
+def _docx_paragraph_text(paragraph) -> str:
+    """提取w:p的文本：直接子run以及超链接中的run"""
+    parts = []
+    for child in paragraph:
+        if child.tag == W_R:
+            parts.append(_docx_run_text(child))
+        elif child.tag == W_HYPERLINK:
+            parts.extend(_docx_run_text(run) for run in child if run.tag == W_R)
+    return "".join(parts)
+
+def _docx_table_rows(table) -> List[List[str]]:
+    """把w:tbl转换为按网格列对齐的单元格文本，合并单元格的文本只保留一次
+    
+    横向合并(gridSpan)的多余列和纵向合并(vMerge)的后续行填空字符串，
+    避免python-docx按网格展开时重复输出同一单元格的文本。
+    """
+    rows = []
+    for tr in table.iterfind(W_TR):
+        row = []
+        for tc in tr.iterfind(W_TC):
+            grid_span = 1
+            vertical_continue = False
+            tc_pr = tc.find(W_TC_PR)
+            if tc_pr is not None:
+                span = tc_pr.find(W_GRID_SPAN)
+                if span is not None:
+                    grid_span = max(1, int(span.get(W_VAL, "1")))
+                v_merge = tc_pr.find(W_V_MERGE)
+                if v_merge is not None and v_merge.get(W_VAL, "continue") == "continue":
+                    vertical_continue = True
+            
+            cell_text = "" if vertical_continue else "\n".join(
+                _docx_paragraph_text(p) for p in tc.iterfind(W_P)
+            ).strip()
+            row.append(cell_text)
+            row.extend([""] * (grid_span - 1))
+        rows.append(row)
+    return rows
+
+def _iter_docx_body(file_path: str) -> Iterator[Tuple[str, Any]]:
+    """用iterparse单次遍历word/document.xml，按文档顺序产出 ("p", 段落文本) 或 ("tbl", 表格行)
+    
+    每个body顶层元素处理完后立即从树上移除，内存占用与文档长度无关。
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        with archive.open("word/document.xml") as xml_file:
+            body = None
+            depth = 0
+            body_depth = None
+            for event, element in ET.iterparse(xml_file, events=("start", "end")):
+                if event == "start":
+                    depth += 1
+                    if element.tag == W_BODY:
+                        body = element
+                        body_depth = depth
+                    continue
+                
+                depth -= 1
+                if body is None or depth != body_depth:
+                    continue
+                
+                # body的顶层子元素解析完毕
+                if element.tag == W_P:
+                    yield "p", _docx_paragraph_text(element)
+                elif element.tag == W_TBL:
+                    yield "tbl", _docx_table_rows(element)
+                element.clear()
+                body.remove(element)
+
+def _format_docx_table(rows: List[List[str]]) -> str:
+    """把表格行格式化为带表头的文本块，无内容时返回空字符串"""
+    table_content = []
+    table_content.append("=== 表格内容 ===")
+    
+    # 处理表格头部
+    headers = []
+    if rows:
+        headers = rows[0]
+        if any(headers):
+            table_content.append("表头: " + " | ".join(headers))
+    
+    # 处理表格数据行
+    for row_data in rows[1:]:
+        if any(row_data):
+            # 如果有表头，按列名组织数据
+            if headers and len(row_data) == len(headers):
+                formatted_row = []
+                for header, data in zip(headers, row_data):
+                    if data:
+                        formatted_row.append(f"{header}: {data}")
+                if formatted_row:
+                    table_content.append(" | ".join(formatted_row))
+            else:
+                table_content.append(" | ".join(row_data))
+    
+    if len(table_content) > 1:  # 有实际内容
+        return "\n".join(table_content)
+    return ""
+
+def extract_text_from_docx(file_path: str) -> str:
+    """从DOCX文件提取文本，包括表格内容（流式解析XML，线性时间）"""
+    try:
+        print(f"开始处理Word文档: {os.path.basename(file_path)}")
+        
+        all_content = []
+        paragraph_count = 0
+        table_count = 0
+        
+        # 按文档顺序处理段落和表格
+        for kind, content in _iter_docx_body(file_path):
+            if kind == "p":
+                if content.strip():
+                    all_content.append(content.strip())
+                    paragraph_count += 1
+            else:
+                table_text = _format_docx_table(content)
+                if table_text:
+                    all_content.append(table_text)
+                    table_count += 1
+        
+        final_text = "\n\n".join(all_content)
+        print(f"Word文档处理完成，提取文本长度: {len(final_text)}")
+        print(f"包含段落数: {paragraph_count}")
+        print(f"包含表格数: {table_count}")
+        
+        return final_text
+        
+    except Exception as e:
+        print(f"Word文档处理错误: {str(e)}")
+        # 回退到基础处理
+        try:
+            from docx import Document
+            doc = Document(file_path)
+            basic_text = '\n'.join([paragraph.text for paragraph in doc.paragraphs if paragraph.text.strip()])
+            return f"Word文档基础提取:\n{basic_text}"
+        except:
+            return f"DOCX解析错误: {str(e)}"
+
+def _format_datetimes(series: pd.Series) -> np.ndarray:
+    """日期列格式化为与str(Timestamp)一致的文本（astype(str)会省略零点时间）"""
+    values = series.to_numpy()
+    if values.dtype.kind == "M" and not (values.astype("datetime64[s]") != values).any():
+        # 无时区且没有亚秒部分时用numpy批量格式化，比逐个str()快一个数量级
+        formatted = np.datetime_as_string(values, unit="s")
+        return np.char.replace(formatted, "T", " ").astype(object)
+    return series.map(str).to_numpy(dtype=object)
+
+def serialize_rows(df: pd.DataFrame) -> List[str]:
+    """按列向量化生成每行的 "列名: 值 | 列名: 值" 文本，跳过空值；整行为空时对应位置为空字符串"""
+    rows = np.full(len(df), "", dtype=object)
+    for position, col in enumerate(df.columns):
+        series = df.iloc[:, position]
+        mask = series.notna().to_numpy()
+        if not mask.any():
+            continue
+        
+        if is_datetime64_any_dtype(series):
+            values = _format_datetimes(series[mask])
+        else:
+            values = series[mask].astype(str).to_numpy(dtype=object)
+        
+        cells = f"{col}: " + values
+        current = rows[mask]
+        separators = np.where(current != "", " | ", "")
+        rows[mask] = current + separators + cells
+    return rows.tolist()
+
+def _normalize_headers(raw_headers: Tuple[Any, ...]) -> List[str]:
+    """按pandas规则命名列：空列名为 "Unnamed: i"，重复列名追加 ".1"、".2" 后缀"""
+    headers = []
+    seen: Dict[str, int] = {}
+    for position, header in enumerate(raw_headers):
+        name = f"Unnamed: {position}" if header is None or header == "" else header
+        key = str(name)
+        if key in seen:
+            seen[key] += 1
+            name = f"{key}.{seen[key]}"
+        else:
+            seen[key] = 0
+        headers.append(name)
+    return headers
+
+def _format_sheet_text(sheet_name: str, headers: List[Any], row_lines: Iterator[str]) -> str:
+    """拼接单个工作表的文本：工作表名、列标题、非空数据行"""
+    sheet_text = [f"工作表: {sheet_name}"]
+    sheet_text.append("列标题: " + ", ".join(str(h) for h in headers))
+    sheet_text.extend(row_text for row_text in row_lines if row_text)
+    return "\n".join(sheet_text)
+
+def _stream_sheet_rows(rows: Iterator[Tuple[Any, ...]], headers: List[str],
+                       writer: Optional[TableWriter] = None) -> Iterator[str]:
+    """逐批消费openpyxl只读模式的行迭代器，每批转成DataFrame后向量化序列化（并写入列式存储）
+    
+    openpyxl把整数值的浮点单元格读成int，单独一批可能推断为整数列；前面批次已是浮点的列在后续批次中
+    仍按浮点处理，与整表解析时的输出（500.0而不是500）保持一致。
+    """
+    batch_size = EXCEL_CONFIG["STREAM_BATCH_ROWS"]
+    float_columns = set()
+    while True:
+        batch = [row for _, row in zip(range(batch_size), rows)]
+        if not batch:
+            break
+        df = pd.DataFrame.from_records(batch, columns=headers)
+        for position in range(df.shape[1]):
+            column = df.iloc[:, position]
+            if pd.api.types.is_float_dtype(column.dtype):
+                float_columns.add(position)
+            elif position in float_columns and pd.api.types.is_integer_dtype(column.dtype):
+                df.isetitem(position, column.astype("float64"))
+        if writer is not None:
+            writer.append(df)
+        yield from serialize_rows(df)
+
+def _get_streaming_worksheet(xl_file: pd.ExcelFile, sheet_name: str):
+    """行数达到阈值的xlsx工作表返回只读worksheet，否则返回None"""
+    if xl_file.engine != "openpyxl":
+        return None
+    worksheet = xl_file.book[sheet_name]
+    max_row = getattr(worksheet, "max_row", None)
+    if max_row is not None and max_row >= EXCEL_CONFIG["STREAM_MIN_ROWS"]:
+        return worksheet
+    return None
+
+def _extract_excel_sheets(file_path: str, sheet_names: List[str], table_dir: Optional[str] = None,
+                          first_index: int = 0) -> List[str]:
+    """打开一次工作簿，依次提取指定工作表的文本（也作为进程池工作函数）
+    
+    指定table_dir时同时把每个工作表写入列式存储，表格序号从first_index开始。
+    """
+    sheet_texts = []
+    with pd.ExcelFile(file_path) as xl_file:
+        for offset, sheet_name in enumerate(sheet_names):
+            writer = None
+            if table_dir:
+                writer = TableWriter(table_dir_for(table_dir, first_index + offset), str(sheet_name))
+            
+            worksheet = _get_streaming_worksheet(xl_file, sheet_name)
+            if worksheet is not None:
+                print(f"流式读取大工作表: {sheet_name}（约 {worksheet.max_row} 行）")
+                rows = worksheet.iter_rows(values_only=True)
+                headers = _normalize_headers(next(rows, ()))
+                sheet_texts.append(_format_sheet_text(sheet_name, headers, _stream_sheet_rows(rows, headers, writer)))
+            else:
+                df = xl_file.parse(sheet_name)
+                if writer is not None:
+                    writer.append(df)
+                sheet_texts.append(_format_sheet_text(sheet_name, df.columns.tolist(), serialize_rows(df)))
+            
+            if writer is not None:
+                writer.close()
+    return sheet_texts
+
+def _extract_excel_sheets_parallel(file_path: str, sheet_names: List[str], workers: int,
+                                   table_dir: Optional[str] = None) -> List[str]:
+    """把工作表分组到进程池中提取，每个进程只打开一次工作簿，按原顺序合并结果"""
+    sheet_ranges = _split_ranges(len(sheet_names), workers)
+    print(f"并行提取Excel: {len(sheet_names)} 个工作表, {len(sheet_ranges)} 个进程")
+    
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(_extract_excel_sheets, file_path, sheet_names[start:end], table_dir, start)
+            for start, end in sheet_ranges
+        ]
+        sheet_texts = []
+        for future in futures:
+            sheet_texts.extend(future.result())
+    return sheet_texts
+
+def extract_text_from_excel(file_path: str, table_dir: Optional[str] = None) -> str:
+    """从Excel文件提取文本，保留表格结构；指定table_dir时同时按工作表保存列式数据"""
+    try:
+        # 打开一次工作簿读取工作表列表
+        with pd.ExcelFile(file_path) as xl_file:
+            sheet_names = xl_file.sheet_names
+        
+        workers = EXCEL_CONFIG["PARALLEL_WORKERS"]
+        sheet_texts = None
+        if (workers > 1
+                and len(sheet_names) >= EXCEL_CONFIG["PARALLEL_MIN_SHEETS"]
+                and os.path.getsize(file_path) >= EXCEL_CONFIG["PARALLEL_MIN_BYTES"]):
+            try:
+                sheet_texts = _extract_excel_sheets_parallel(file_path, sheet_names, workers, table_dir)
+            except Exception as e:
+                print(f"并行提取失败，回退到顺序提取: {e}")
+        
+        if sheet_texts is None:
+            sheet_texts = _extract_excel_sheets(file_path, sheet_names, table_dir)
+        
+        final_text = "\n\n".join(sheet_texts)
+        print(f"Excel文件 {os.path.basename(file_path)} 提取文本长度: {len(final_text)}")
+        return final_text
+        
+    except Exception as e:
+        print(f"Excel处理错误 ({os.path.basename(file_path)}): {str(e)}")
+        raise Exception(f"Excel文件处理失败: {str(e)}")
+
+def _sniff_csv_format(file_path: str) -> Tuple[str, str]:
+    """只读取文件开头的一小段样本，一次性确定编码和分隔符"""
+    sample_size = CSV_CONFIG["SNIFF_BYTES"]
+    with open(file_path, 'rb') as f:
+        sample = f.read(sample_size)
+    
+    encoding, sample_text = 'latin-1', sample.decode('latin-1')
+    if sample.startswith(codecs.BOM_UTF8):
+        encoding, sample_text = 'utf-8-sig', sample[len(codecs.BOM_UTF8):].decode('utf-8', errors='ignore')
+    else:
+        for candidate in CSV_ENCODINGS:
+            try:
+                sample_text = sample.decode(candidate)
+                encoding = candidate
+                break
+            except UnicodeDecodeError as e:
+                # 样本末尾可能截断了一个多字节字符，忽略截断处
+                if len(sample) == sample_size and e.start >= sample_size - 4:
+                    try:
+                        sample_text = sample[:e.start].decode(candidate)
+                        encoding = candidate
+                        break
+                    except UnicodeDecodeError:
+                        pass
+                continue
+    
+    # 只用完整的行判断分隔符
+    complete_lines = sample_text[:sample_text.rfind('\n')] if '\n' in sample_text else sample_text
+    try:
+        delimiter = csv.Sniffer().sniff(complete_lines, delimiters=",\t;|").delimiter
+    except csv.Error:
+        delimiter = ','
+    return encoding, delimiter
+
+def _iter_csv_parts(file_path: str, max_rows: int, table_dir: Optional[str] = None) -> Iterator[Tuple[str, Any]]:
+    """按chunksize分块读取CSV，依次产出 ("header", 信息)、若干 ("rows", 行文本列表)、("summary", 统计)
+    
+    指定table_dir时，所有数据行（不受max_rows限制）都会追加写入列式存储。
+    """
+    encoding, delimiter = _sniff_csv_format(file_path)
+    print(f"检测到CSV编码: {encoding}, 分隔符: {delimiter!r}")
+    
+    reader = pd.read_csv(
+        file_path,
+        encoding=encoding,
+        sep=delimiter,
+        chunksize=CSV_CONFIG["CHUNK_ROWS"],
+        encoding_errors="replace"  # 样本之后出现的个别坏字节不应让整个文件失败
+    )
+    writer = TableWriter(table_dir_for(table_dir, 0), "CSV") if table_dir else None
+    header_sent = False
+    total_rows = 0
+    shown_rows = 0
+    complete = True
+    with reader:
+        for chunk in reader:
+            if not header_sent:
+                yield "header", {"encoding": encoding, "delimiter": delimiter, "headers": chunk.columns.tolist()}
+                header_sent = True
+            
+            total_rows += len(chunk)
+            if writer is not None:
+                writer.append(chunk)
+            if shown_rows < max_rows:
+                part = chunk.head(max_rows - shown_rows)
+                shown_rows += len(part)
+                yield "rows", [row_text for row_text in serialize_rows(part) if row_text]
+            elif writer is None and not CSV_CONFIG["COUNT_ALL_ROWS"]:
+                # 已达到行数上限且不需要精确统计总行数，提前结束读取
+                complete = False
+                break
+    
+    if not header_sent:
+        header_frame = pd.read_csv(file_path, encoding=encoding, sep=delimiter, nrows=0)
+        if writer is not None:
+            writer.append(header_frame)
+        yield "header", {"encoding": encoding, "delimiter": delimiter, "headers": header_frame.columns.tolist()}
+    
+    if writer is not None:
+        writer.close()
+    
+    yield "summary", {"total_rows": total_rows, "shown_rows": shown_rows, "complete": complete}
+
+def _format_csv_row_count(summary: Dict[str, Any]) -> str:
+    """行数说明：提前结束读取时只给出下限"""
+    if summary["complete"]:
+        return f"数据行数: {summary['total_rows']}"
+    return f"数据行数: 超过 {summary['total_rows']}"
+
+def _format_csv_remaining(summary: Dict[str, Any]) -> Optional[str]:
+    """未转为文本的剩余行说明"""
+    if not summary["complete"]:
+        return "... (还有更多数据未读取)"
+    if summary["total_rows"] > summary["shown_rows"]:
+        return f"... (还有 {summary['total_rows'] - summary['shown_rows']} 行数据)"
+    return None
+
+def iter_csv_blocks(file_path: str, max_rows: Optional[int] = None, table_dir: Optional[str] = None) -> Iterator[str]:
+    """流式产出CSV文本块：表头信息、每个数据块的行文本、最后的行数统计"""
+    max_rows = CSV_CONFIG["MAX_ROWS"] if max_rows is None else max_rows
+    
+    for kind, content in _iter_csv_parts(file_path, max_rows, table_dir):
+        if kind == "header":
+            yield "\n".join([
+                "=== CSV数据 ===",
+                f"数据列数: {len(content['headers'])}",
+                f"使用编码: {content['encoding']}",
+                "列名: " + ", ".join(str(h) for h in content["headers"]),
+            ])
+        elif kind == "rows":
+            if content:
+                yield "\n".join(content)
+        else:
+            summary_lines = [_format_csv_row_count(content)]
+            remaining = _format_csv_remaining(content)
+            if remaining:
+                summary_lines.append(remaining)
+            yield "\n".join(summary_lines)
+
+def extract_text_from_csv(file_path: str, max_rows: Optional[int] = None, table_dir: Optional[str] = None) -> str:
+    """从CSV文件提取文本，保留表格结构；分块读取，最多保留max_rows行（默认取配置）
+    
+    指定table_dir时同时把全部数据行保存为列式数据。
+    """
+    try:
+        print(f"开始处理CSV文件: {os.path.basename(file_path)}")
+        max_rows = CSV_CONFIG["MAX_ROWS"] if max_rows is None else max_rows
+        
+        header = None
+        row_lines: List[str] = []
+        summary = None
+        for kind, content in _iter_csv_parts(file_path, max_rows, table_dir):
+            if kind == "header":
+                header = content
+            elif kind == "rows":
+                row_lines.extend(content)
+            else:
+                summary = content
+        
+        # 构建结构化文本
+        csv_content = []
+        csv_content.append("=== CSV数据 ===")
+        
+        # 添加基本信息
+        csv_content.append(_format_csv_row_count(summary))
+        csv_content.append(f"数据列数: {len(header['headers'])}")
+        csv_content.append(f"使用编码: {header['encoding']}")
+        
+        # 添加列名
+        csv_content.append("列名: " + ", ".join(str(h) for h in header["headers"]))
+        
+        # 添加数据行（限制显示行数以避免过长）
+        csv_content.append(f"\n数据内容（前{summary['shown_rows']}行）:")
+        csv_content.extend(row_lines)
+        
+        remaining = _format_csv_remaining(summary)
+        if remaining:
+            csv_content.append(remaining)
+        
+        final_text = "\n".join(csv_content)
+        print(f"CSV文件处理完成，提取文本长度: {len(final_text)}")
+        
+        return final_text
+        
+    except Exception as e:
+        print(f"CSV处理错误: {str(e)}")
+        # 回退到基础文本处理
+        try:
+            for encoding in ['utf-8', 'gbk', 'gb2312', 'latin-1']:
+                try:
+                    with open(file_path, 'r', encoding=encoding) as f:
+                        content = f.read()
+                    return f"CSV基础文本提取（编码: {encoding}）:\n{content}"
+                except:
+                    continue
+            raise Exception("所有编码尝试失败")
+        except:
+            return f"CSV解析错误: {str(e)}"
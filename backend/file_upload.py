@@ -0,0 +1,106 @@
+"""上传文件流式落盘工具"""
+import json
+import os
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+
+
+class UploadTooLargeError(Exception):
+    """上传文件超过大小限制"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        super().__init__(f"文件大小超过限制（最大 {max_size // (1024 * 1024)}MB）")
+
+
+async def save_upload_file(upload: UploadFile, dest_path: str, max_size: int, chunk_size: int) -> int:
+    """按固定大小分块把上传内容写入磁盘，边写边检查大小，返回写入的字节数"""
+    # 客户端已声明文件大小时直接提前拒绝
+    if upload.size is not None and upload.size > max_size:
+        raise UploadTooLargeError(max_size)
+
+    written = 0
+    try:
+        with open(dest_path, "wb") as f:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > max_size:
+                    raise UploadTooLargeError(max_size)
+                await run_in_threadpool(f.write, chunk)
+    except BaseException:
+        # 写入失败或超限时删除不完整的文件
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        raise
+
+    return written
+
+
+class UploadSizeLimitMiddleware:
+    """ASGI中间件：上传请求体超过max_body_size时返回413
+
+    声明了Content-Length的请求在解析表单之前直接拒绝；分块传输（没有Content-Length）的请求
+    在请求体到达时累计字节数，越过上限立即中止解析，不会先把整个请求体缓存到磁盘。
+    需要注册在CORSMiddleware之内，413响应才会带上CORS头，浏览器能读到错误信息。
+    """
+
+    def __init__(self, app, path_prefix: str, max_body_size: int, max_file_size: int):
+        self.app = app
+        self.path_prefix = path_prefix
+        self.max_body_size = max_body_size
+        self.max_file_size = max_file_size
+
+    async def _reject(self, send):
+        body = json.dumps({"success": False, "message": str(UploadTooLargeError(self.max_file_size))},
+                          ensure_ascii=False).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = Headers(scope=scope).get("content-length", "")
+        if content_length.isdigit() and int(content_length) > self.max_body_size:
+            await self._reject(send)
+            return
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    exceeded = True
+                    raise UploadTooLargeError(self.max_file_size)
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            # 超限后丢弃应用自己的错误响应（表单解析失败的400等），统一返回413
+            if exceeded:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except UploadTooLargeError:
+            if not exceeded:
+                raise
+        if exceeded and not response_started:
+            await self._reject(send)
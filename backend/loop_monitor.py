@@ -0,0 +1,63 @@
+"""事件循环延迟监控"""
+import asyncio
+import time
+from collections import deque
+from typing import Dict, Optional
+from config import MONITOR_CONFIG
+
+
+class EventLoopLagMonitor:
+    """周期性睡眠固定间隔，用实际唤醒时间与期望时间之差衡量事件循环延迟"""
+
+    def __init__(self, interval: float = 0.1, window: int = 600):
+        self.interval = interval
+        self.samples = deque(maxlen=window)  # (采样时间, 延迟秒数)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """启动后台采样任务"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """停止后台采样任务"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - expected)
+            self.samples.append((time.time(), lag))
+
+    def max_lag_since(self, since: float) -> float:
+        """返回指定时间点之后观测到的最大延迟（毫秒）"""
+        lags = [lag for ts, lag in self.samples if ts >= since]
+        return round(max(lags) * 1000, 2) if lags else 0.0
+
+    def snapshot(self) -> Dict[str, float]:
+        """返回当前窗口内的延迟统计（毫秒）"""
+        if not self.samples:
+            return {"samples": 0, "current_ms": 0.0, "avg_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+
+        lags = sorted(lag for _, lag in self.samples)
+        p99_index = min(len(lags) - 1, int(len(lags) * 0.99))
+        return {
+            "samples": len(lags),
+            "current_ms": round(self.samples[-1][1] * 1000, 2),
+            "avg_ms": round(sum(lags) / len(lags) * 1000, 2),
+            "p99_ms": round(lags[p99_index] * 1000, 2),
+            "max_ms": round(lags[-1] * 1000, 2),
+        }
+
+
+loop_lag_monitor = EventLoopLagMonitor(
+    interval=MONITOR_CONFIG["LOOP_LAG_INTERVAL"],
+    window=MONITOR_CONFIG["LOOP_LAG_WINDOW"],
+)
@@ -0,0 +1,151 @@
+"""扫描页OCR模块 - 使用本地安装的Tesseract识别没有文本层的PDF页面"""
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from config import OCR_CONFIG
+
+# OCR依赖（需要系统安装 tesseract 以及 chi_sim 语言包）
+try:
+    import pytesseract
+    from PIL import Image
+    OCR_AVAILABLE = True
+except ImportError:
+    print("警告：pytesseract或Pillow未安装，扫描页OCR功能将不可用")
+    OCR_AVAILABLE = False
+
+_tesseract_ready: Optional[bool] = None
+
+
+def is_ocr_enabled() -> bool:
+    """检查OCR是否启用且本地Tesseract可用"""
+    global _tesseract_ready
+
+    if not OCR_CONFIG["ENABLED"] or not OCR_AVAILABLE:
+        return False
+
+    if _tesseract_ready is None:
+        try:
+            version = pytesseract.get_tesseract_version()
+            print(f"检测到Tesseract版本: {version}")
+            _tesseract_ready = True
+        except Exception as e:
+            print(f"Tesseract不可用，跳过OCR: {e}")
+            _tesseract_ready = False
+    return _tesseract_ready
+
+
+def ocr_page_batch(file_path: str, page_numbers: List[int], dpi: int, lang: str) -> List[Tuple[int, str]]:
+    """进程池工作函数：打开PDF，按指定DPI渲染一批页面并识别文字，返回 (页码索引, 文本)"""
+    import fitz  # PyMuPDF
+
+    results = []
+    doc = fitz.open(file_path)
+    try:
+        for page_num in page_numbers:
+            try:
+                # 灰度渲染即可满足识别需要，数据量只有RGB的三分之一
+                pix = doc[page_num].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+                image = Image.frombytes("L", (pix.width, pix.height), pix.samples)
+                text = pytesseract.image_to_string(image, lang=lang)
+                results.append((page_num, text.strip()))
+            except Exception as e:
+                print(f"第 {page_num + 1} 页OCR失败: {e}")
+                results.append((page_num, ""))
+    finally:
+        doc.close()
+    return results
+
+
+def ocr_pdf_pages(file_path: str, page_numbers: List[int]) -> Tuple[Dict[int, str], Dict[str, Any]]:
+    """对文本层为空的页面做OCR，按批次分发到进程池，返回 ({页码索引: 文本}, 统计)"""
+    budget = OCR_CONFIG["MAX_PAGES_PER_DOC"]
+    selected = page_numbers[:budget]
+    stats: Dict[str, Any] = {
+        "ocr_candidates": len(page_numbers),
+        "ocr_pages": len(selected),
+        "ocr_skipped_by_budget": len(page_numbers) - len(selected),
+        "ocr_time": 0.0,
+    }
+    if not selected:
+        return {}, stats
+
+    start = time.perf_counter()
+    dpi, lang = OCR_CONFIG["DPI"], OCR_CONFIG["LANG"]
+    batch_size = OCR_CONFIG["BATCH_SIZE"]
+    batches = [selected[i:i + batch_size] for i in range(0, len(selected), batch_size)]
+    workers = min(OCR_CONFIG["WORKERS"], len(batches))
+    print(f"开始OCR: {len(selected)} 页, {len(batches)} 批, {workers} 个进程, DPI {dpi}")
+
+    page_texts: Dict[int, str] = {}
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(ocr_page_batch, file_path, batch, dpi, lang) for batch in batches]
+            for future in futures:
+                page_texts.update(future.result())
+    else:
+        for batch in batches:
+            page_texts.update(ocr_page_batch(file_path, batch, dpi, lang))
+
+    stats["ocr_time"] = round(time.perf_counter() - start, 3)
+    stats["ocr_pages_with_text"] = sum(1 for text in page_texts.values() if text)
+    print(f"OCR完成，耗时: {stats['ocr_time']}秒")
+    return page_texts, stats
+
+
+class StreamingOcr:
+    """流式逐页提取时的OCR：扫描页攒满一批后提交到进程池，不等识别完成就继续提取后面的页面
+
+    批大小、进程数和每文档页数预算与ocr_pdf_pages相同；只有一个进程时在提交时就地识别。
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.budget = OCR_CONFIG["MAX_PAGES_PER_DOC"]
+        self.batch_size = OCR_CONFIG["BATCH_SIZE"]
+        self.workers = OCR_CONFIG["WORKERS"]
+        self.skipped_by_budget = 0
+        self._batch: List[int] = []
+        self._futures: Dict[int, Future] = {}
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def add(self, page_num: int) -> bool:
+        """登记一个扫描页，返回是否会识别（超出预算的页面跳过）"""
+        if self.budget <= 0:
+            self.skipped_by_budget += 1
+            return False
+        self.budget -= 1
+        self._batch.append(page_num)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+        return True
+
+    def flush(self):
+        """提交未满的一批"""
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+        if self.workers > 1:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            future = self._pool.submit(ocr_page_batch, self.file_path, batch, OCR_CONFIG["DPI"], OCR_CONFIG["LANG"])
+        else:
+            future = Future()
+            future.set_result(ocr_page_batch(self.file_path, batch, OCR_CONFIG["DPI"], OCR_CONFIG["LANG"]))
+        for page_num in batch:
+            self._futures[page_num] = future
+
+    def done(self, page_num: int) -> bool:
+        future = self._futures.get(page_num)
+        return future is not None and future.done()
+
+    def result(self, page_num: int) -> str:
+        """等待并返回一页的识别文本（所在的批尚未提交时先提交）"""
+        if page_num not in self._futures:
+            self.flush()
+        return dict(self._futures.pop(page_num).result())[page_num]
+
+    def close(self):
+        """关闭进程池，取消尚未开始的批（提前关闭的生成器不再等待）"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,251 @@
+"""快照持久化 - 稠密索引、文档存储和检索结构写入磁盘，服务重启或重新部署后直接加载
+
+快照目录：
+  vectors-<序号>.index  稠密索引（faiss.write_index）
+  state.pkl             头部（格式版本、时间、索引文件名、向量ID分配状态、检索配置、文档数和向量数）
+                        + 文档存储、向量ID映射、向量化统计、稀疏/BM25索引
+写入顺序：先写新的索引文件，再通过临时文件+os.replace替换state.pkl（替换即提交），最后删除不再引用的旧索引文件。
+任何一步中断，state.pkl仍指向一份完整的旧快照。
+
+复制索引、序列化和写盘都在线程中进行，不阻塞事件循环。事件循环中修改状态的代码块前后各把状态版本加1
+（奇数表示正在修改）：线程开始时读到偶数版本，序列化完成后版本不变，说明期间没有任何修改，快照才提交；
+否则丢弃本次快照（SnapshotConflict），等变更平息后重试。索引副本与向量ID分配状态（墓碑）在索引管理器的锁内
+一起取得，不会与后台压缩交错。
+"""
+import asyncio
+import gc
+import os
+import pickle
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+import faiss
+
+SNAPSHOT_FORMAT = 4
+STATE_FILE = "state.pkl"
+INDEX_PREFIX = "vectors-"
+
+
+class SnapshotConflict(Exception):
+    """序列化期间状态被修改，本次快照作废"""
+
+
+class LockedStateMixin:
+    """带self._lock的对象的序列化：锁不能序列化，在锁内复制属性后去掉锁，加载后重建锁
+
+    会被其他线程在锁内原地修改的属性，子类在_copy_locked_state中复制一份，快照线程不会读到修改到一半的数据。
+    """
+
+    def _copy_locked_state(self, state: dict) -> dict:
+        return state
+
+    def __getstate__(self):
+        with self._lock:
+            state = self._copy_locked_state(self.__dict__.copy())
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+def _write_index(path: str, index: faiss.Index) -> None:
+    """faiss.write_index写入临时文件并fsync，再原子替换目标文件"""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    faiss.write_index(index, temp_path)
+    with open(temp_path, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+class SnapshotStore:
+    """快照目录的读写"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._write_lock = threading.Lock()
+        self.last_save: Optional[dict] = None
+        self.last_load: Optional[dict] = None
+
+    @property
+    def state_path(self) -> str:
+        return os.path.join(self.directory, STATE_FILE)
+
+    def save(self, index_manager, state: Callable[[], dict], metadata: Callable[[], dict],
+             version: Callable[[], int]) -> dict:
+        """复制索引、序列化状态并写盘（在线程中调用）
+
+        state、metadata在版本检查的区间内取值；期间状态版本变化时删除已写的文件，抛出SnapshotConflict。
+        """
+        started = time.perf_counter()
+        with self._write_lock:
+            start_version = version()
+            if start_version % 2:
+                raise SnapshotConflict("状态正在修改")
+            os.makedirs(self.directory, exist_ok=True)
+            new_index_path = None
+            temp_path = f"{self.state_path}.{os.getpid()}.tmp"
+            try:
+                index, index_state, index_path = index_manager.snapshot_copy()
+                if index is not None:
+                    new_index_path = os.path.join(self.directory, f"{INDEX_PREFIX}{time.time_ns()}.index")
+                    _write_index(new_index_path, index)
+                    index_path = new_index_path
+                    del index
+                index_file = os.path.basename(index_path)
+
+                header = {
+                    "format": SNAPSHOT_FORMAT,
+                    "created_at": time.time(),
+                    "index_file": index_file,
+                    "index_state": index_state,
+                    **metadata()
+                }
+                # 直接序列化到文件，不在内存中生成完整的字节串；序列化时分配大量临时对象会触发分代GC，
+                # 整个堆的回收持有GIL，事件循环线程随之停顿，序列化期间暂停GC
+                gc_enabled = gc.isenabled()
+                gc.disable()
+                try:
+                    with open(temp_path, "wb") as f:
+                        pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+                        pickle.dump(state(), f, protocol=pickle.HIGHEST_PROTOCOL)
+                        f.flush()
+                        os.fsync(f.fileno())
+                        state_bytes = f.tell()
+                finally:
+                    if gc_enabled:
+                        gc.enable()
+            except Exception as e:
+                self._discard(temp_path, new_index_path)
+                if version() != start_version:
+                    # 序列化时遍历的字典被修改等错误，同样按冲突处理
+                    raise SnapshotConflict(f"序列化期间状态被修改: {str(e)}") from e
+                raise
+            if version() != start_version:
+                self._discard(temp_path, new_index_path)
+                raise SnapshotConflict("序列化期间状态被修改")
+            os.replace(temp_path, self.state_path)
+
+            for name in os.listdir(self.directory):
+                if name.startswith(INDEX_PREFIX) and name != index_file:
+                    os.remove(os.path.join(self.directory, name))
+
+        self.last_save = {
+            "time": time.time(),
+            "seconds": round(time.perf_counter() - started, 3),
+            "index_file": index_file,
+            "counts": header.get("counts"),
+            "bytes": os.path.getsize(os.path.join(self.directory, index_file)) + state_bytes
+        }
+        return self.last_save
+
+    @staticmethod
+    def _discard(temp_path: str, index_path: Optional[str]):
+        """删除作废快照已写入的文件"""
+        for path in (temp_path, index_path):
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+
+    def load(self) -> Optional[Tuple[str, dict, dict]]:
+        """读取最近一次快照，返回 (索引文件路径, 头部, 状态)；没有快照或格式不符时返回None"""
+        if not os.path.exists(self.state_path):
+            return None
+        with open(self.state_path, "rb") as f:
+            header = pickle.load(f)
+            if header.get("format") != SNAPSHOT_FORMAT:
+                print(f"快照格式版本 {header.get('format')} 与当前版本 {SNAPSHOT_FORMAT} 不一致，忽略快照")
+                return None
+            state = pickle.load(f)
+        return os.path.join(self.directory, header["index_file"]), header, state
+
+    def stats(self) -> dict:
+        return {
+            "directory": self.directory,
+            "last_save": self.last_save,
+            "last_load": self.last_load
+        }
+
+
+class SnapshotScheduler:
+    """快照调度
+
+    change模式：变更后等待debounce秒（合并连续的变更，如流式上传的逐块入库）再保存，两次保存至少间隔min_interval秒；
+    interval模式：每隔interval秒检查一次，有变更才保存。两种模式在停止时都会保存最后一次变更。
+    save在线程中执行；序列化期间状态被修改时本次作废，等下一次变更平息后重试。
+    """
+
+    def __init__(self, save: Callable[[], dict], mode: str = "change", interval: float = 30.0,
+                 debounce: float = 1.0, min_interval: float = 0.0):
+        if mode not in ("change", "interval"):
+            raise ValueError(f"不支持的快照模式: {mode}。可选：change, interval")
+        self.save = save
+        self.mode = mode
+        self.interval = interval
+        self.debounce = debounce
+        self.min_interval = min_interval
+        self.conflicts = 0
+        self._dirty = False
+        self._last_started = float("-inf")
+        self._changed: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def mark_dirty(self):
+        """记录一次变更（在事件循环中调用）"""
+        self._dirty = True
+        if self._changed is not None:
+            self._changed.set()
+
+    def start(self):
+        """启动后台保存任务；启动前已有变更（如加载快照时重建了检索索引）时随即保存"""
+        if self._task is None or self._task.done():
+            self._changed = asyncio.Event()
+            if self._dirty:
+                self._changed.set()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self, attempts: int = 3):
+        """停止后台任务，并保存尚未写入的变更"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for _ in range(attempts):
+            await self.save_if_dirty()
+            if not self._dirty:
+                break
+
+    async def save_if_dirty(self):
+        if not self._dirty:
+            return
+        self._dirty = False
+        self._last_started = time.monotonic()
+        try:
+            result = await asyncio.to_thread(self.save)
+            print(f"快照已保存: {result['counts']}，耗时 {result['seconds']}秒")
+        except SnapshotConflict as e:
+            # 修改状态的代码块结束时会再次mark_dirty，change模式下随后重试
+            self._dirty = True
+            self.conflicts += 1
+            print(f"快照作废，稍后重试: {str(e)}")
+        except Exception as e:
+            # 下次继续尝试
+            self._dirty = True
+            print(f"快照保存失败: {str(e)}")
+
+    async def _run(self):
+        while True:
+            if self.mode == "change":
+                await self._changed.wait()
+                await asyncio.sleep(self.debounce)
+                self._changed.clear()
+                wait = self._last_started + self.min_interval - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            else:
+                await asyncio.sleep(self.interval)
+            await self.save_if_dirty()
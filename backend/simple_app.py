@@ -9,6 +9,8 @@ import uvicorn
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+from config import FILE_CONFIG
+from file_upload import save_upload_file, UploadTooLargeError
 
 # 创建FastAPI应用
 app = FastAPI(title="简化财务分析API", version="1.0.0")
@@ -89,12 +91,30 @@ async def upload_file(file: UploadFile = File(...)):
             print(f"返回结果: {result}")
             return result
         
-        # 读取文件内容
+        # 创建临时文件（路径唯一）
+        with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix=file_ext) as tmp_file:
+            temp_path = tmp_file.name
+            print(f"临时文件路径: {temp_path}")
+        
+        # 分块流式写入文件内容
         print("开始读取文件内容...")
-        content = await file.read()
-        print(f"文件大小: {len(content)} 字节")
+        try:
+            file_size = await save_upload_file(
+                file,
+                temp_path,
+                max_size=FILE_CONFIG["MAX_FILE_SIZE"],
+                chunk_size=FILE_CONFIG["UPLOAD_CHUNK_SIZE"]
+            )
+        except UploadTooLargeError as size_error:
+            result = {
+                "success": False,
+                "message": str(size_error)
+            }
+            print(f"返回结果: {result}")
+            return result
+        print(f"文件大小: {file_size} 字节")
         
-        if len(content) == 0:
+        if file_size == 0:
             result = {
                 "success": False,
                 "message": "上传的文件为空"
@@ -102,12 +122,6 @@ async def upload_file(file: UploadFile = File(...)):
             print(f"返回结果: {result}")
             return result
         
-        # 创建临时文件
-        with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix=file_ext) as tmp_file:
-            tmp_file.write(content)
-            temp_path = tmp_file.name
-            print(f"临时文件路径: {temp_path}")
-        
         # 读取文本内容
         text = ""
         for encoding in ['utf-8', 'gbk', 'gb2312']:
@@ -0,0 +1,155 @@
+"""稀疏向量检索 - 文本块向量保存在按特征列存储的CSC稀疏矩阵中，查询时用稀疏点积计算余弦相似度
+
+CSC矩阵每一列就是一个特征（哈希后的词）的倒排列表，查询只取出问题中出现的那几列做点积，
+耗时与这些列的非零元素数量成正比，而不是与全部文本块成正比。
+向量在入库前已做L2归一化，点积即余弦相似度。行号就是入库时传入的FAISS向量ID，共用同一份向量ID到文本块的映射；
+没有加入稀疏索引的向量ID对应全零行，不会命中。
+删除文档时先记录被删除的行号，查询时把这些行的得分置0；行号不复用，与向量ID保持一致。
+已删除的行数越过阈值（至少compact_min_tombstones行，或占行号空间的compact_tombstone_ratio）时压缩：
+从矩阵中去掉这些行的非零元素，行号不变。
+"""
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from bm25_index import check_new_ids
+from persistence import LockedStateMixin
+
+
+class SparseChunkIndex(LockedStateMixin):
+    """稀疏矩阵索引：add按批追加行，search返回相似度最高的k行"""
+
+    def __init__(self, n_features: int, compact_min_tombstones: int = 1000, compact_tombstone_ratio: float = 0.2):
+        self.n_features = n_features
+        self.compact_min_tombstones = compact_min_tombstones
+        self.compact_tombstone_ratio = compact_tombstone_ratio
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self._matrix = sparse.csc_matrix((0, self.n_features), dtype=np.float32)
+        self._pending: List[sparse.csr_matrix] = []
+        self._pending_rows = 0
+        self._deleted = np.zeros(0, dtype=np.int64)  # 已删除、尚未压缩的行号（有序）
+        self.compactions = 0
+
+    def _copy_locked_state(self, state: dict) -> dict:
+        # 待追加的行原样保存（不在快照时合并整个矩阵），加载后第一次查询时合并
+        state["_pending"] = list(self._pending)
+        return state
+
+    @property
+    def ntotal(self) -> int:
+        return self._matrix.shape[0] + self._pending_rows
+
+    @property
+    def nbytes(self) -> int:
+        matrix = self._matrix
+        return matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+
+    def add(self, vectors: sparse.csr_matrix, ids: Optional[List[int]] = None) -> List[int]:
+        """追加一批行向量，返回对应的行号；合并推迟到下一次查询，连续上传时不会反复复制整个矩阵
+
+        ids为这些行的FAISS向量ID（递增且不小于ntotal），行号即ID，跳过的ID补全零行；不传时依次分配。
+        """
+        with self._lock:
+            start_id = self.ntotal
+            count = vectors.shape[0]
+            row_ids = check_new_ids(ids, count, start_id)
+            if count:
+                rows = int(row_ids[-1]) + 1 - start_id
+                if rows != count:
+                    # 把第i行放到 row_ids[i] - start_id 行，其余为全零行
+                    placement = sparse.csr_matrix(
+                        (np.ones(count, dtype=vectors.dtype), (row_ids - start_id, np.arange(count))),
+                        shape=(rows, count)
+                    )
+                    vectors = (placement @ vectors).tocsr()
+                self._pending.append(vectors)
+                self._pending_rows += rows
+            return row_ids.tolist()
+
+    def pad(self, ntotal: int) -> None:
+        """把行号空间补齐到ntotal（补全零行，不会命中）"""
+        with self._lock:
+            rows = ntotal - self.ntotal
+            if rows > 0:
+                self._pending.append(sparse.csr_matrix((rows, self.n_features), dtype=np.float32))
+                self._pending_rows += rows
+
+    def remove(self, ids: List[int]) -> Tuple[np.ndarray, int]:
+        """删除行（查询时不再返回），行号不复用
+        
+        返回被删除行在各特征上的非零元素个数和其中的非空行数，供向量化后端扣减文档频率；
+        已删除的行数越过阈值时随即压缩矩阵。
+        """
+        with self._lock:
+            ids = np.asarray(ids, dtype=np.int64)
+            ids = np.setdiff1d(ids[(ids >= 0) & (ids < self.ntotal)], self._deleted)
+            if not len(ids):
+                return np.zeros(self.n_features, dtype=np.int64), 0
+            matrix = self._merge_pending()
+            removed = np.zeros(matrix.shape[0], dtype=bool)
+            removed[ids] = True
+            hit = removed[matrix.indices]
+            hits_before = np.r_[0, np.cumsum(hit)]
+            feature_counts = hits_before[matrix.indptr[1:]] - hits_before[matrix.indptr[:-1]]
+            rows = len(np.unique(matrix.indices[hit]))
+            self._deleted = np.union1d(self._deleted, ids)
+            if self._compaction_due():
+                self._compact()
+            return feature_counts, rows
+
+    def _compaction_due(self) -> bool:
+        deleted = len(self._deleted)
+        return deleted > 0 and (
+            deleted >= self.compact_min_tombstones
+            or deleted >= self.compact_tombstone_ratio * self.ntotal
+        )
+
+    def _compact(self):
+        """去掉已删除行的非零元素（调用方持有锁，待追加的行已合并）"""
+        started = time.perf_counter()
+        matrix = self._matrix
+        deleted = np.zeros(matrix.shape[0], dtype=bool)
+        deleted[self._deleted] = True
+        keep = ~deleted[matrix.indices]
+        kept_before = np.r_[0, np.cumsum(keep)]
+        self._matrix = sparse.csc_matrix(
+            (matrix.data[keep], matrix.indices[keep], kept_before[matrix.indptr]),
+            shape=matrix.shape
+        )
+        removed = len(self._deleted)
+        self._deleted = np.zeros(0, dtype=np.int64)
+        self.compactions += 1
+        print(f"稀疏索引已压缩，移除 {removed} 个已删除行，耗时 {time.perf_counter() - started:.3f}秒")
+
+    def _merge_pending(self) -> sparse.csc_matrix:
+        """把待追加的行合并进矩阵（调用方持有锁）"""
+        if self._pending:
+            self._matrix = sparse.vstack([self._matrix] + self._pending, format="csc")
+            self._pending = []
+            self._pending_rows = 0
+        return self._matrix
+
+    def search(self, query: sparse.csr_matrix, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """返回 (相似度, 行号)，按相似度降序；只返回相似度大于0的行"""
+        with self._lock:
+            # 矩阵和删除记录一起取得，压缩替换两者时不会错配
+            matrix = self._merge_pending()
+            deleted = self._deleted
+        if matrix.shape[0] == 0 or query.nnz == 0 or k <= 0:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+
+        # 只取问题中出现的特征列做稀疏点积
+        scores = np.asarray(matrix[:, query.indices] @ query.data).ravel()
+        scores[deleted] = 0
+        k = min(k, scores.shape[0])
+        # argpartition选出前k个（O(n)），只对这k个排序
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        top = top[scores[top] > 0]
+        return scores[top], top
@@ -0,0 +1,272 @@
+"""列式表格存储 - 把Excel/CSV解析出的DataFrame按列保存为可内存映射的NumPy文件
+
+每个表格一个目录：
+    meta.json            表名、行数、列定义
+    col_{i}.f8           数值列（float64，空值为NaN）
+    col_{i}.i8           日期列（int64纳秒，空值为NaT）
+    col_{i}.utf8         文本列的UTF-8字节串拼接
+    col_{i}.offsets      文本列每行的起始偏移（int64，长度为行数+1）
+    col_{i}.valid        文本列的非空标记（uint8）
+
+列类型由第一批数据决定；后续批次中出现无法转换为数值或日期的非空值时，该列改为文本列，已写入的行按文本重写。
+所有数据文件都是追加写入的原始数组，读取时用np.memmap按需映射，不会把整表读入内存；
+文本列返回StringColumn惰性视图，只解码实际访问的行。
+"""
+import json
+import operator
+import os
+import shutil
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_bool_dtype, is_datetime64_any_dtype, is_numeric_dtype
+
+NAT_INT64 = np.iinfo(np.int64).min
+
+
+class TableWriter:
+    """按批追加DataFrame并写成列式文件，列类型由第一批数据决定，后续批次出现无法转换的非空值时改为文本列"""
+
+    def __init__(self, table_dir: str, name: str):
+        self.table_dir = table_dir
+        self.name = name
+        self.rows = 0
+        self.columns: Optional[List[Dict[str, Any]]] = None
+        self._string_offsets: List[int] = []
+        os.makedirs(table_dir, exist_ok=True)
+
+    def _column_path(self, position: int, suffix: str) -> str:
+        return os.path.join(self.table_dir, f"col_{position}.{suffix}")
+
+    @staticmethod
+    def _column_kind(series: pd.Series) -> str:
+        if is_bool_dtype(series) or is_numeric_dtype(series):
+            return "numeric"
+        if is_datetime64_any_dtype(series):
+            return "datetime"
+        return "string"
+
+    def append(self, df: pd.DataFrame):
+        """追加一批行；数值/日期列中有非空值无法转换时，该列改为文本列，不把这些值当作空值丢掉"""
+        if self.columns is None:
+            self.columns = [
+                {"name": str(name), "kind": self._column_kind(df.iloc[:, position])}
+                for position, name in enumerate(df.columns)
+            ]
+            self._string_offsets = [0] * len(self.columns)
+
+        for position, column in enumerate(self.columns):
+            series = df.iloc[:, position]
+            if column["kind"] == "numeric":
+                values = pd.to_numeric(series, errors="coerce")
+                if not self._coercion_lost_values(series, values):
+                    self._append_array(position, "f8", values.to_numpy(dtype=np.float64, na_value=np.nan))
+                    continue
+                self._promote_to_string(position)
+            elif column["kind"] == "datetime":
+                values = pd.to_datetime(series, errors="coerce")
+                if not self._coercion_lost_values(series, values):
+                    if getattr(values.dt, "tz", None) is not None:
+                        values = values.dt.tz_convert("UTC").dt.tz_localize(None)
+                    self._append_array(position, "i8", values.to_numpy(dtype="datetime64[ns]").view(np.int64))
+                    continue
+                self._promote_to_string(position)
+            self._append_strings(position, series)
+        self.rows += len(df)
+
+    @staticmethod
+    def _coercion_lost_values(series: pd.Series, values: pd.Series) -> bool:
+        """转换后是否有非空值变成了空值"""
+        return bool((series.notna() & values.isna()).any())
+
+    def _promote_to_string(self, position: int):
+        """把已写入的数值/日期列按文本重写为文本列（整数值不带小数点，空值仍为空）"""
+        column = self.columns[position]
+        if column["kind"] == "numeric":
+            path = self._column_path(position, "f8")
+            values = np.fromfile(path, dtype=np.float64) if os.path.exists(path) else np.zeros(0)
+            texts = [None if np.isnan(value) else str(int(value)) if value.is_integer() else str(value)
+                     for value in values.tolist()]
+        else:
+            path = self._column_path(position, "i8")
+            values = np.fromfile(path, dtype=np.int64) if os.path.exists(path) else np.zeros(0, dtype=np.int64)
+            texts = [None if value == NAT_INT64 else str(pd.Timestamp(value)) for value in values.tolist()]
+        kind_label = "数值" if column["kind"] == "numeric" else "日期"
+        print(f"表格 {self.name} 的列 {column['name']} 出现无法转换为{kind_label}的值，改为文本列（已写入 {len(texts)} 行）")
+        if os.path.exists(path):
+            os.remove(path)
+        column["kind"] = "string"
+        self._append_strings(position, pd.Series(texts, dtype=object))
+
+    def _append_array(self, position: int, suffix: str, values: np.ndarray):
+        with open(self._column_path(position, suffix), "ab") as f:
+            f.write(np.ascontiguousarray(values).tobytes())
+
+    def _append_strings(self, position: int, series: pd.Series):
+        valid = series.notna().to_numpy()
+        encoded = [str(value).encode("utf-8") if is_valid else b"" for value, is_valid in zip(series.tolist(), valid)]
+        lengths = np.fromiter((len(item) for item in encoded), dtype=np.int64, count=len(encoded))
+        offsets = self._string_offsets[position] + np.cumsum(lengths)
+
+        offsets_path = self._column_path(position, "offsets")
+        if not os.path.exists(offsets_path):
+            self._append_array(position, "offsets", np.zeros(1, dtype=np.int64))
+        self._append_array(position, "offsets", offsets)
+        self._append_array(position, "valid", valid.astype(np.uint8))
+        with open(self._column_path(position, "utf8"), "ab") as f:
+            f.write(b"".join(encoded))
+        if len(offsets):
+            self._string_offsets[position] = int(offsets[-1])
+
+    def close(self) -> Dict[str, Any]:
+        """写入meta.json并返回表格元数据"""
+        meta = {
+            "name": self.name,
+            "rows": self.rows,
+            "columns": self.columns or [],
+        }
+        with open(os.path.join(self.table_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        return {**meta, "path": self.table_dir}
+
+
+class StringColumn:
+    """文本列的惰性视图：按行访问时才从内存映射的字节串中解码，连续切片不复制数据"""
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray, valid: np.ndarray, start: int = 0,
+                 stop: Optional[int] = None):
+        self._data = data
+        self._offsets = offsets
+        self._valid = valid
+        self.start = start
+        self.stop = len(valid) if stop is None else stop
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    def __getitem__(self, key: Union[int, slice]) -> Union[Optional[str], "StringColumn"]:
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                raise ValueError("文本列只支持步长为1的切片")
+            return StringColumn(self._data, self._offsets, self._valid, self.start + start,
+                                self.start + max(start, stop))
+        row = operator.index(key)
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(f"行号超出范围: {key}")
+        row += self.start
+        if not self._valid[row]:
+            return None
+        return self._data[self._offsets[row]:self._offsets[row + 1]].tobytes().decode("utf-8")
+
+    def __iter__(self) -> Iterator[Optional[str]]:
+        return iter(self.to_numpy())
+
+    def to_numpy(self) -> np.ndarray:
+        """把视图范围内的行解码为object数组（只读取这些行的字节）"""
+        if len(self) == 0:
+            return np.zeros(0, dtype=object)
+        offsets = np.asarray(self._offsets[self.start:self.stop + 1]) - self._offsets[self.start]
+        valid = self._valid[self.start:self.stop]
+        raw = self._data[self._offsets[self.start]:self._offsets[self.stop]].tobytes()
+        return np.array([
+            raw[offsets[i]:offsets[i + 1]].decode("utf-8") if valid[i] else None
+            for i in range(len(self))
+        ], dtype=object)
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        values = self.to_numpy()
+        return values if dtype is None else values.astype(dtype)
+
+
+class TableReader:
+    """以内存映射方式读取列式表格"""
+
+    def __init__(self, table_dir: str):
+        self.table_dir = table_dir
+        with open(os.path.join(table_dir, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.name = self.meta["name"]
+        self.rows = self.meta["rows"]
+        self.columns = self.meta["columns"]
+
+    def _map(self, position: int, suffix: str, dtype, length: int) -> np.ndarray:
+        path = os.path.join(self.table_dir, f"col_{position}.{suffix}")
+        if length == 0 or not os.path.exists(path):
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r", shape=(length,))
+
+    def _position(self, name: str) -> int:
+        for position, column in enumerate(self.columns):
+            if column["name"] == name:
+                return position
+        raise KeyError(f"列不存在: {name}")
+
+    def column(self, name: str, start: int = 0, stop: Optional[int] = None) -> Union[np.ndarray, StringColumn]:
+        """返回 [start, stop) 行的列数据：数值列为float64内存映射，日期列为datetime64[ns]视图，
+        文本列为StringColumn惰性视图（np.asarray或to_numpy()解码为object数组）"""
+        position = self._position(name)
+        kind = self.columns[position]["kind"]
+        rows = slice(start, stop)
+        if kind == "numeric":
+            return self._map(position, "f8", np.float64, self.rows)[rows]
+        if kind == "datetime":
+            return self._map(position, "i8", np.int64, self.rows).view("datetime64[ns]")[rows]
+
+        offsets = self._map(position, "offsets", np.int64, self.rows + 1)
+        valid = self._map(position, "valid", np.uint8, self.rows)
+        data = self._map(position, "utf8", np.uint8, int(offsets[-1]) if len(offsets) else 0)
+        return StringColumn(data, offsets, valid)[rows]
+
+    def numeric_columns(self) -> List[str]:
+        return [column["name"] for column in self.columns if column["kind"] == "numeric"]
+
+    def to_frame(self, columns: Optional[List[str]] = None, start: int = 0, stop: Optional[int] = None) -> pd.DataFrame:
+        """按需读取部分列的 [start, stop) 行组成DataFrame"""
+        names = columns or [column["name"] for column in self.columns]
+        return pd.DataFrame({name: np.asarray(self.column(name, start, stop)) for name in names})
+
+    def numeric_summary(self) -> Dict[str, Dict[str, Any]]:
+        """直接在内存映射数组上计算数值列统计，不需要重新读取原文件"""
+        summary = {}
+        for name in self.numeric_columns():
+            values = self.column(name)
+            count = int(np.count_nonzero(~np.isnan(values))) if len(values) else 0
+            if count == 0:
+                summary[name] = {"count": 0}
+                continue
+            summary[name] = {
+                "count": count,
+                "sum": float(np.nansum(values)),
+                "mean": float(np.nanmean(values)),
+                "min": float(np.nanmin(values)),
+                "max": float(np.nanmax(values)),
+            }
+        return summary
+
+
+def table_dir_for(store_dir: str, table_index: int) -> str:
+    """文档内第table_index个表格的目录"""
+    return os.path.join(store_dir, f"table_{table_index}")
+
+
+def list_tables(store_dir: str) -> List[Dict[str, Any]]:
+    """列出文档目录下已写完的表格元数据（按表格序号排序）"""
+    if not store_dir or not os.path.isdir(store_dir):
+        return []
+    tables = []
+    for entry in sorted(os.listdir(store_dir), key=lambda name: int(name.rsplit("_", 1)[-1])):
+        meta_path = os.path.join(store_dir, entry, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                tables.append({**json.load(f), "path": os.path.join(store_dir, entry)})
+    return tables
+
+
+def remove_store(store_dir: str):
+    """删除文档的列式数据目录"""
+    if store_dir and os.path.isdir(store_dir):
+        shutil.rmtree(store_dir, ignore_errors=True)
@@ -0,0 +1,55 @@
+"""测试公共设置：backend下的模块与app.py一样按顶层模块导入"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# 应用测试不读写快照（需在导入config之前设置）
+os.environ.setdefault("PERSISTENCE_ENABLED", "false")
+
+
+def draw_table(page, top: float, rows: int = 4, cols: int = 3):
+    """在页面上画带框线的数字表格"""
+    width, height = 120, 20
+    for row in range(rows + 1):
+        page.draw_line((50, top + row * height), (50 + cols * width, top + row * height))
+    for col in range(cols + 1):
+        page.draw_line((50 + col * width, top), (50 + col * width, top + rows * height))
+    for row in range(rows):
+        for col in range(cols):
+            page.insert_text((55 + col * width, top + row * height + 14), f"{(row + 1) * (col + 7) * 1.5:.1f}")
+
+
+@pytest.fixture
+def sample_pdf(tmp_path):
+    """五页PDF：正文、带框线的表格、无框线的数字、空白页（模拟扫描页）、正文"""
+    fitz = pytest.importorskip("fitz")
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((50, 72), "Revenue grew steadily this year while costs stayed flat.")
+    page = doc.new_page()
+    page.insert_text((50, 60), "Balance sheet")
+    draw_table(page, 80)
+    page = doc.new_page()
+    page.insert_text((50, 72), "2021 1,200 2022 1,350 2023 1,420 2024 1,610 growth 12.5% 7.4%")
+    doc.new_page()
+    page = doc.new_page()
+    page.insert_text((50, 72), "Management expects margins to improve next year.")
+    path = tmp_path / "sample.pdf"
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+@pytest.fixture
+def app_client(tmp_path, monkeypatch):
+    """在临时目录中启动应用（上传临时文件、列式数据、分词缓存都写在这里），返回 (app模块, TestClient)"""
+    from fastapi.testclient import TestClient
+
+    monkeypatch.chdir(tmp_path)
+    import app
+    with TestClient(app.app) as client:
+        client.delete("/documents")
+        yield app, client
+        client.delete("/documents")
@@ -0,0 +1,38 @@
+"""上传时分块、整批向量化并一次加入索引"""
+import numpy as np
+
+
+def upload_text(client, name, text):
+    response = client.post("/upload", files={"file": (name, text.encode("utf-8"))})
+    assert response.status_code == 200
+    result = response.json()
+    assert result["success"], result["message"]
+    return result
+
+
+def test_encode_chunk_texts_returns_one_row_per_chunk(app_client):
+    app, _ = app_client
+    assert app.encode_chunk_texts([]).vectors.shape == (0, app.vector_dimension)
+    encoded = app.encode_chunk_texts(["营业收入同比增长", "净利润率下降", "现金流稳定"])
+    assert encoded.vectors.shape == (3, app.vector_dimension)
+    assert encoded.vectors.dtype == np.float32
+
+
+def test_upload_indexes_every_chunk_once(app_client):
+    app, client = app_client
+    text = "公司营业收入持续增长，毛利率保持稳定。" * 200
+    result = upload_text(client, "report.txt", text)
+    stats = result["stats"]
+    chunks = app.split_document(text)
+    assert stats["chunks_count"] == stats["vectors_created"] == len(chunks) > 1
+    assert set(stats["stage_times"]) == {"extraction", "chunking", "vectorization", "indexing"}
+
+    doc_id = result["doc_id"]
+    vector_ids = app.document_store[doc_id]["vector_ids"]
+    assert [app.vector_id_to_chunk[vector_id] for vector_id in vector_ids] == [
+        (doc_id, chunk_index) for chunk_index in range(len(chunks))]
+    assert app.index.ntotal == len(chunks)
+
+    status = client.get("/status").json()["stats"]
+    assert status["total_vectors"] == len(chunks)
+    assert status["files"] == [{"filename": "report.txt", "chunks": len(chunks), "vectors": len(chunks)}]
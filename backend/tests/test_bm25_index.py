@@ -0,0 +1,120 @@
+"""BM25倒排索引：得分、按ID追加、删除扣除统计和压缩"""
+import math
+import pickle
+import random
+
+import numpy as np
+import pytest
+
+import bm25_index
+from bm25_index import BM25Index, normalize_terms
+
+VOCABULARY = ["营业", "收入", "利润", "现金", "成本", "费用", "资产", "负债", "增长", "下降"]
+
+
+def make_docs(count, seed=0):
+    rng = random.Random(seed)
+    return [[rng.choice(VOCABULARY) for _ in range(rng.randint(1, 12))] for _ in range(count)]
+
+
+def reference_scores(docs, query, k1=1.5, b=0.75):
+    """逐块按BM25公式计算得分"""
+    average_length = sum(map(len, docs)) / len(docs)
+    scores = {}
+    for chunk_id, doc in enumerate(docs):
+        score = 0.0
+        for term in set(query):
+            tf = doc.count(term)
+            if not tf:
+                continue
+            df = sum(term in other for other in docs)
+            idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(doc) / average_length))
+        if score > 0:
+            scores[chunk_id] = score
+    return scores
+
+
+def as_dict(result):
+    scores, ids = result
+    return dict(zip(ids.tolist(), scores.tolist()))
+
+
+@pytest.mark.parametrize("dense_ratio", [0, 10 ** 6])
+@pytest.mark.parametrize("query", [["利润"], ["利润", "现金", "利润"], ["营业", "收入", "增长", "下降"]])
+def test_scores_match_formula_on_dense_and_union_paths(monkeypatch, dense_ratio, query):
+    monkeypatch.setattr(bm25_index, "DENSE_SCORE_RATIO", dense_ratio)
+    docs = make_docs(200)
+    index = BM25Index()
+    index.add_documents(docs)
+    expected = reference_scores(docs, query)
+    result = as_dict(index.search(query, len(docs)))
+    assert result.keys() == expected.keys()
+    for chunk_id, score in expected.items():
+        assert result[chunk_id] == pytest.approx(score, rel=1e-5)
+    top_scores, _ = index.search(query, 5)
+    np.testing.assert_allclose(top_scores, sorted(expected.values(), reverse=True)[:5], rtol=1e-5)
+
+
+def test_ids_follow_vector_ids_with_gaps():
+    index = BM25Index()
+    assert index.add_documents([["营业", "收入"], ["现金"]], ids=[3, 7]) == [3, 7]
+    assert index.ntotal == 8 and index.documents == 2
+    assert index.search(["现金"], 10)[1].tolist() == [7]
+    with pytest.raises(ValueError):
+        index.add_documents([["利润"]], ids=[7])
+    index.pad(12)
+    assert index.add_documents([["利润"]]) == [12]
+
+
+def test_remove_matches_index_built_without_removed_chunks():
+    docs = make_docs(100, seed=1)
+    removed = set(range(0, 100, 3))
+    index = BM25Index(compact_min_tombstones=10 ** 6, compact_tombstone_ratio=1.0)
+    index.add_documents(docs)
+    assert index.remove(sorted(removed) + [0, 500]) == len(removed)
+    kept = [chunk_id for chunk_id in range(100) if chunk_id not in removed]
+    expected = reference_scores([docs[chunk_id] for chunk_id in kept], ["利润", "负债"])
+    result = as_dict(index.search(["利润", "负债"], 100))
+    assert result.keys() == {kept[i] for i in expected}
+    for i, score in expected.items():
+        assert result[kept[i]] == pytest.approx(score, rel=1e-5)
+    assert index.compactions == 0 and index.deleted == len(removed)
+
+
+@pytest.mark.parametrize("background", [False, True])
+def test_compaction_keeps_results(background):
+    docs = make_docs(100, seed=2)
+    index = BM25Index(compact_min_tombstones=20, background=background)
+    lazy = BM25Index(compact_min_tombstones=10 ** 6, compact_tombstone_ratio=1.0)
+    for target in (index, lazy):
+        target.add_documents(docs)
+        target.remove(list(range(30)))
+    index.wait_for_compaction()
+    assert index.compactions == 1 and index.deleted == 0
+    assert lazy.compactions == 0
+    assert index.nbytes < lazy.nbytes
+    for query in (["利润"], ["营业", "现金", "下降"]):
+        np.testing.assert_allclose(index.search(query, 100)[0], lazy.search(query, 100)[0], rtol=1e-6)
+        assert as_dict(index.search(query, 100)).keys() == as_dict(lazy.search(query, 100)).keys()
+    # 压缩后的ID不复用，可以继续追加和删除
+    assert index.add_documents([["利润"]]) == [100]
+    assert index.remove([100, 5]) == 1
+
+
+def test_pickle_round_trip():
+    index = BM25Index()
+    index.add_documents(make_docs(20))
+    index.remove([1])
+    restored = pickle.loads(pickle.dumps(index))
+    assert as_dict(restored.search(["利润"], 20)) == as_dict(index.search(["利润"], 20))
+    restored.add_documents([["利润"]])
+    assert restored.ntotal == 21 and index.ntotal == 20
+
+
+def test_normalize_terms_drops_punctuation():
+    assert normalize_terms(["Revenue", "，", " ", "2024", "营业"]) == ["revenue", "2024", "营业"]
+    index = BM25Index()
+    index.add_documents([["Revenue", "，"]])
+    assert index.search(["REVENUE"], 1)[1].tolist() == [0]
+    assert index.search(["，"], 1)[1].size == 0
@@ -0,0 +1,102 @@
+"""文本分块：偏移切分、边界选择、重叠和最小长度，表格感知分块"""
+import pytest
+
+from chunking import ChunkSpan, chunk_texts, iter_chunk_spans, iter_table_aware_spans, span_text
+
+PROSE = "".join(f"第{i}句营业收入增长了{i}.5%。" for i in range(60)) + "\n\n" + "Net margin improved. " * 40
+
+
+def test_spans_cover_text_within_chunk_size():
+    spans = list(iter_chunk_spans(PROSE, 100))
+    assert len(spans) > 1
+    assert all(span.end - span.start <= 100 for span in spans)
+    for text in chunk_texts(PROSE, spans):
+        assert text == text.strip()
+    # 没有重叠时相邻块之间只隔着空白
+    for previous, current in zip(spans, spans[1:]):
+        assert PROSE[previous.end:current.start].strip() == ""
+    assert spans[0].start == 0 and spans[-1].end == len(PROSE.rstrip())
+
+
+def test_cuts_prefer_sentence_ends_over_decimals():
+    for text in chunk_texts(PROSE, list(iter_chunk_spans(PROSE, 100))):
+        assert text.endswith(("。", ".")), text
+        assert not text.endswith("%")
+
+
+def test_hard_cut_without_breaks():
+    assert list(iter_chunk_spans("x" * 25, 10)) == [ChunkSpan(0, 10), ChunkSpan(10, 20), ChunkSpan(20, 25)]
+
+
+def test_overlap_restarts_at_sentence_inside_overlap():
+    spans = list(iter_chunk_spans(PROSE, 100, overlap=30))
+    for previous, current in zip(spans, spans[1:]):
+        assert previous.end - 30 <= current.start < previous.end
+        assert PROSE[current.start - 1] in "。\n" or PROSE[current.start - 2:current.start] == ". "
+
+
+def test_overlap_without_sentence_falls_back_to_overlap_width():
+    assert list(iter_chunk_spans("x" * 25, 10, overlap=4))[:2] == [ChunkSpan(0, 10), ChunkSpan(6, 16)]
+
+
+@pytest.mark.parametrize("overlap", [-1, 50, 80])
+def test_overlap_must_be_below_half_chunk(overlap):
+    with pytest.raises(ValueError):
+        list(iter_chunk_spans(PROSE, 100, overlap=overlap))
+
+
+def test_min_length_drops_short_chunks_only():
+    text = "长" * 9 + "。\n\n尾"
+    assert chunk_texts(text, list(iter_chunk_spans(text, 10))) == ["长" * 9 + "。", "尾"]
+    spans = list(iter_chunk_spans(text, 10, min_length=3))
+    assert spans == [ChunkSpan(0, 10)]
+    assert all(span.end - span.start >= 3 for span in iter_chunk_spans(PROSE, 100, 30, min_length=3))
+
+
+def test_start_and_end_bound_the_window():
+    text = "前言。" + "正文内容。" * 5 + "附录。"
+    spans = list(iter_chunk_spans(text, 100, start=3, end=len(text) - 3))
+    assert chunk_texts(text, spans) == ["正文内容。" * 5]
+
+
+def excel_sheet(rows: int) -> str:
+    lines = ["工作表: 明细", "列标题: 科目, 金额"]
+    lines += [f"科目: 费用{i} | 金额: {i * 100}" for i in range(rows)]
+    return "\n".join(lines)
+
+
+def test_table_rows_repeat_header_in_every_chunk():
+    text = "报表说明。\n\n" + excel_sheet(40) + "\n\n附注。"
+    spans = list(iter_table_aware_spans(text, 200))
+    table_spans = [span for span in spans if span.header_start >= 0]
+    assert len(table_spans) > 1
+    header = "工作表: 明细\n列标题: 科目, 金额"
+    rows = []
+    for span in table_spans:
+        chunk = span_text(text, span)
+        assert len(chunk) <= 200
+        assert chunk.startswith(header + "\n科目: ")
+        rows += chunk[len(header) + 1:].split("\n")
+    # 每行完整出现一次，不被切开
+    assert rows == [f"科目: 费用{i} | 金额: {i * 100}" for i in range(40)]
+    assert chunk_texts(text, [spans[0], spans[-1]]) == ["报表说明。", "附注。"]
+
+
+def test_small_table_stays_in_plain_text():
+    text = "报表说明。\n\n" + excel_sheet(2)
+    assert [span.header_start for span in iter_table_aware_spans(text, 200)] == [-1]
+
+
+def test_pdf_table_uses_first_row_as_header():
+    rows = "\n".join(f"行{i} | {i}" for i in range(30))
+    text = "表格内容:\n项目 | 金额\n" + rows
+    spans = list(iter_table_aware_spans(text, 80))
+    assert len(spans) > 1
+    assert all(span_text(text, span).startswith("表格内容:\n项目 | 金额\n行") for span in spans)
+
+
+def test_overlong_row_is_split_with_header():
+    text = excel_sheet(1) + "\n科目: 说明 | 金额: " + "很长的备注" * 60
+    spans = list(iter_table_aware_spans(text, 120))
+    assert all(span.header_start == 0 for span in spans)
+    assert all(len(span_text(text, span)) <= 120 for span in spans)
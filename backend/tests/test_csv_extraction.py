@@ -0,0 +1,55 @@
+"""CSV分块读取：编码和分隔符只检测一次，行数上限与总行数统计"""
+import codecs
+
+import pytest
+
+from config import CSV_CONFIG
+from extractors import _sniff_csv_format, extract_text_from_csv, iter_csv_blocks
+
+
+def write_csv(path, text: str, encoding: str = "utf-8", bom: bool = False) -> str:
+    data = text.encode(encoding)
+    path.write_bytes((codecs.BOM_UTF8 if bom else b"") + data)
+    return str(path)
+
+
+@pytest.mark.parametrize("encoding, bom, expected", [
+    ("utf-8", True, "utf-8-sig"),
+    ("utf-8", False, "utf-8"),
+    ("gbk", False, "gbk"),
+])
+def test_sniff_detects_encoding_and_delimiter(tmp_path, encoding, bom, expected):
+    path = write_csv(tmp_path / "a.csv", "科目;金额\n银行存款;100\n应收账款;200\n", encoding, bom)
+    assert _sniff_csv_format(path) == (expected, ";")
+
+
+def test_sniff_ignores_multibyte_character_cut_by_sample(tmp_path, monkeypatch):
+    text = "名称,金额\n" + "".join(f"营业收入{i},{i}\n" for i in range(200))
+    path = write_csv(tmp_path / "a.csv", text)
+    # 样本末尾截断在一个汉字中间
+    cut = text.encode("utf-8").index("营业收入150".encode("utf-8")) + 1
+    monkeypatch.setitem(CSV_CONFIG, "SNIFF_BYTES", cut)
+    assert _sniff_csv_format(path) == ("utf-8", ",")
+
+
+def test_iter_csv_blocks_limits_rows_and_counts_all(tmp_path, monkeypatch):
+    monkeypatch.setitem(CSV_CONFIG, "CHUNK_ROWS", 4)
+    path = write_csv(tmp_path / "a.csv", "a,b\n" + "".join(f"{i},x{i}\n" for i in range(10)))
+    blocks = list(iter_csv_blocks(path, max_rows=6))
+    assert blocks[0].startswith("=== CSV数据 ===") and "列名: a, b" in blocks[0]
+    rows = "\n".join(blocks[1:-1]).splitlines()
+    assert rows == [f"a: {i} | b: x{i}" for i in range(6)]
+    assert blocks[-1] == "数据行数: 10\n... (还有 4 行数据)"
+
+
+def test_iter_csv_blocks_stops_early_without_full_count(tmp_path, monkeypatch):
+    monkeypatch.setitem(CSV_CONFIG, "CHUNK_ROWS", 4)
+    monkeypatch.setitem(CSV_CONFIG, "COUNT_ALL_ROWS", False)
+    path = write_csv(tmp_path / "a.csv", "a\n" + "".join(f"{i}\n" for i in range(20)))
+    assert list(iter_csv_blocks(path, max_rows=4))[-1] == "数据行数: 超过 8\n... (还有更多数据未读取)"
+
+
+def test_extract_text_from_header_only_csv(tmp_path):
+    text = extract_text_from_csv(write_csv(tmp_path / "a.csv", "a,b\n"))
+    assert "列名: a, b" in text
+    assert "数据行数: 0" in text
@@ -0,0 +1,66 @@
+"""删除单个文档、上传时替换旧文档，三种检索引擎都不再返回被删除的文本块"""
+import pytest
+
+from config import FILE_CONFIG, RETRIEVAL_CONFIG
+
+
+def upload(client, name, text, **form):
+    response = client.post("/upload", files={"file": (name, text.encode("utf-8"))}, data=form)
+    assert response.status_code == 200
+    return response.json()
+
+
+def hit_doc_ids(app, question):
+    return {result["doc_id"] for result in app.search_chunks(question, top_k=10)}
+
+
+@pytest.mark.parametrize("engine", ["bm25", "sparse", "faiss"])
+def test_deleted_document_disappears_from_search(app_client, monkeypatch, engine):
+    app, client = app_client
+    monkeypatch.setitem(RETRIEVAL_CONFIG, "ENGINE", engine)
+    first = upload(client, "a.txt", "营业收入同比增长百分之二十。")["doc_id"]
+    second = upload(client, "b.txt", "营业收入同比下降百分之五。")["doc_id"]
+    assert hit_doc_ids(app, "营业收入") == {first, second}
+
+    response = client.delete(f"/documents/{first}").json()
+    assert response["success"]
+    assert response["data"]["vectors_removed"] == 1
+    assert response["data"]["total_vectors"] == 1
+    assert hit_doc_ids(app, "营业收入") == {second}
+    assert all(location[0] != first for location in app.vector_id_to_chunk.values())
+
+
+def test_delete_rejects_missing_and_processing_documents(app_client):
+    app, client = app_client
+    assert client.delete("/documents/42").json()["success"] is False
+    doc_id = upload(client, "a.txt", "本期营业收入同比增长百分之十。")["doc_id"]
+    app.document_store[doc_id]["status"] = "processing"
+    response = client.delete(f"/documents/{doc_id}").json()
+    assert response["success"] is False and "处理中" in response["message"]
+    assert doc_id in app.document_store
+
+
+def test_replace_doc_id_swaps_document(app_client):
+    app, client = app_client
+    old = upload(client, "report.txt", "旧版本：营业收入一百万元。")["doc_id"]
+    result = upload(client, "report-v2.txt", "新版本：营业收入一百二十万元。", replace_doc_id=str(old))
+    assert result["success"] and result["replaced_doc_ids"] == [old]
+    assert list(app.document_store) == [result["doc_id"]]
+    assert hit_doc_ids(app, "营业收入") == {result["doc_id"]}
+
+    missing = upload(client, "report-v3.txt", "第三版：营业收入一百三十万元。", replace_doc_id=str(old))
+    assert missing["success"] is False and "不存在" in missing["message"]
+    assert list(app.document_store) == [result["doc_id"]]
+
+
+def test_replace_same_filename_is_opt_in(app_client, monkeypatch):
+    app, client = app_client
+    monkeypatch.setitem(FILE_CONFIG, "REPLACE_SAME_FILENAME", False)
+    first = upload(client, "report.txt", "第一版财务报告正文内容。")["doc_id"]
+    second = upload(client, "report.txt", "第二版财务报告正文内容。")
+    assert second["replaced_doc_ids"] == [] and len(app.document_store) == 2
+
+    third = upload(client, "report.txt", "第三版财务报告正文内容。", replace_same_filename="true")
+    assert sorted(third["replaced_doc_ids"]) == [first, second["doc_id"]]
+    assert list(app.document_store) == [third["doc_id"]]
+    assert client.get("/status").json()["stats"]["total_vectors"] == 1
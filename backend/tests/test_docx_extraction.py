@@ -0,0 +1,50 @@
+"""DOCX流式解析：段落与表格的文档顺序、合并单元格（gridSpan/vMerge）只输出一次"""
+import pytest
+
+from extractors import _iter_docx_body, extract_text_from_docx
+
+docx = pytest.importorskip("docx")
+
+
+@pytest.fixture
+def merged_table_docx(tmp_path):
+    document = docx.Document()
+    document.add_paragraph("Quarterly summary")
+    table = document.add_table(rows=3, cols=3)
+    for row_index, row in enumerate(table.rows):
+        for col_index, cell in enumerate(row.cells):
+            cell.text = f"r{row_index}c{col_index}"
+    # 第一行前两列横向合并，第三列的后两行纵向合并
+    table.cell(0, 0).merge(table.cell(0, 1)).text = "Metric"
+    table.cell(1, 2).merge(table.cell(2, 2)).text = "Merged note"
+    run = document.add_paragraph().add_run("Line one")
+    run.add_tab()
+    run.add_text("tabbed")
+    run.add_break()
+    run.add_text("Line two")
+    path = tmp_path / "merged.docx"
+    document.save(str(path))
+    return str(path)
+
+
+def test_body_is_yielded_in_document_order(merged_table_docx):
+    items = list(_iter_docx_body(merged_table_docx))
+    assert [kind for kind, _ in items] == ["p", "tbl", "p"]
+    assert items[0][1] == "Quarterly summary"
+    assert items[2][1] == "Line one\ttabbed\nLine two"
+
+
+def test_merged_cells_keep_grid_alignment_without_repeating_text(merged_table_docx):
+    (_, rows), = [content for content in _iter_docx_body(merged_table_docx) if content[0] == "tbl"]
+    assert rows == [
+        ["Metric", "", "r0c2"],
+        ["r1c0", "r1c1", "Merged note"],
+        ["r2c0", "r2c1", ""],
+    ]
+
+
+def test_extract_text_from_docx_formats_tables(merged_table_docx):
+    text = extract_text_from_docx(merged_table_docx)
+    assert text.startswith("Quarterly summary")
+    assert "表头: Metric |  | r0c2" in text
+    assert text.count("Merged note") == 1
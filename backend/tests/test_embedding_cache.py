@@ -0,0 +1,74 @@
+"""磁盘向量缓存：批量查找、追加写入、重启后加载和中断写入的截断"""
+import os
+
+import numpy as np
+import pytest
+
+from embedding_cache import EmbeddingCache, text_key
+
+
+@pytest.fixture
+def cache_factory(tmp_path):
+    caches = []
+
+    def open_cache(version="v1", dimension=4):
+        cache = EmbeddingCache(str(tmp_path), "tiny", version, dimension)
+        caches.append(cache)
+        return cache
+
+    yield open_cache
+    for cache in caches:
+        cache.close()
+
+
+def test_round_trip_survives_reopen(cache_factory):
+    keys = [text_key(text) for text in ("营业收入", "净利润", "营业收入")]
+    vectors = np.arange(12, dtype=np.float32).reshape(3, 4)
+    cache = cache_factory()
+    found, _ = cache.get_many(keys)
+    assert not found.any()
+    cache.put_many(keys, vectors)
+    assert cache.stats()["entries"] == 2
+
+    found, cached = cache.get_many(keys + [text_key("现金")])
+    assert found.tolist() == [True, True, True, False]
+    # 批内重复的哈希只写第一次出现的向量
+    np.testing.assert_array_equal(cached[:3], vectors[[0, 1, 0]])
+    assert not cached[3].any()
+    cache.close()
+
+    reopened = cache_factory()
+    found, cached = reopened.get_many(keys[:2])
+    assert found.all()
+    np.testing.assert_array_equal(cached, vectors[:2])
+    assert reopened.stats()["hits"] == 2
+
+
+def test_rows_appended_after_mapping_are_readable(cache_factory):
+    cache = cache_factory()
+    cache.put_many([text_key("a")], np.ones((1, 4), dtype=np.float32))
+    cache.get_many([text_key("a")])
+    cache.put_many([text_key("b")], np.full((1, 4), 2, dtype=np.float32))
+    found, cached = cache.get_many([text_key("b")])
+    assert found.all() and (cached == 2).all()
+
+
+def test_partial_write_is_truncated_on_load(cache_factory):
+    cache = cache_factory()
+    cache.put_many([text_key("a"), text_key("b")], np.ones((2, 4), dtype=np.float32))
+    cache.close()
+    with open(os.path.join(cache.directory, "vectors.f32"), "ab") as f:
+        f.write(np.ones(6, dtype=np.float32).tobytes())  # 一行半向量，哈希未写入
+
+    reopened = cache_factory()
+    assert reopened.stats()["entries"] == 2
+    assert os.path.getsize(os.path.join(cache.directory, "vectors.f32")) == 2 * 4 * 4
+    reopened.put_many([text_key("c")], np.full((1, 4), 3, dtype=np.float32))
+    found, cached = reopened.get_many([text_key("c")])
+    assert found.all() and (cached == 3).all()
+
+
+def test_model_version_and_dimension_use_separate_directories(cache_factory):
+    cache_factory().put_many([text_key("a")], np.ones((1, 4), dtype=np.float32))
+    assert not cache_factory(version="v2").get_many([text_key("a")])[0].any()
+    assert not cache_factory(dimension=8).get_many([text_key("a")])[0].any()
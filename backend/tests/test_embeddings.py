@@ -0,0 +1,60 @@
+"""句向量模型后端：批处理、均值池化、归一化和批大小无关性"""
+import numpy as np
+import pytest
+
+from embeddings import EmbeddingBackend, ONNX_AVAILABLE, TinyEmbeddingBackend, create_embedding_backend
+
+TEXTS = ["营业收入同比增长", "净利润", "经营活动现金流量净额为正", "", "资产负债率下降"]
+
+
+def test_rows_are_normalized_and_empty_text_is_zero():
+    vectors = TinyEmbeddingBackend(32, batch_size=2, max_length=64).embed(TEXTS)
+    assert vectors.shape == (5, 32) and vectors.dtype == np.float32
+    norms = np.linalg.norm(vectors, axis=1)
+    np.testing.assert_allclose(np.delete(norms, 3), 1.0, rtol=1e-5)
+    assert norms[3] == 0
+
+
+def test_output_does_not_depend_on_batching_or_order():
+    expected = TinyEmbeddingBackend(32, batch_size=len(TEXTS), max_length=64).embed(TEXTS)
+    backend = TinyEmbeddingBackend(32, batch_size=2, max_length=64)
+    np.testing.assert_allclose(backend.embed(TEXTS), expected, atol=1e-6)
+    assert backend.batches == 3 and backend.texts_embedded == 5
+    # 补齐位置被mask排除，单独编码与批内编码一致
+    np.testing.assert_allclose(backend.embed([TEXTS[2]])[0], expected[2], atol=1e-6)
+    np.testing.assert_allclose(backend.embed(TEXTS[::-1]), expected[::-1], atol=1e-6)
+
+
+def test_whitespace_ignored_and_truncated_to_max_length():
+    backend = TinyEmbeddingBackend(16, batch_size=4, max_length=3)
+    a, b, c = backend.embed(["营 业 收", "营业收入增长", "营业收"])
+    np.testing.assert_allclose(a, c, atol=1e-6)
+    np.testing.assert_allclose(b, c, atol=1e-6)
+
+
+def test_base_class_requires_tokenize_and_forward():
+    with pytest.raises(TypeError):
+        EmbeddingBackend(8, 1, 8)
+
+    class Pooled(EmbeddingBackend):
+        def _tokenize(self, texts):
+            return np.ones((len(texts), 2), dtype=np.int64), np.ones((len(texts), 2), dtype=np.int64)
+
+        def _forward(self, input_ids, attention_mask):
+            return np.full((len(input_ids), 4), 2.0, dtype=np.float32)
+
+    np.testing.assert_allclose(Pooled(4, 8, 8).embed(["a"]), [[0.5, 0.5, 0.5, 0.5]])
+
+
+def test_invalid_batch_size_and_backend_name():
+    with pytest.raises(ValueError):
+        TinyEmbeddingBackend(8, batch_size=0, max_length=8)
+    with pytest.raises(ValueError):
+        create_embedding_backend("bert", 8)
+
+
+@pytest.mark.skipif(not ONNX_AVAILABLE, reason="需要onnxruntime和tokenizers")
+def test_onnx_backend_requires_model_files(tmp_path):
+    from embeddings import OnnxEmbeddingBackend
+    with pytest.raises(FileNotFoundError):
+        OnnxEmbeddingBackend(8, str(tmp_path), 4, 16)
@@ -0,0 +1,43 @@
+"""Excel提取：工作簿只打开一次、大工作表流式读取、多工作表并行提取"""
+import pandas as pd
+import pytest
+
+from config import EXCEL_CONFIG
+from extractors import _normalize_headers, extract_text_from_excel
+
+pytest.importorskip("openpyxl")
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = tmp_path / "ledger.xlsx"
+    with pd.ExcelWriter(path) as writer:
+        for sheet in range(3):
+            pd.DataFrame({
+                "科目": ["银行存款", "应收账款", None, "管理费用", "应交税费"],
+                "金额": [100.5, 200.0, 300.25, None, 500.0],
+                "凭证号": [sheet * 10 + row for row in range(5)],
+                "日期": pd.to_datetime(["2024-01-01", "2024-01-02", None, "2024-01-04", "2024-01-05"]),
+            }).to_excel(writer, sheet_name=f"Sheet{sheet}", index=False)
+    return str(path)
+
+
+def test_streamed_sheets_match_parsed_sheets(workbook, monkeypatch):
+    parsed = extract_text_from_excel(workbook)
+    monkeypatch.setitem(EXCEL_CONFIG, "STREAM_MIN_ROWS", 1)
+    monkeypatch.setitem(EXCEL_CONFIG, "STREAM_BATCH_ROWS", 2)
+    assert extract_text_from_excel(workbook) == parsed
+    assert "工作表: Sheet2" in parsed
+    assert "科目: 银行存款 | 金额: 100.5 | 凭证号: 20 | 日期: 2024-01-01 00:00:00" in parsed
+
+
+def test_parallel_sheets_keep_order(workbook, monkeypatch):
+    sequential = extract_text_from_excel(workbook)
+    monkeypatch.setitem(EXCEL_CONFIG, "PARALLEL_WORKERS", 2)
+    monkeypatch.setitem(EXCEL_CONFIG, "PARALLEL_MIN_SHEETS", 2)
+    monkeypatch.setitem(EXCEL_CONFIG, "PARALLEL_MIN_BYTES", 0)
+    assert extract_text_from_excel(workbook) == sequential
+
+
+def test_normalize_headers_matches_pandas_naming():
+    assert _normalize_headers(("a", None, "a", "", "a")) == ["a", "Unnamed: 1", "a.1", "Unnamed: 3", "a.2"]
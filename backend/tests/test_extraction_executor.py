@@ -0,0 +1,50 @@
+"""提取执行器和事件循环延迟监控"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+import extraction_executor
+from config import EXTRACTION_CONFIG
+from extraction_executor import run_extraction, shutdown_extraction_executor
+from loop_monitor import EventLoopLagMonitor
+
+
+@pytest.fixture
+def executor_type(monkeypatch):
+    def use(kind: str):
+        monkeypatch.setitem(EXTRACTION_CONFIG, "EXECUTOR", kind)
+    yield use
+    shutdown_extraction_executor()
+
+
+@pytest.mark.parametrize("kind, off_loop", [("thread", True), ("inline", False)])
+def test_run_extraction_executor(executor_type, kind, off_loop):
+    executor_type(kind)
+
+    async def main():
+        return threading.get_ident(), await run_extraction(threading.get_ident)
+
+    loop_thread, worker_thread = asyncio.run(main())
+    assert (worker_thread != loop_thread) is off_loop
+
+
+def test_thread_executor_is_reused_until_shutdown(executor_type):
+    executor_type("thread")
+    first = extraction_executor.get_extraction_executor()
+    assert extraction_executor.get_extraction_executor() is first
+    shutdown_extraction_executor()
+    assert extraction_executor._executor is None
+
+
+def test_loop_lag_monitor_statistics():
+    monitor = EventLoopLagMonitor(interval=0.1, window=10)
+    assert monitor.snapshot()["samples"] == 0
+    now = time.time()
+    monitor.samples.extend([(now - 10, 0.5), (now, 0.002), (now, 0.004)])
+    assert monitor.max_lag_since(now - 1) == 4.0
+    snapshot = monitor.snapshot()
+    assert snapshot["samples"] == 3
+    assert snapshot["max_ms"] == 500.0
+    assert snapshot["current_ms"] == 4.0
@@ -0,0 +1,78 @@
+"""上传文件流式落盘和请求体大小限制"""
+import asyncio
+import io
+
+import pytest
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+from starlette.datastructures import UploadFile as StarletteUploadFile
+
+from file_upload import UploadSizeLimitMiddleware, UploadTooLargeError, save_upload_file
+
+
+def make_upload(data: bytes, size=None) -> StarletteUploadFile:
+    return StarletteUploadFile(file=io.BytesIO(data), filename="a.txt", size=size)
+
+
+def test_save_upload_file_writes_in_chunks(tmp_path):
+    dest = tmp_path / "a.txt"
+    written = asyncio.run(save_upload_file(make_upload(b"x" * 2500), str(dest), max_size=4096, chunk_size=1000))
+    assert written == 2500
+    assert dest.read_bytes() == b"x" * 2500
+
+
+def test_save_upload_file_rejects_declared_size(tmp_path):
+    dest = tmp_path / "a.txt"
+    with pytest.raises(UploadTooLargeError):
+        asyncio.run(save_upload_file(make_upload(b"x", size=5000), str(dest), max_size=4096, chunk_size=1000))
+    assert not dest.exists()
+
+
+def test_save_upload_file_removes_partial_file_when_too_large(tmp_path):
+    dest = tmp_path / "a.txt"
+    with pytest.raises(UploadTooLargeError):
+        asyncio.run(save_upload_file(make_upload(b"x" * 5000), str(dest), max_size=4096, chunk_size=1000))
+    assert not dest.exists()
+
+
+@pytest.fixture
+def limited_client():
+    api = FastAPI()
+
+    @api.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        return {"size": len(await file.read())}
+
+    api.add_middleware(UploadSizeLimitMiddleware, path_prefix="/upload", max_body_size=4096, max_file_size=4096)
+    return TestClient(api)
+
+
+def multipart_body(payload: bytes) -> bytes:
+    return (b"--b\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a.txt\"\r\n\r\n"
+            + payload + b"\r\n--b--\r\n")
+
+
+def test_middleware_allows_small_body(limited_client):
+    response = limited_client.post("/upload", files={"file": ("a.txt", b"x" * 100)})
+    assert response.status_code == 200
+    assert response.json() == {"size": 100}
+
+
+def test_middleware_rejects_declared_content_length(limited_client):
+    response = limited_client.post("/upload", files={"file": ("a.txt", b"x" * 5000)})
+    assert response.status_code == 413
+    assert response.json()["success"] is False
+
+
+def test_middleware_rejects_chunked_body(limited_client):
+    body = multipart_body(b"x" * 10000)
+
+    def chunks():
+        for start in range(0, len(body), 1000):
+            yield body[start:start + 1000]
+
+    # 生成器作为请求体时按分块传输发送，没有Content-Length
+    response = limited_client.post("/upload", content=chunks(),
+                                   headers={"content-type": "multipart/form-data; boundary=b"})
+    assert response.status_code == 413
+    assert response.json()["success"] is False
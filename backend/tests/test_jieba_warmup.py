@@ -0,0 +1,59 @@
+"""jieba预热：前缀词典的pickle缓存和金融用户词典"""
+import pickle
+
+import jieba
+import pytest
+
+from config import TOKENIZER_CONFIG
+from tokenizer import _load_prefix_dict, load_jieba_resources, segment_text
+
+
+@pytest.fixture
+def fresh_tokenizer(monkeypatch):
+    """换成未初始化的分词器，不影响其他用例共用的jieba.dt"""
+    def replace():
+        tokenizer = jieba.Tokenizer()
+        monkeypatch.setattr(jieba, "dt", tokenizer)
+        return tokenizer
+    return replace
+
+
+def test_prefix_dict_cache_is_written_then_hit(tmp_path, fresh_tokenizer):
+    cache_file = str(tmp_path / "cache" / "jieba.cache")
+    built = fresh_tokenizer()
+    assert _load_prefix_dict(cache_file) is False
+    assert built.initialized
+
+    loaded = fresh_tokenizer()
+    assert _load_prefix_dict(cache_file) is True
+    assert loaded.initialized and loaded.total == built.total
+    assert loaded.FREQ == built.FREQ
+    # 已初始化的分词器不重复加载
+    assert _load_prefix_dict(cache_file) is False
+
+
+def test_stale_or_broken_cache_is_rebuilt(tmp_path, fresh_tokenizer):
+    cache_file = tmp_path / "jieba.cache"
+    cache_file.write_bytes(pickle.dumps(("0.0", {}, 0)))
+    tokenizer = fresh_tokenizer()
+    assert _load_prefix_dict(str(cache_file)) is False
+    assert tokenizer.total > 0
+    assert pickle.loads(cache_file.read_bytes())[0] == jieba.__version__
+
+    cache_file.write_bytes(b"not a pickle")
+    fresh_tokenizer()
+    assert _load_prefix_dict(str(cache_file)) is False
+
+
+def test_user_dict_keeps_financial_terms_whole(tmp_path):
+    stats = load_jieba_resources(str(tmp_path / "jieba.cache"), TOKENIZER_CONFIG["USER_DICT"])
+    assert stats["user_dict_terms"] > 0
+    assert {"total_ms", "dictionary_ms", "user_dict_ms"} <= stats.keys()
+    tokens = segment_text("本期应收账款周转率提高，营业收入增长")
+    assert "应收账款周转率" in tokens and "营业收入" in tokens
+
+
+def test_missing_user_dict_is_skipped(tmp_path, capsys):
+    stats = load_jieba_resources("", str(tmp_path / "missing.txt"))
+    assert stats["user_dict_terms"] == 0
+    assert "用户词典不存在" in capsys.readouterr().out
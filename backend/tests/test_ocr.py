@@ -0,0 +1,58 @@
+"""扫描页OCR：批大小、页数预算和流式提取中的识别（用假的识别函数代替Tesseract）"""
+import pytest
+
+import extractors
+import ocr
+from config import OCR_CONFIG
+
+
+@pytest.fixture
+def fake_ocr(monkeypatch):
+    """记录每次调用的页码批次，返回固定文本；单进程时就地调用"""
+    batches = []
+
+    def ocr_page_batch(file_path, page_numbers, dpi, lang):
+        batches.append(list(page_numbers))
+        return [(page_num, f"scanned text {page_num}") for page_num in page_numbers]
+
+    monkeypatch.setattr(ocr, "ocr_page_batch", ocr_page_batch)
+    monkeypatch.setitem(OCR_CONFIG, "WORKERS", 1)
+    monkeypatch.setitem(OCR_CONFIG, "BATCH_SIZE", 2)
+    return batches
+
+
+def test_ocr_disabled_by_config(monkeypatch):
+    monkeypatch.setitem(OCR_CONFIG, "ENABLED", False)
+    assert not ocr.is_ocr_enabled()
+
+
+def test_ocr_pdf_pages_applies_budget_and_batches(fake_ocr, monkeypatch):
+    monkeypatch.setitem(OCR_CONFIG, "MAX_PAGES_PER_DOC", 3)
+    texts, stats = ocr.ocr_pdf_pages("unused.pdf", [0, 2, 4, 6, 8])
+    assert sorted(texts) == [0, 2, 4]
+    assert fake_ocr == [[0, 2], [4]]
+    assert stats["ocr_pages"] == 3 and stats["ocr_skipped_by_budget"] == 2
+
+
+def test_streaming_ocr_batches_and_budget(fake_ocr, monkeypatch):
+    monkeypatch.setitem(OCR_CONFIG, "MAX_PAGES_PER_DOC", 3)
+    streaming = ocr.StreamingOcr("unused.pdf")
+    assert [streaming.add(page_num) for page_num in (1, 3, 5, 7)] == [True, True, True, False]
+    # 攒满一批时提交，未满的批在取结果时提交
+    assert fake_ocr == [[1, 3]]
+    assert streaming.done(1) and not streaming.done(5)
+    assert streaming.result(5) == "scanned text 5"
+    assert fake_ocr == [[1, 3], [5]]
+    assert streaming.result(1) == "scanned text 1"
+    assert streaming.skipped_by_budget == 1
+    streaming.close()
+
+
+def test_iter_pdf_pages_replaces_scanned_page_text(sample_pdf, fake_ocr, monkeypatch):
+    monkeypatch.setattr(extractors, "is_ocr_enabled", lambda: True)
+    pages = list(extractors.iter_pdf_pages(sample_pdf, "fast"))
+    assert [page_num for page_num, _, _, _ in pages] == [1, 2, 3, 4, 5]
+    assert fake_ocr == [[3]]
+    _, _, page_text, page_stats = pages[3]
+    assert page_stats["ocr"] is True
+    assert "scanned text 3" in page_text
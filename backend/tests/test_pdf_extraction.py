@@ -0,0 +1,76 @@
+"""PDF提取：按页码范围并行提取、提取档位和表格页分类"""
+import pytest
+
+from config import PDF_CONFIG
+from extractors import (
+    _SkippedPageSampler,
+    _extract_pdf_page_range,
+    _extract_pdf_pages_parallel,
+    _split_ranges,
+    classify_table_page,
+    extract_pdf_with_stats,
+)
+
+
+@pytest.mark.parametrize("item_count, shard_count", [(10, 3), (5, 8), (1, 4), (60, 8)])
+def test_split_ranges_covers_all_items(item_count, shard_count):
+    ranges = _split_ranges(item_count, shard_count)
+    assert ranges[0][0] == 0 and ranges[-1][1] == item_count
+    assert all(previous[1] == current[0] for previous, current in zip(ranges, ranges[1:]))
+    sizes = [end - start for start, end in ranges]
+    assert min(sizes) >= 1 and max(sizes) - min(sizes) <= 1
+
+
+def test_parallel_extraction_matches_sequential(sample_pdf):
+    sequential = _extract_pdf_page_range(sample_pdf, 0, 5, "thorough")
+    parallel = _extract_pdf_pages_parallel(sample_pdf, 5, 2, "thorough")
+    assert [text for text, _ in parallel] == [text for text, _ in sequential]
+    assert [stats["page"] for _, stats in parallel] == [1, 2, 3, 4, 5]
+
+
+def test_extract_pdf_with_stats_uses_parallel_path(sample_pdf, monkeypatch):
+    sequential_text, _ = extract_pdf_with_stats(sample_pdf, "thorough")
+    monkeypatch.setitem(PDF_CONFIG, "PARALLEL_WORKERS", 2)
+    monkeypatch.setitem(PDF_CONFIG, "PARALLEL_MIN_PAGES", 2)
+    parallel_text, stats = extract_pdf_with_stats(sample_pdf, "thorough")
+    assert parallel_text == sequential_text
+    assert stats["pages"] == 5
+    assert "Revenue grew" in parallel_text and "Management expects" in parallel_text
+
+
+@pytest.mark.parametrize("profile, checked_pages", [("fast", []), ("balanced", [2, 3]), ("thorough", [1, 2, 3, 4, 5])])
+def test_profiles_control_table_detection(sample_pdf, profile, checked_pages):
+    text, stats = extract_pdf_with_stats(sample_pdf, profile)
+    assert stats["profile"] == profile
+    assert [page["page"] for page in stats["page_decisions"] if page["table_check"]] == checked_pages
+    # 所有档位都读取文本层；只有运行了表格检测的档位才有表格内容
+    assert "Revenue grew" in text
+    assert ("表格内容" in text) == bool(checked_pages)
+
+
+def test_classify_table_page_reasons(sample_pdf):
+    fitz = pytest.importorskip("fitz")
+    with fitz.open(sample_pdf) as doc:
+        reasons = [classify_table_page(page, page.get_text()) for page in doc]
+    assert [result["reason"] for result in reasons] == ["prose", "ruling", "numeric", "prose", "prose"]
+    assert reasons[1]["ruling_items"] >= PDF_CONFIG["TABLE_MIN_RULING_ITEMS"]
+    assert reasons[2]["numeric_ratio"] >= PDF_CONFIG["TABLE_NUMERIC_RATIO"]
+
+
+def test_skipped_page_sampler_takes_every_nth_page():
+    sampler = _SkippedPageSampler(3)
+    assert [sampler.take() for _ in range(7)] == [True, False, False, True, False, False, True]
+    assert not any(_SkippedPageSampler(0).take() for _ in range(5))
+
+
+def test_balanced_stats_estimate_saved_time(sample_pdf, monkeypatch):
+    monkeypatch.setitem(PDF_CONFIG, "TABLE_SKIP_SAMPLE_EVERY", 1)
+    _, stats = extract_pdf_with_stats(sample_pdf, "balanced")
+    assert stats["table_pages_skipped"] == 3
+    assert stats["skipped_pages_sampled"] == 3
+    assert stats["estimated_time_saved_ms"] is not None
+
+    monkeypatch.setitem(PDF_CONFIG, "TABLE_SKIP_SAMPLE_EVERY", 0)
+    _, stats = extract_pdf_with_stats(sample_pdf, "balanced")
+    assert stats["skipped_pages_sampled"] == 0
+    assert stats["estimated_time_saved_ms"] is None
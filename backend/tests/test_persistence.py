@@ -0,0 +1,136 @@
+"""快照持久化：原子提交、版本冲突作废、格式校验和调度"""
+import asyncio
+import os
+import pickle
+import threading
+
+import numpy as np
+import pytest
+
+import persistence
+from persistence import SnapshotConflict, SnapshotScheduler, SnapshotStore
+from vector_index import VectorIndexManager
+
+
+@pytest.fixture
+def manager():
+    index = VectorIndexManager(4, ivf_min_vectors=10 ** 6, hnsw_min_vectors=10 ** 6, background=False)
+    index.add(np.eye(4, dtype=np.float32))
+    return index
+
+
+def save(store, manager, state, version=lambda: 0):
+    return store.save(manager, lambda: state, lambda: {"counts": {"vectors": manager.ntotal}}, version)
+
+
+def index_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.startswith(persistence.INDEX_PREFIX))
+
+
+def test_save_and_load_round_trip(tmp_path, manager):
+    store = SnapshotStore(str(tmp_path))
+    assert store.load() is None
+    result = save(store, manager, {"documents": {0: "营业收入"}})
+    assert result["counts"] == {"vectors": 4} and result["bytes"] > 0
+
+    index_path, header, state = store.load()
+    assert state == {"documents": {0: "营业收入"}}
+    assert header["index_state"] == {"next_id": 4, "tombstones": []}
+    loaded = VectorIndexManager(4, 10 ** 6, 10 ** 6)
+    loaded.load(index_path, header["index_state"])
+    assert loaded.ntotal == 4
+
+    # 新快照提交后删除旧的索引文件
+    manager.add(np.ones((1, 4), dtype=np.float32))
+    save(store, manager, {})
+    assert index_files(str(tmp_path)) == [store.load()[1]["index_file"]]
+
+
+def test_version_change_discards_snapshot(tmp_path, manager):
+    store = SnapshotStore(str(tmp_path))
+    save(store, manager, {"generation": 1})
+    committed = index_files(str(tmp_path))
+
+    versions = iter([0, 2, 2])
+    with pytest.raises(SnapshotConflict):
+        save(store, manager, {"generation": 2}, version=lambda: next(versions))
+    with pytest.raises(SnapshotConflict):
+        save(store, manager, {"generation": 3}, version=lambda: 1)
+    assert store.load()[2] == {"generation": 1}
+    assert index_files(str(tmp_path)) == committed
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_serialization_error_during_mutation_is_conflict(tmp_path, manager):
+    store = SnapshotStore(str(tmp_path))
+    version = [0]
+
+    def mutated_state():
+        version[0] = 2
+        raise RuntimeError("dictionary changed size during iteration")
+
+    with pytest.raises(SnapshotConflict):
+        store.save(manager, mutated_state, lambda: {}, lambda: version[0])
+    with pytest.raises(RuntimeError):
+        store.save(manager, lambda: (_ for _ in ()).throw(RuntimeError("boom")), lambda: {}, lambda: 4)
+    assert os.listdir(tmp_path) == []
+
+
+def test_format_mismatch_is_ignored(tmp_path, manager, monkeypatch):
+    store = SnapshotStore(str(tmp_path))
+    save(store, manager, {})
+    monkeypatch.setattr(persistence, "SNAPSHOT_FORMAT", persistence.SNAPSHOT_FORMAT + 1)
+    assert store.load() is None
+
+
+class Counter(persistence.LockedStateMixin):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.values = [1]
+
+    def _copy_locked_state(self, state):
+        state["values"] = list(self.values)
+        return state
+
+
+def test_locked_state_mixin_rebuilds_lock():
+    counter = Counter()
+    restored = pickle.loads(pickle.dumps(counter))
+    assert restored.values == [1] and restored.values is not counter.values
+    assert restored._lock is not counter._lock and not restored._lock.locked()
+
+
+def test_scheduler_debounces_and_retries_conflicts():
+    calls = []
+    outcomes = [SnapshotConflict("状态正在修改"), None, None]
+
+    def fake_save():
+        calls.append(len(calls))
+        outcome = outcomes[len(calls) - 1]
+        if outcome is not None:
+            raise outcome
+        return {"counts": {}, "seconds": 0}
+
+    async def scenario():
+        scheduler = SnapshotScheduler(fake_save, debounce=0.01)
+        scheduler.start()
+        for _ in range(5):
+            scheduler.mark_dirty()
+        await asyncio.sleep(0.1)
+        assert calls == [0] and scheduler.conflicts == 1
+        # 作废后等下一次变更平息再重试
+        scheduler.mark_dirty()
+        await asyncio.sleep(0.1)
+        assert calls == [0, 1]
+        scheduler.mark_dirty()
+        await scheduler.stop()
+        assert calls == [0, 1, 2]
+        await scheduler.stop()
+        assert calls == [0, 1, 2]
+
+    asyncio.run(scenario())
+
+
+def test_scheduler_rejects_unknown_mode():
+    with pytest.raises(ValueError):
+        SnapshotScheduler(lambda: {}, mode="hourly")
@@ -0,0 +1,31 @@
+"""Excel/CSV行文本按列向量化序列化"""
+import numpy as np
+import pandas as pd
+
+from extractors import serialize_rows
+
+
+def test_serialize_rows_skips_nulls_and_keeps_column_order():
+    df = pd.DataFrame({
+        "科目": ["银行存款", None, "管理费用"],
+        "金额": [1200.5, np.nan, 30.0],
+        "凭证号": [1, 2, 3],
+    })
+    assert serialize_rows(df) == [
+        "科目: 银行存款 | 金额: 1200.5 | 凭证号: 1",
+        "凭证号: 2",
+        "科目: 管理费用 | 金额: 30.0 | 凭证号: 3",
+    ]
+
+
+def test_serialize_rows_formats_datetimes_like_timestamp_str():
+    df = pd.DataFrame({"日期": pd.to_datetime(["2024-01-01", None, "2024-03-05 08:30:00"])})
+    assert serialize_rows(df) == ["日期: 2024-01-01 00:00:00", "", "日期: 2024-03-05 08:30:00"]
+    subsecond = pd.DataFrame({"t": pd.to_datetime(["2024-01-01 00:00:00.250"])})
+    assert serialize_rows(subsecond) == [f"t: {pd.Timestamp('2024-01-01 00:00:00.250')}"]
+
+
+def test_serialize_rows_handles_duplicate_column_names():
+    df = pd.DataFrame([[1, 2]], columns=["a", "a"])
+    assert serialize_rows(df) == ["a: 1 | a: 2"]
+
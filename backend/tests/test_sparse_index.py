@@ -0,0 +1,74 @@
+"""稀疏矩阵检索：按ID追加、余弦打分、删除和压缩"""
+import pickle
+
+import numpy as np
+import pytest
+
+from sparse_index import SparseChunkIndex
+from vectorizers import HashingBackend
+
+DOCS = ["营业 收入 增长", "净 利润 增长", "营业 成本 下降", "现金 流量 稳定"]
+
+
+@pytest.fixture
+def encoder():
+    backend = HashingBackend(1 << 16)
+    backend.embed_sparse(DOCS)
+    return backend
+
+
+def query(encoder, text):
+    return encoder.embed_sparse([text], update_stats=False)
+
+
+def test_search_matches_dense_cosine(encoder):
+    index = SparseChunkIndex(encoder.dimension)
+    vectors = encoder.embed_sparse(DOCS, update_stats=False)
+    assert index.add(vectors) == [0, 1, 2, 3]
+    question = query(encoder, "营业 增长")
+    scores, ids = index.search(question, 10)
+    expected = (vectors @ question.T).toarray().ravel()
+    assert ids.tolist() == [i for i in np.argsort(-expected, kind="stable") if expected[i] > 0]
+    np.testing.assert_allclose(scores, expected[ids], rtol=1e-6)
+    assert index.search(query(encoder, "不存在"), 10)[1].size == 0
+
+
+def test_add_with_gaps_places_rows_at_ids(encoder):
+    index = SparseChunkIndex(encoder.dimension)
+    assert index.add(encoder.embed_sparse(DOCS[:2], update_stats=False), ids=[2, 5]) == [2, 5]
+    assert index.ntotal == 6
+    assert index.search(query(encoder, "利润"), 10)[1].tolist() == [5]
+    with pytest.raises(ValueError):
+        index.add(encoder.embed_sparse(DOCS[:1], update_stats=False), ids=[4])
+    index.pad(9)
+    assert index.ntotal == 9
+
+
+def test_remove_hides_rows_and_reports_feature_counts(encoder):
+    index = SparseChunkIndex(encoder.dimension, compact_min_tombstones=10, compact_tombstone_ratio=1.0)
+    vectors = encoder.embed_sparse(DOCS, update_stats=False)
+    index.add(vectors)
+    feature_counts, rows = index.remove([0, 0, 99])
+    assert rows == 1
+    np.testing.assert_array_equal(np.flatnonzero(feature_counts), np.sort(vectors[0].indices))
+    assert 0 not in index.search(query(encoder, "营业 增长"), 10)[1].tolist()
+    assert index.remove([0])[1] == 0
+    assert index.compactions == 0
+
+
+def test_compaction_keeps_row_ids(encoder):
+    index = SparseChunkIndex(encoder.dimension, compact_min_tombstones=2, compact_tombstone_ratio=1.0)
+    index.add(encoder.embed_sparse(DOCS, update_stats=False))
+    index.remove([0])
+    index.remove([1])
+    assert index.compactions == 1
+    assert index.ntotal == 4
+    assert index.search(query(encoder, "营业 增长"), 10)[1].tolist() == [2]
+
+
+def test_pickle_keeps_pending_rows(encoder):
+    index = SparseChunkIndex(encoder.dimension)
+    index.add(encoder.embed_sparse(DOCS, update_stats=False))
+    restored = pickle.loads(pickle.dumps(index))
+    assert restored.ntotal == 4
+    assert restored.search(query(encoder, "现金"), 1)[1].tolist() == [3]
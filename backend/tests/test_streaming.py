@@ -0,0 +1,80 @@
+"""流式上传：逐项驱动生成器、逐页提取、按页入库和页面文本拼接"""
+import asyncio
+import json
+
+import extractors
+from chunking import ChunkSpan
+from extraction_executor import iterate_in_thread
+
+
+def read_events(body: str):
+    return [json.loads(line[len("data: "):]) for line in body.splitlines() if line.startswith("data: ")]
+
+
+def test_iterate_in_thread_closes_generator_early():
+    closed = []
+
+    def numbers():
+        try:
+            yield from range(100)
+        finally:
+            closed.append(True)
+
+    async def take_three():
+        items = []
+        iterator = iterate_in_thread(numbers())
+        async for item in iterator:
+            items.append(item)
+            if len(items) == 3:
+                break
+        await iterator.aclose()
+        return items
+
+    assert asyncio.run(take_three()) == [0, 1, 2]
+    assert closed == [True]
+
+
+def test_iter_pdf_pages_yields_pages_in_order(sample_pdf, monkeypatch):
+    monkeypatch.setattr(extractors, "is_ocr_enabled", lambda: False)
+    pages = list(extractors.iter_pdf_pages(sample_pdf, "fast"))
+    assert [(page_num, page_count) for page_num, page_count, _, _ in pages] == [(n, 5) for n in range(1, 6)]
+    assert "Revenue grew" in pages[0][2]
+    assert pages[3][3].get("text_layer_empty")
+
+
+def test_get_chunk_text_before_and_after_finishing_blocks(app_client):
+    app, _ = app_client
+    doc_info = {"text": "", "text_blocks": (["first page", "second page"], [0, 12]),
+                "chunk_spans": [ChunkSpan(0, 5), ChunkSpan(12, 18)]}
+    assert [app.get_chunk_text(doc_info, index) for index in range(2)] == ["first", "second"]
+    app._finish_text_blocks(doc_info)
+    assert "text_blocks" not in doc_info
+    assert doc_info["text"] == "first page\n\nsecond page"
+    assert [app.get_chunk_text(doc_info, index) for index in range(2)] == ["first", "second"]
+
+
+def test_upload_stream_indexes_pages(app_client, sample_pdf, monkeypatch):
+    app, client = app_client
+    monkeypatch.setattr(extractors, "is_ocr_enabled", lambda: False)
+    with open(sample_pdf, "rb") as f:
+        response = client.post("/upload/stream", files={"file": ("sample.pdf", f)}, data={"profile": "fast"})
+    events = read_events(response.text)
+    assert events[0]["type"] == "start"
+    assert [event["page"] for event in events if event["type"] == "progress"] == [1, 2, 3, 4, 5]
+    complete = events[-1]
+    assert complete["type"] == "complete"
+
+    doc_info = app.document_store[complete["doc_id"]]
+    assert doc_info["status"] == "ready"
+    assert "text_blocks" not in doc_info
+    assert len(doc_info["vector_ids"]) == len(doc_info["chunk_spans"]) == complete["stats"]["chunks_count"]
+    results = app.search_chunks("Management expects margins", 3)
+    assert results and results[0]["doc_id"] == complete["doc_id"]
+    assert "Management expects" in results[0]["text"]
+
+
+def test_upload_stream_rejects_unknown_profile(app_client, sample_pdf):
+    _, client = app_client
+    with open(sample_pdf, "rb") as f:
+        response = client.post("/upload/stream", files={"file": ("sample.pdf", f)}, data={"profile": "turbo"})
+    assert read_events(response.text)[0]["type"] == "error"
@@ -0,0 +1,60 @@
+"""列式表格存储：按批写入、内存映射读取、无法转换的列改为文本列"""
+import numpy as np
+import pandas as pd
+
+from tabular_store import TableReader, TableWriter, list_tables, remove_store, table_dir_for
+
+
+def write_table(store_dir, index, name, *batches):
+    writer = TableWriter(table_dir_for(str(store_dir), index), name)
+    for batch in batches:
+        writer.append(batch)
+    return writer.close()
+
+
+def test_round_trip_keeps_kinds_and_nulls(tmp_path):
+    meta = write_table(tmp_path, 0, "明细",
+                       pd.DataFrame({"科目": ["银行存款", None], "金额": [1.5, None],
+                                     "日期": pd.to_datetime(["2024-01-01", None])}),
+                       pd.DataFrame({"科目": ["应收账款"], "金额": [3], "日期": pd.to_datetime(["2024-03-01"])}))
+    assert meta["rows"] == 3
+    assert [column["kind"] for column in meta["columns"]] == ["string", "numeric", "datetime"]
+
+    reader = TableReader(meta["path"])
+    assert list(reader.column("科目")) == ["银行存款", None, "应收账款"]
+    np.testing.assert_array_equal(reader.column("金额"), [1.5, np.nan, 3.0])
+    assert isinstance(reader.column("金额"), np.memmap)
+    assert pd.isna(reader.column("日期")[1])
+    assert reader.column("日期")[2] == np.datetime64("2024-03-01")
+    assert reader.numeric_summary()["金额"] == {"count": 2, "sum": 4.5, "mean": 2.25, "min": 1.5, "max": 3.0}
+    frame = reader.to_frame(["科目", "金额"], start=1)
+    assert frame["科目"].tolist() == [None, "应收账款"]
+
+
+def test_string_column_slices_lazily(tmp_path):
+    meta = write_table(tmp_path, 0, "文本", pd.DataFrame({"摘要": ["一", None, "三", "四"]}))
+    column = TableReader(meta["path"]).column("摘要")
+    view = column[1:3]
+    assert len(view) == 2 and view[0] is None and view[-1] == "三"
+    assert view[1:].to_numpy().tolist() == ["三"]
+    assert len(column[3:1]) == 0
+
+
+def test_unconvertible_values_promote_column_to_string(tmp_path, capsys):
+    meta = write_table(tmp_path, 0, "混合",
+                       pd.DataFrame({"金额": [100.0, 2.5, None], "日期": pd.to_datetime(["2024-01-01", None, None])}),
+                       pd.DataFrame({"金额": ["见附注", None, "7"], "日期": ["待定", None, "2024-02-01"]}))
+    assert [column["kind"] for column in meta["columns"]] == ["string", "string"]
+    reader = TableReader(meta["path"])
+    assert list(reader.column("金额")) == ["100", "2.5", None, "见附注", None, "7"]
+    assert list(reader.column("日期")) == ["2024-01-01 00:00:00", None, None, "待定", None, "2024-02-01"]
+    assert "改为文本列" in capsys.readouterr().out
+
+
+def test_list_tables_orders_by_index_and_remove_store(tmp_path):
+    frame = pd.DataFrame({"a": [1]})
+    for index in (10, 2, 0):
+        write_table(tmp_path, index, f"t{index}", frame)
+    assert [table["name"] for table in list_tables(str(tmp_path))] == ["t0", "t2", "t10"]
+    remove_store(str(tmp_path))
+    assert list_tables(str(tmp_path)) == []
@@ -0,0 +1,50 @@
+"""分词服务：文本哈希缓存、LRU淘汰、进程池分词"""
+from tokenizer import TokenizationService, segment_text
+
+
+def make_service(**overrides):
+    options = {"cache_size": 100, "parallel_min_texts": 10 ** 6, "workers": 1}
+    options.update(overrides)
+    return TokenizationService(**options)
+
+
+def test_segment_text_strips_symbols_and_prefixes_numbers():
+    tokens = segment_text("净利润 增长 12.5 ，达到@  3000 万元")
+    assert "NUM_12.5" in tokens and "NUM_3000" in tokens
+    assert "@" not in tokens and "，" not in tokens
+    assert all(token.strip() for token in tokens)
+
+
+def test_cache_hits_and_duplicates_segment_once(monkeypatch):
+    service = make_service()
+    calls = []
+    monkeypatch.setattr("tokenizer.segment_text", lambda text: calls.append(text) or text.split())
+    first = service.tokenize_batch(["a b", "c", "a b"])
+    assert first == [("a", "b"), ("c",), ("a", "b")]
+    assert first[0] is first[2]
+    assert calls == ["a b", "c"]
+    assert service.tokenize("c") == ("c",)
+    assert calls == ["a b", "c"]
+    assert service.stats()["hits"] == 1 and service.stats()["misses"] == 2
+
+
+def test_lru_evicts_least_recently_used(monkeypatch):
+    service = make_service(cache_size=2)
+    calls = []
+    monkeypatch.setattr("tokenizer.segment_text", lambda text: calls.append(text) or [text])
+    service.tokenize_batch(["a", "b"])
+    service.tokenize("a")
+    service.tokenize("c")  # 淘汰b
+    service.tokenize_batch(["a", "c", "b"])
+    assert calls == ["a", "b", "c", "b"]
+    assert service.stats()["cache_entries"] == 2
+
+
+def test_process_pool_matches_serial_segmentation():
+    texts = [f"第{i}季度营业收入增长{i}.5%，净利润下降。" for i in range(8)]
+    service = make_service(parallel_min_texts=4, workers=2)
+    try:
+        assert service.tokenize_batch(texts) == make_service().tokenize_batch(texts)
+        assert service.stats()["parallel_batches"] == 1
+    finally:
+        service.shutdown()
@@ -0,0 +1,124 @@
+"""自适应FAISS索引：按阈值迁移、墓碑删除、压缩和快照映射加载"""
+import faiss
+import numpy as np
+import pytest
+
+from vector_index import VectorIndexManager, build_index, export_vectors, index_kind_for
+
+DIMENSION = 8
+
+
+def random_vectors(count, seed=0):
+    return np.random.default_rng(seed).standard_normal((count, DIMENSION)).astype(np.float32)
+
+
+def make_manager(**overrides):
+    options = {"ivf_min_vectors": 200, "hnsw_min_vectors": 500, "compact_min_tombstones": 10 ** 6,
+               "compact_tombstone_ratio": 1.0, "background": False}
+    options.update(overrides)
+    return VectorIndexManager(DIMENSION, **options)
+
+
+def nearest_ids(manager, vectors, k=1):
+    return manager.search(vectors, k)[1]
+
+
+def test_index_kind_thresholds():
+    assert [index_kind_for(count, 200, 500) for count in (0, 199, 200, 499, 500)] == \
+        ["flat", "flat", "ivf", "ivf", "hnsw"]
+
+
+@pytest.mark.parametrize("kind", ["flat", "ivf", "hnsw"])
+def test_export_vectors_round_trip(kind):
+    vectors = random_vectors(400)
+    ids = np.arange(1000, 1400, dtype=np.int64)
+    exported_ids, exported = export_vectors(build_index(kind, DIMENSION, vectors, ids))
+    order = np.argsort(exported_ids)
+    np.testing.assert_array_equal(exported_ids[order], ids)
+    np.testing.assert_array_equal(exported[order], vectors)
+
+
+def test_migrates_through_kinds_keeping_ids():
+    manager = make_manager(add_batch_size=64)
+    vectors = random_vectors(600)
+    assert manager.add(vectors[:150]) == list(range(150))
+    assert manager.kind == "flat"
+    manager.add(vectors[150:300])
+    assert manager.kind == "ivf"
+    manager.add(vectors[300:])
+    assert manager.kind == "hnsw"
+    assert [(m["from"], m["to"]) for m in manager.migrations] == [("flat", "ivf"), ("ivf", "hnsw")]
+    assert manager.ntotal == manager.next_id == 600
+    np.testing.assert_array_equal(nearest_ids(manager, vectors[::50]).ravel(), np.arange(0, 600, 50))
+    np.testing.assert_array_equal(manager.reconstruct([5, 599]), vectors[[5, 599]])
+
+
+def test_removed_vectors_are_filtered_from_search():
+    manager = make_manager()
+    vectors = random_vectors(50)
+    manager.add(vectors)
+    assert manager.remove([3, 3, 7, 999]) == 2
+    assert manager.remove([3]) == 0
+    assert manager.ntotal == 48
+    _, ids = manager.search(vectors[[3, 7]], 50)
+    assert not np.isin(ids, [3, 7]).any()
+    assert (ids[:, :48] >= 0).all() and (ids[:, 48:] == -1).all()
+    assert len(manager.reconstruct([3, 4])) == 1
+
+
+@pytest.mark.parametrize("count", [100, 300, 600])
+def test_compaction_drops_tombstones(count):
+    manager = make_manager(compact_min_tombstones=20)
+    vectors = random_vectors(count)
+    manager.add(vectors)
+    kind = manager.kind
+    manager.remove(range(0, 40))
+    assert manager.kind == kind
+    assert len(manager.compactions) == 1
+    assert manager.stats()["deleted"] == 0
+    assert manager.ntotal == count - 40
+    np.testing.assert_array_equal(nearest_ids(manager, vectors[40:50]).ravel(), np.arange(40, 50))
+    assert manager.add(random_vectors(1, seed=1)) == [count]
+
+
+def test_background_rebuild_keeps_vectors_added_meanwhile():
+    manager = make_manager(background=True)
+    vectors = random_vectors(700)
+    for start in range(0, 700, 50):
+        manager.add(vectors[start:start + 50])
+    manager.wait_for_rebuild()
+    assert manager.kind == "hnsw"
+    assert manager.ntotal == 700
+    np.testing.assert_array_equal(nearest_ids(manager, vectors[::70]).ravel(), np.arange(0, 700, 70))
+
+
+def test_reset_discards_index():
+    manager = make_manager()
+    manager.add(random_vectors(300))
+    manager.reset()
+    assert (manager.kind, manager.ntotal, manager.next_id) == ("flat", 0, 0)
+
+
+def test_snapshot_copy_and_mmap_load(tmp_path):
+    manager = make_manager()
+    vectors = random_vectors(300)
+    manager.add(vectors)
+    manager.remove([1])
+    copy, state, mmap_path = manager.snapshot_copy()
+    assert mmap_path is None and state == {"next_id": 300, "tombstones": [1]}
+    path = str(tmp_path / "vectors.index")
+    faiss.write_index(copy, path)
+
+    loaded = make_manager()
+    loaded.load(path, state)
+    assert loaded.kind == "ivf" and loaded.stats()["mmapped"]
+    assert loaded.snapshot_copy()[0] is None
+    assert loaded.ntotal == 299
+    np.testing.assert_array_equal(nearest_ids(loaded, vectors[[0, 2]]).ravel(), [0, 2])
+    # 第一次写入前读入内存，快照文件不被修改
+    assert loaded.add(random_vectors(1, seed=1)) == [300]
+    assert not loaded.stats()["mmapped"]
+    assert faiss.read_index(path).ntotal == 300
+
+    with pytest.raises(ValueError):
+        VectorIndexManager(DIMENSION * 2, 200, 500).load(path, state)
@@ -0,0 +1,72 @@
+"""向量化后端：特征哈希的增量IDF统计、删除扣除和序列化"""
+import pickle
+
+import numpy as np
+import pytest
+
+from vectorizers import HashingBackend, TfidfBackend, create_vectorizer_backend
+
+DOCS = ["营业 收入 增长", "净 利润 增长", "营业 成本 下降", "现金 流量 稳定"]
+
+
+def test_incremental_stats_match_single_batch():
+    incremental = HashingBackend(256)
+    for doc in DOCS:
+        incremental.embed([doc])
+    batch = HashingBackend(256)
+    batch.embed(DOCS)
+    assert incremental.document_count == batch.document_count == 4
+    np.testing.assert_array_equal(incremental.document_frequency, batch.document_frequency)
+    np.testing.assert_allclose(incremental.embed(DOCS, update_stats=False), batch.embed(DOCS, update_stats=False))
+
+
+def test_query_does_not_update_stats_and_rows_are_normalized():
+    backend = HashingBackend(256)
+    vectors = backend.embed(DOCS)
+    assert vectors.shape == (4, 256) and vectors.dtype == np.float32
+    np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0, rtol=1e-6)
+    frequency = backend.document_frequency.copy()
+    backend.embed(["营业 收入"], update_stats=False)
+    assert backend.document_count == 4
+    np.testing.assert_array_equal(backend.document_frequency, frequency)
+
+
+def test_rarer_terms_weigh_more():
+    backend = HashingBackend(1 << 16)
+    backend.embed(DOCS)
+    vector = backend.embed_sparse(["增长 现金"], update_stats=False)
+    common, rare = (vector[0, backend._hasher.transform([term]).indices[0]] for term in ("增长", "现金"))
+    assert rare > common > 0
+
+
+def test_forget_restores_previous_stats():
+    backend = HashingBackend(256)
+    backend.embed(DOCS[:2])
+    before = (backend.document_count, backend.document_frequency.copy())
+    removed = backend.embed_sparse(DOCS[2:])
+    backend.forget(np.bincount(removed.indices, minlength=256), removed.shape[0])
+    assert backend.document_count == before[0]
+    np.testing.assert_array_equal(backend.document_frequency, before[1])
+    backend.forget(np.full(256, 10), 10)
+    assert backend.document_count == 0 and not backend.document_frequency.any()
+
+
+def test_pickle_round_trip_rebuilds_lock():
+    backend = HashingBackend(256)
+    backend.embed(DOCS)
+    restored = pickle.loads(pickle.dumps(backend))
+    np.testing.assert_array_equal(restored.embed(DOCS, update_stats=False), backend.embed(DOCS, update_stats=False))
+    restored.embed(["新 文档"])
+    assert restored.document_count == 5 and backend.document_count == 4
+
+
+def test_tfidf_query_before_fit_returns_zeros():
+    backend = TfidfBackend(64)
+    assert not backend.embed(DOCS, update_stats=False).any()
+    assert backend.embed(DOCS).any() and backend.fitted
+
+
+def test_unknown_backend_rejected():
+    with pytest.raises(ValueError):
+        create_vectorizer_backend("word2vec", 64)
+    assert isinstance(create_vectorizer_backend("hashing", 64), HashingBackend)
@@ -0,0 +1,223 @@
+"""分词服务 - 统一的jieba分词入口，按文本块哈希缓存分词结果，大批量文本在进程池中并行分词
+
+向量化（TF-IDF/哈希）、BM25和稀疏检索都从这里取词，同一个文本块只分词一次。
+启动时预热：从磁盘读取序列化好的jieba前缀词典缓存，并加载金融领域用户词典。
+"""
+import functools
+import hashlib
+import os
+import pickle
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Tuple
+
+import jieba
+
+from config import TOKENIZER_CONFIG
+
+# 预编译的预处理正则
+WHITESPACE_PATTERN = re.compile(r'\s+')
+# 保留数字和小数点
+UNWANTED_CHAR_PATTERN = re.compile(r'[^\w\s\u4e00-\u9fff.,\-]')
+NUMBER_TOKEN_PATTERN = re.compile(r'^[\d.,\-]+$')
+
+
+def segment_text(text: str) -> List[str]:
+    """清理符号、中文分词，并给数字加 NUM_ 前缀保持完整性（也作为进程池工作函数）"""
+    text = WHITESPACE_PATTERN.sub(' ', text)
+    text = UNWANTED_CHAR_PATTERN.sub('', text)
+
+    tokens = []
+    for word in jieba.cut(text):
+        if not word.strip():
+            continue
+        if NUMBER_TOKEN_PATTERN.match(word):
+            tokens.append(f"NUM_{word}")
+        else:
+            tokens.append(word)
+    return tokens
+
+
+def _load_prefix_dict(cache_file: str) -> bool:
+    """加载jieba前缀词典：优先读取pickle缓存，没有或版本不符时构建并写入缓存；返回是否命中缓存
+
+    jieba自带的marshal缓存读取并不比重新构建快，这里改用pickle（协议5）序列化，读取快数倍。
+    """
+    tokenizer = jieba.dt
+    if tokenizer.initialized:
+        return False
+    if os.path.isfile(cache_file):
+        try:
+            with open(cache_file, "rb") as f:
+                version, freq, total = pickle.load(f)
+            if version == jieba.__version__:
+                with tokenizer.lock:
+                    tokenizer.FREQ, tokenizer.total = freq, total
+                    tokenizer.initialized = True
+                return True
+        except Exception as e:
+            print(f"jieba词典缓存读取失败，重新构建: {str(e)}")
+
+    with tokenizer.lock:
+        tokenizer.FREQ, tokenizer.total = tokenizer.gen_pfdict(tokenizer.get_dict_file())
+        tokenizer.initialized = True
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        temp_file = f"{cache_file}.{os.getpid()}.tmp"
+        with open(temp_file, "wb") as f:
+            pickle.dump((jieba.__version__, tokenizer.FREQ, tokenizer.total), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_file, cache_file)
+    except OSError as e:
+        print(f"jieba词典缓存写入失败: {str(e)}")
+    return False
+
+
+def load_jieba_resources(cache_file: str, user_dict: str) -> dict:
+    """加载jieba词典和金融用户词典，返回耗时统计（也作为进程池的初始化函数）"""
+    stats = {"cache_file": cache_file, "cache_hit": False, "user_dict_terms": 0}
+    started = time.perf_counter()
+    if cache_file:
+        stats["cache_hit"] = _load_prefix_dict(os.path.abspath(cache_file))
+    else:
+        jieba.initialize()
+    stats["dictionary_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    user_dict_started = time.perf_counter()
+    if user_dict:
+        if os.path.isfile(user_dict):
+            with open(user_dict, encoding="utf-8") as f:
+                stats["user_dict_terms"] = sum(1 for line in f if line.strip())
+            jieba.load_userdict(user_dict)
+        else:
+            print(f"用户词典不存在，跳过加载: {user_dict}")
+    stats["user_dict_ms"] = round((time.perf_counter() - user_dict_started) * 1000, 2)
+    stats["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return stats
+
+
+def _text_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+
+class TokenizationService:
+    """带LRU缓存的分词服务：缓存键为文本哈希，值为分词结果（元组，调用方不要修改）"""
+
+    def __init__(self, cache_size: int, parallel_min_texts: int, workers: int,
+                 jieba_cache_file: str = "", user_dict: str = ""):
+        self.cache_size = cache_size
+        self.parallel_min_texts = parallel_min_texts
+        self.workers = workers
+        self.jieba_cache_file = jieba_cache_file
+        self.user_dict = user_dict
+        self.warmup_stats: Optional[dict] = None
+        self._cache: "OrderedDict[bytes, Tuple[str, ...]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool_lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.hits = 0
+        self.misses = 0
+        self.parallel_batches = 0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                # 每个工作进程启动时加载一次jieba词典和用户词典，与主进程分词结果一致
+                initializer = functools.partial(load_jieba_resources, self.jieba_cache_file, self.user_dict)
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=initializer)
+                print(f"分词进程池已创建，进程数: {self.workers}")
+            return self._pool
+
+    def _segment_many(self, texts: List[str]) -> List[List[str]]:
+        """批量分词：数量达到阈值时使用进程池，进程池不可用时退回单线程"""
+        if self.workers > 1 and len(texts) >= self.parallel_min_texts:
+            try:
+                chunksize = max(1, len(texts) // (self.workers * 4))
+                results = list(self._get_pool().map(segment_text, texts, chunksize=chunksize))
+                self.parallel_batches += 1
+                return results
+            except BrokenProcessPool as e:
+                print(f"分词进程池异常，改为单线程分词: {str(e)}")
+                self._pool = None
+        return [segment_text(text) for text in texts]
+
+    def warmup(self) -> dict:
+        """预热：加载jieba词典缓存和用户词典（应用启动时调用一次）"""
+        try:
+            self.warmup_stats = load_jieba_resources(self.jieba_cache_file, self.user_dict)
+            print(f"jieba词典预热完成: {self.warmup_stats}")
+        except Exception as e:
+            print(f"jieba词典预热失败，将在首次分词时加载: {str(e)}")
+            self.warmup_stats = {"error": str(e)}
+        # 词典变化后，之前的分词结果可能不同
+        self.clear()
+        return self.warmup_stats
+
+    def tokenize_batch(self, texts: List[str]) -> List[Tuple[str, ...]]:
+        """批量分词，已缓存的文本直接返回，未缓存的一次性分词后写入缓存"""
+        keys = [_text_key(text) for text in texts]
+        results: List[Optional[Tuple[str, ...]]] = [None] * len(texts)
+        missing = {}
+        with self._lock:
+            for position, key in enumerate(keys):
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    results[position] = cached
+                else:
+                    missing.setdefault(key, []).append(position)
+            self.hits += len(texts) - sum(len(positions) for positions in missing.values())
+            self.misses += len(missing)
+
+        if missing:
+            missing_keys = list(missing)
+            segmented = self._segment_many([texts[missing[key][0]] for key in missing_keys])
+            with self._lock:
+                for key, tokens in zip(missing_keys, segmented):
+                    # 驻留词字符串，缓存中重复出现的词只占一份内存
+                    tokens = tuple(sys.intern(token) for token in tokens)
+                    for position in missing[key]:
+                        results[position] = tokens
+                    self._cache[key] = tokens
+                    self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return results
+
+    def tokenize(self, text: str) -> Tuple[str, ...]:
+        """单条文本分词（走缓存）"""
+        return self.tokenize_batch([text])[0]
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def shutdown(self):
+        """关闭分词进程池"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "cache_entries": len(self._cache),
+            "cache_size": self.cache_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "parallel_batches": self.parallel_batches
+        }
+
+
+tokenization_service = TokenizationService(
+    cache_size=TOKENIZER_CONFIG["CACHE_SIZE"],
+    parallel_min_texts=TOKENIZER_CONFIG["PARALLEL_MIN_TEXTS"],
+    workers=TOKENIZER_CONFIG["WORKERS"],
+    jieba_cache_file=TOKENIZER_CONFIG["JIEBA_CACHE_FILE"],
+    user_dict=TOKENIZER_CONFIG["USER_DICT"]
+)
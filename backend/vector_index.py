@@ -0,0 +1,404 @@
+"""稠密向量索引管理 - 按向量数量自动切换FAISS索引类型，支持按ID删除向量
+
+flat: IndexFlatL2暴力检索，结果精确，向量少时足够快
+ivf:  IndexIVFFlat倒排聚类，查询只扫描nprobe个聚类，需要在抽样向量上训练
+hnsw: IndexHNSWFlat图索引，向量很多时查询延迟最低，不需要训练
+
+向量ID由管理器单调分配（删除后不复用），切换索引类型前后不变：flat/hnsw外包IndexIDMap2保存ID，
+ivf直接使用倒排列表中的ID并建立哈希表形式的direct map（支持按任意ID取回和删除向量）。
+
+向量数越过阈值时，在后台线程用已入库的全部向量构建新索引，构建期间入库和查询照常使用旧索引；
+构建完成后在锁内补上期间新增的向量（ID不小于构建开始时的next_id）并替换索引引用。
+
+删除先记为墓碑：查询时多取墓碑数个结果再过滤，不改动索引结构。墓碑数越过阈值后在后台压缩：
+flat/ivf在锁内复制索引，锁外对副本调用remove_ids，hnsw不支持删除，用剩余向量重建；两者都在锁内补上期间新增的向量后替换。
+
+add按add_batch_size分批写入，批与批之间释放锁，大批量写入（hnsw插入较慢）时查询不会一直等待。
+
+从快照加载时使用IO_FLAG_MMAP：faiss 1.7.4只对IVF的倒排列表做只读内存映射（多个工作进程共享页缓存），
+Flat/HNSW仍完整读入内存。只读映射的索引不能写入，第一次add或压缩前先把快照文件完整读入内存（写时复制）。
+"""
+import threading
+import time
+from typing import Iterable, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+INDEX_KINDS = ("flat", "ivf", "hnsw")
+
+
+def index_kind_for(count: int, ivf_min_vectors: int, hnsw_min_vectors: int) -> str:
+    """按向量数量选择索引类型"""
+    if count >= hnsw_min_vectors:
+        return "hnsw"
+    if count >= ivf_min_vectors:
+        return "ivf"
+    return "flat"
+
+
+def ivf_list_count(count: int) -> int:
+    """IVF聚类数：约4*sqrt(n)，并保证每个聚类至少有39个训练向量"""
+    return max(1, min(int(4 * np.sqrt(count)), count // 39))
+
+
+def build_index(kind: str, dimension: int, vectors: np.ndarray, ids: Optional[np.ndarray] = None,
+                train_sample: int = 100_000, nprobe: int = 16, hnsw_m: int = 32, hnsw_ef_search: int = 64,
+                hnsw_ef_construction: int = 80, seed: int = 0) -> faiss.Index:
+    """构建指定类型的L2索引并以ids加入全部向量（默认ID为0..n-1；IVF在至多train_sample个抽样向量上训练）"""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if ids is None:
+        ids = np.arange(len(vectors), dtype=np.int64)
+    ids = np.ascontiguousarray(ids, dtype=np.int64)
+    if kind == "flat":
+        index = faiss.IndexIDMap2(faiss.IndexFlatL2(dimension))
+    elif kind == "ivf":
+        index = faiss.index_factory(dimension, f"IVF{ivf_list_count(len(vectors))},Flat")
+        sample = vectors
+        if len(vectors) > train_sample:
+            rows = np.random.default_rng(seed).choice(len(vectors), size=train_sample, replace=False)
+            sample = vectors[np.sort(rows)]
+        index.train(sample)
+        index.nprobe = nprobe
+        # 按ID取回向量（迁移）和按ID删除（压缩）都需要direct map；ID不连续，用哈希表
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+    elif kind == "hnsw":
+        graph = faiss.index_factory(dimension, f"HNSW{hnsw_m},Flat")
+        graph.hnsw.efConstruction = hnsw_ef_construction
+        graph.hnsw.efSearch = hnsw_ef_search
+        index = faiss.IndexIDMap2(graph)
+    else:
+        raise ValueError(f"不支持的索引类型: {kind}。可选：{', '.join(INDEX_KINDS)}")
+    if len(vectors):
+        index.add_with_ids(vectors, ids)
+    return index
+
+
+def export_vectors(index: faiss.Index) -> Tuple[np.ndarray, np.ndarray]:
+    """取出索引中的全部 (向量ID, 向量)，顺序不保证与入库顺序一致"""
+    if isinstance(index, faiss.IndexIDMap2):
+        ids = faiss.vector_to_array(index.id_map).astype(np.int64)
+        return ids, index.index.reconstruct_n(0, index.ntotal)
+    if isinstance(index, faiss.IndexIVF):
+        # IVFFlat的编码就是原始float32向量，直接从倒排列表读出（内存映射的列表同样适用）
+        invlists = index.invlists
+        id_parts = []
+        vector_parts = []
+        for list_no in range(index.nlist):
+            size = invlists.list_size(list_no)
+            if not size:
+                continue
+            id_parts.append(faiss.rev_swig_ptr(invlists.get_ids(list_no), size).copy())
+            codes = faiss.rev_swig_ptr(invlists.get_codes(list_no), size * invlists.code_size)
+            vector_parts.append(codes.view(np.float32).reshape(size, index.d).copy())
+        if not id_parts:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, index.d), dtype=np.float32)
+        return np.concatenate(id_parts).astype(np.int64), np.vstack(vector_parts)
+    raise ValueError(f"不支持的索引类型: {type(index).__name__}")
+
+
+def detect_kind(index: faiss.Index) -> str:
+    """识别build_index构建（或从其写出的文件读回）的索引类型"""
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf"
+    if isinstance(index, faiss.IndexIDMap2):
+        return "hnsw" if isinstance(faiss.downcast_index(index.index), faiss.IndexHNSW) else "flat"
+    raise ValueError(f"不支持的索引类型: {type(index).__name__}")
+
+
+class VectorIndexManager:
+    """自适应FAISS索引：接口与faiss索引一致（ntotal/add/search），另有remove按ID删除；按阈值在后台迁移和压缩"""
+
+    def __init__(self, dimension: int, ivf_min_vectors: int, hnsw_min_vectors: int, train_sample: int = 100_000,
+                 nprobe: int = 16, hnsw_m: int = 32, hnsw_ef_search: int = 64, hnsw_ef_construction: int = 80,
+                 compact_min_tombstones: int = 1000, compact_tombstone_ratio: float = 0.2,
+                 add_batch_size: int = 4096, background: bool = True):
+        self.dimension = dimension
+        self.ivf_min_vectors = ivf_min_vectors
+        self.hnsw_min_vectors = hnsw_min_vectors
+        self.build_params = {
+            "train_sample": train_sample,
+            "nprobe": nprobe,
+            "hnsw_m": hnsw_m,
+            "hnsw_ef_search": hnsw_ef_search,
+            "hnsw_ef_construction": hnsw_ef_construction,
+        }
+        self.compact_min_tombstones = compact_min_tombstones
+        self.compact_tombstone_ratio = compact_tombstone_ratio
+        self.add_batch_size = add_batch_size
+        self.background = background
+        self._lock = threading.RLock()
+        self._generation = 0
+        self._rebuild_thread: Optional[threading.Thread] = None
+        self.migrations: List[dict] = []
+        self.compactions: List[dict] = []
+        self.reset()
+
+    def reset(self):
+        """清空索引回到flat，ID从0重新分配；正在进行的后台构建完成后会被丢弃"""
+        with self._lock:
+            self._generation += 1
+            self._index = build_index("flat", self.dimension, np.zeros((0, self.dimension), dtype=np.float32))
+            self.kind = "flat"
+            self.next_id = 0
+            self._tombstones = set()
+            self._tombstone_array: Optional[np.ndarray] = None
+            self.migrations = []
+            self.compactions = []
+            self.mmap_path: Optional[str] = None  # 只读内存映射加载的快照文件，写入前为非None
+
+    def load(self, path: str, state: dict):
+        """从快照文件加载索引（优先内存映射）和ID分配状态（state()的返回值），替换当前索引"""
+        try:
+            loaded = faiss.read_index(path, faiss.IO_FLAG_MMAP)
+        except RuntimeError as e:
+            print(f"内存映射加载索引失败，改为完整读取: {str(e)}")
+            loaded = faiss.read_index(path)
+        if loaded.d != self.dimension:
+            raise ValueError(f"快照索引维度 {loaded.d} 与向量维度配置 {self.dimension} 不一致")
+
+        kind = detect_kind(loaded)
+        mmapped = kind == "ivf" and isinstance(faiss.downcast_InvertedLists(loaded.invlists), faiss.OnDiskInvertedLists)
+        with self._lock:
+            self._generation += 1
+            self._index = loaded
+            self.kind = kind
+            self.next_id = state["next_id"]
+            self._tombstones = set(state["tombstones"])
+            self._tombstone_array = None
+            self.migrations = []
+            self.compactions = []
+            self.mmap_path = path if mmapped else None
+            self._maybe_rebuild()
+
+    def state(self) -> dict:
+        """ID分配状态，与索引文件一起构成完整快照"""
+        with self._lock:
+            return {"next_id": self.next_id, "tombstones": sorted(self._tombstones)}
+
+    def _ensure_writable(self):
+        """只读映射的索引在第一次写入前完整读入内存（调用方持有锁）"""
+        if self.mmap_path is not None:
+            self._index = faiss.read_index(self.mmap_path)
+            self.mmap_path = None
+
+    def snapshot_copy(self) -> Tuple[Optional[faiss.Index], dict, Optional[str]]:
+        """复制当前索引和ID分配状态供快照写盘，返回 (索引副本, ID分配状态, 映射加载的文件)；
+        映射加载后尚未写入时索引副本为None，快照沿用原文件（三者在同一次加锁中取得，不会与后台压缩交错）"""
+        with self._lock:
+            state = self.state()
+            if self.mmap_path is not None:
+                return None, state, self.mmap_path
+            return faiss.clone_index(self._index), state, None
+
+    @property
+    def ntotal(self) -> int:
+        """未删除的向量数"""
+        return self._index.ntotal - len(self._tombstones)
+
+    @property
+    def rebuilding(self) -> bool:
+        return self._rebuild_thread is not None and self._rebuild_thread.is_alive()
+
+    def add(self, vectors: np.ndarray) -> List[int]:
+        """追加一批向量，返回分配的向量ID；向量数越过阈值时触发迁移
+
+        每add_batch_size个向量加锁一次；多个线程同时add时ID可能交错，调用方需要连续递增的ID时自行串行调用。
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        ids = []
+        for start in range(0, len(vectors), self.add_batch_size):
+            batch = vectors[start:start + self.add_batch_size]
+            with self._lock:
+                batch_ids = np.arange(self.next_id, self.next_id + len(batch), dtype=np.int64)
+                self._ensure_writable()
+                self._index.add_with_ids(batch, batch_ids)
+                self.next_id += len(batch)
+                self._maybe_rebuild()
+            ids.extend(batch_ids.tolist())
+        return ids
+
+    def remove(self, ids: Iterable[int]) -> int:
+        """删除向量（先记为墓碑，查询时过滤），返回新删除的数量；墓碑足够多时触发后台压缩"""
+        with self._lock:
+            removed = {int(vector_id) for vector_id in ids if 0 <= vector_id < self.next_id} - self._tombstones
+            if removed:
+                self._tombstones |= removed
+                self._tombstone_array = None
+                self._maybe_rebuild()
+            return len(removed)
+
+    def reconstruct(self, ids: Iterable[int]) -> np.ndarray:
+        """按ID取回未删除的向量（已删除或不存在的ID跳过）"""
+        with self._lock:
+            wanted = [int(vector_id) for vector_id in ids
+                      if 0 <= vector_id < self.next_id and int(vector_id) not in self._tombstones]
+            if not wanted:
+                return np.zeros((0, self.dimension), dtype=np.float32)
+            return np.vstack([self._index.reconstruct(vector_id) for vector_id in wanted])
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """返回 (平方L2距离, 向量ID)，与faiss的search一致；结果不足k个时ID为-1"""
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        with self._lock:
+            if not self._tombstones:
+                return self._index.search(queries, k)
+            # 多取墓碑数个结果，过滤掉已删除的向量后仍有k个
+            fetch = min(k + len(self._tombstones), self._index.ntotal)
+            distances, ids = self._index.search(queries, max(fetch, 1))
+            if self._tombstone_array is None:
+                self._tombstone_array = np.fromiter(self._tombstones, dtype=np.int64, count=len(self._tombstones))
+            live = (ids >= 0) & ~np.isin(ids, self._tombstone_array)
+
+        result_distances = np.full((len(queries), k), np.finfo(np.float32).max, dtype=np.float32)
+        result_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        for row in range(len(queries)):
+            kept = np.flatnonzero(live[row])[:k]
+            result_distances[row, :len(kept)] = distances[row, kept]
+            result_ids[row, :len(kept)] = ids[row, kept]
+        return result_distances, result_ids
+
+    def _compaction_due(self) -> bool:
+        tombstones = len(self._tombstones)
+        return tombstones > 0 and (
+            tombstones >= self.compact_min_tombstones
+            or tombstones >= self.compact_tombstone_ratio * self._index.ntotal
+        )
+
+    def _maybe_rebuild(self):
+        """没有正在进行的构建时，按需开始迁移到更高级的索引类型或压缩墓碑（调用方持有锁）"""
+        if self.rebuilding:
+            return
+        target = index_kind_for(self.ntotal, self.ivf_min_vectors, self.hnsw_min_vectors)
+        if INDEX_KINDS.index(target) > INDEX_KINDS.index(self.kind):
+            job = (self._rebuild, target)
+        elif self._compaction_due():
+            # hnsw不支持remove_ids，压缩即用剩余向量重建
+            job = (self._rebuild, "hnsw") if self.kind == "hnsw" else (self._compact, None)
+        else:
+            return
+        function, argument = job
+        args = (self._generation,) if argument is None else (argument, self._generation)
+        if self.background:
+            self._rebuild_thread = threading.Thread(
+                target=function, args=args, name="vector-index-rebuild", daemon=True
+            )
+            self._rebuild_thread.start()
+        else:
+            function(*args)
+
+    def _finish_job(self, generation: int, changed: bool):
+        """后台任务结束：清除线程引用；期间可能又越过了迁移或压缩阈值"""
+        with self._lock:
+            if self._rebuild_thread is threading.current_thread():
+                self._rebuild_thread = None
+            if changed and generation == self._generation:
+                self._maybe_rebuild()
+
+    def _rebuild(self, target: str, generation: int):
+        started = time.perf_counter()
+        swapped = False
+        try:
+            with self._lock:
+                boundary = self.next_id
+                ids, vectors = export_vectors(self._index)
+                dropped = set(self._tombstones)
+            if dropped:
+                live = ~np.isin(ids, np.fromiter(dropped, dtype=np.int64, count=len(dropped)))
+                ids, vectors = ids[live], vectors[live]
+            count = len(ids)
+            print(f"开始构建 {target} 索引，向量数: {count}，丢弃已删除向量: {len(dropped)}")
+            new_index = build_index(target, self.dimension, vectors, ids, **self.build_params)
+            del vectors
+
+            with self._lock:
+                if generation != self._generation:
+                    print(f"索引已重置，丢弃构建好的 {target} 索引")
+                    return
+                previous = self.kind
+                self._swap_in(new_index, boundary, dropped)
+                self.kind = target
+                swapped = True
+                elapsed = time.perf_counter() - started
+                if previous == target:
+                    self.compactions.append({"type": target, "removed": len(dropped), "seconds": round(elapsed, 3)})
+                    print(f"向量索引已压缩: {target}，移除 {len(dropped)} 个已删除向量，耗时 {elapsed:.2f}秒")
+                else:
+                    self.migrations.append({"from": previous, "to": target, "vectors": count, "seconds": round(elapsed, 3)})
+                    print(f"向量索引已切换: {previous} -> {target}，耗时 {elapsed:.2f}秒")
+        except Exception as e:
+            print(f"构建 {target} 索引失败，继续使用 {self.kind} 索引: {str(e)}")
+        finally:
+            self._finish_job(generation, swapped)
+
+    def _swap_in(self, new_index: faiss.Index, boundary: int, dropped: set):
+        """替换为后台构建好的索引（调用方持有锁）
+
+        先补上构建期间新增的向量（ID不小于boundary）；dropped是构建时已去掉的向量，
+        构建期间新删除的向量仍在新索引中，保留其墓碑。
+        """
+        if self.next_id > boundary:
+            new_ids = np.arange(boundary, self.next_id, dtype=np.int64)
+            new_index.add_with_ids(np.vstack([self._index.reconstruct(int(i)) for i in new_ids]), new_ids)
+        self._index = new_index
+        self.mmap_path = None
+        self._tombstones -= dropped
+        self._tombstone_array = None
+
+    def _compact(self, generation: int):
+        """flat/ivf删除墓碑向量：锁内只复制索引，remove_ids在锁外对副本执行，完成后在锁内替换"""
+        started = time.perf_counter()
+        compacted = False
+        try:
+            with self._lock:
+                if generation != self._generation or not self._tombstones:
+                    return
+                boundary = self.next_id
+                dropped = set(self._tombstones)
+                mmap_path = self.mmap_path
+                copy = None if mmap_path is not None else faiss.clone_index(self._index)
+            if copy is None:
+                # 映射加载的快照文件不会被改写，在锁外完整读入
+                copy = faiss.read_index(mmap_path)
+            dropped_ids = np.fromiter(dropped, dtype=np.int64, count=len(dropped))
+            removed = copy.remove_ids(faiss.IDSelectorArray(len(dropped_ids), faiss.swig_ptr(dropped_ids)))
+
+            with self._lock:
+                if generation != self._generation:
+                    print(f"索引已重置，丢弃压缩好的 {self.kind} 索引")
+                    return
+                self._swap_in(copy, boundary, dropped)
+                compacted = True
+                elapsed = time.perf_counter() - started
+                self.compactions.append({"type": self.kind, "removed": int(removed), "seconds": round(elapsed, 3)})
+                print(f"向量索引已压缩: {self.kind}，移除 {removed} 个已删除向量，耗时 {elapsed:.2f}秒")
+        except Exception as e:
+            print(f"压缩 {self.kind} 索引失败，继续按墓碑过滤: {str(e)}")
+        finally:
+            self._finish_job(generation, compacted)
+
+    def wait_for_rebuild(self, timeout: Optional[float] = None):
+        """等待后台构建或压缩（包括接着触发的下一次任务）完成"""
+        while True:
+            with self._lock:
+                thread = self._rebuild_thread
+            if thread is None:
+                return
+            thread.join(timeout)
+            if timeout is not None:
+                return
+
+    def stats(self) -> dict:
+        return {
+            "type": self.kind,
+            "vectors": self.ntotal,
+            "deleted": len(self._tombstones),
+            "next_id": self.next_id,
+            "rebuilding": self.rebuilding,
+            "mmapped": self.mmap_path is not None,
+            "ivf_min_vectors": self.ivf_min_vectors,
+            "hnsw_min_vectors": self.hnsw_min_vectors,
+            "compact_min_tombstones": self.compact_min_tombstones,
+            "migrations": self.migrations,
+            "compactions": self.compactions
+        }
@@ -0,0 +1,172 @@
+"""文本向量化后端 - 输入已分词（空格分隔）的文本，输出固定维度的float32向量
+
+tfidf:   sklearn TfidfVectorizer，用第一批文本拟合词表，之后词表固定
+hashing: 特征哈希 + 增量维护的IDF统计，新文档到来时只更新文档频率，不需要重新拟合或重建索引
+         （稀疏检索也用它，只是哈希空间取得很大，基本不丢词）
+本地句向量模型（onnx/tiny）见embeddings.py，输入原始文本，也可通过create_vectorizer_backend创建。
+"""
+import threading
+from typing import List
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+from embeddings import EMBEDDING_BACKENDS, create_embedding_backend
+from persistence import LockedStateMixin
+
+
+class TfidfBackend(LockedStateMixin):
+    """TF-IDF向量化：未拟合时用当前这批文本拟合词表"""
+
+    name = "tfidf"
+    tokenized_input = True  # 输入为jieba分词后用空格连接的文本
+    cacheable = False  # 向量依赖拟合的词表，不能按文本缓存
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """丢弃已拟合的词表"""
+        self._vectorizer = TfidfVectorizer(max_features=self.dimension, stop_words=None)
+        self.fitted = False
+
+    def _fit_new(self, texts: List[str]) -> TfidfVectorizer:
+        # 拟合新的向量化器再整体替换，快照序列化时不会读到拟合到一半的词表
+        vectorizer = TfidfVectorizer(max_features=self.dimension, stop_words=None)
+        vectorizer.fit(texts)
+        return vectorizer
+
+    def fit(self, texts: List[str]):
+        """用给定文本重新拟合词表（已入库的向量需要重新生成）"""
+        with self._lock:
+            self._vectorizer = self._fit_new(texts)
+            self.fitted = True
+
+    def embed(self, texts: List[str], update_stats: bool = True) -> np.ndarray:
+        """批量向量化；update_stats为True且尚未拟合时，先用这批文本拟合"""
+        vectors = np.zeros((len(texts), self.dimension), dtype="float32")
+        if not texts:
+            return vectors
+
+        with self._lock:
+            if not self.fitted:
+                if not update_stats:
+                    return vectors
+                print(f"TF-IDF未初始化，使用当前 {len(texts)} 个文本块进行初始化")
+                try:
+                    self._vectorizer = self._fit_new(texts)
+                    self.fitted = True
+                except ValueError as e:
+                    # 文本中没有可用词汇（例如全是单字或符号），暂不拟合
+                    print(f"TF-IDF初始化失败: {str(e)}")
+                    return vectors
+
+        # 确保向量维度正确
+        matrix = self._vectorizer.transform(texts).toarray()
+        width = min(matrix.shape[1], self.dimension)
+        vectors[:, :width] = matrix[:, :width]
+        return vectors
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "fitted": self.fitted}
+
+
+class HashingBackend(LockedStateMixin):
+    """特征哈希向量化：词通过哈希映射到固定维度，IDF按已入库文本块增量统计
+
+    已入库的向量保留入库时的IDF权重；语料增长后IDF变化平缓，不需要重建索引。
+    """
+
+    name = "hashing"
+    tokenized_input = True
+    cacheable = False  # 向量带有入库时的IDF权重
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+        self._hasher = HashingVectorizer(
+            n_features=dimension,
+            tokenizer=str.split,  # 输入已经是分词后用空格连接的文本
+            token_pattern=None,
+            lowercase=True,
+            alternate_sign=False,
+            norm=None
+        )
+        self._lock = threading.Lock()
+        self.reset()
+
+    def _copy_locked_state(self, state: dict) -> dict:
+        # 入库时在线程池中原地累加文档频率
+        state["document_frequency"] = self.document_frequency.copy()
+        return state
+
+    def reset(self):
+        """清空文档频率统计"""
+        self.document_count = 0
+        self.document_frequency = np.zeros(self.dimension, dtype=np.int64)
+        self._idf_cache = None
+
+    @property
+    def fitted(self) -> bool:
+        return self.document_count > 0
+
+    def forget(self, document_frequency: np.ndarray, documents: int):
+        """删除文档时从统计中扣除：document_frequency为被删除文档在各特征上出现的文档数"""
+        with self._lock:
+            self.document_frequency -= document_frequency
+            np.maximum(self.document_frequency, 0, out=self.document_frequency)
+            self.document_count = max(self.document_count - documents, 0)
+            self._idf_cache = None
+
+    def _idf(self) -> np.ndarray:
+        # 与sklearn的smooth_idf公式一致；统计不变时复用，查询不必每次在整个哈希空间上重算
+        if self._idf_cache is None:
+            self._idf_cache = np.log((1 + self.document_count) / (1 + self.document_frequency)) + 1.0
+        return self._idf_cache
+
+    def embed_sparse(self, texts: List[str], update_stats: bool = True) -> sparse.csr_matrix:
+        """批量向量化为L2归一化的CSR矩阵；update_stats为True时先把这批文本计入文档频率（入库），查询时应传False"""
+        counts = self._hasher.transform(texts)
+        with self._lock:
+            if update_stats and texts:
+                self.document_frequency += np.bincount(counts.indices, minlength=self.dimension)
+                self.document_count += counts.shape[0]
+                self._idf_cache = None
+            idf = self._idf()
+
+        weighted = counts.astype(np.float64)
+        weighted.data *= idf[weighted.indices]
+        return normalize(weighted).astype(np.float32)
+
+    def embed(self, texts: List[str], update_stats: bool = True) -> np.ndarray:
+        """批量向量化为稠密矩阵，用于FAISS索引"""
+        if not texts:
+            return np.zeros((0, self.dimension), dtype="float32")
+        return self.embed_sparse(texts, update_stats).toarray()
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "fitted": self.fitted,
+            "documents_seen": self.document_count,
+            "active_features": int(np.count_nonzero(self.document_frequency))
+        }
+
+
+VECTORIZER_BACKENDS = {
+    TfidfBackend.name: TfidfBackend,
+    HashingBackend.name: HashingBackend,
+}
+
+
+def create_vectorizer_backend(name: str, dimension: int):
+    """按名称创建向量化后端（包括本地句向量模型后端）"""
+    if name in EMBEDDING_BACKENDS:
+        return create_embedding_backend(name, dimension)
+    if name not in VECTORIZER_BACKENDS:
+        choices = list(VECTORIZER_BACKENDS) + list(EMBEDDING_BACKENDS)
+        raise ValueError(f"不支持的向量化后端: {name}。可选：{', '.join(choices)}")
+    return VECTORIZER_BACKENDS[name](dimension)